@@ -0,0 +1,104 @@
+#!/usr/bin/python
+
+# Run process_any over many QXDM event files at once, one file per worker
+# process, and print one combined report.
+#
+#	./batch_process.py logs/ [more dirs or globs] [-j 8] [--root out/all]
+
+import sys, os, glob, argparse, multiprocessing
+from collections import OrderedDict
+import process_any, correlation, transition_report
+
+def find_files(paths, pattern):
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(glob.glob(os.path.join(path, pattern)))
+		else:
+			files.extend(glob.glob(path))
+	return sorted(set(files))
+
+def process_file(args):
+	'''Worker: parse one file, return the summaries of its transitions, the
+	transitions themselves if they are wanted and the event types it saw'''
+	filename, stream, window, keep_transitions = args
+	event_parser = process_any.EventParser()
+	transition_dict = process_any.parse(filename, stream=stream, window=window, parser=event_parser)
+	# in the order of transition_dict, which the report lists them in
+	summaries = []
+	for name, v in transition_dict.iteritems():
+		summary = transition_report.TransitionSummary(name)
+		summary.extend(v)
+		summaries.append((name, summary))
+		for item in v:
+			# only the per-event dicts are needed from here on
+			item.between = []
+	if not keep_transitions:
+		transition_dict = {}
+	return filename, summaries, transition_dict, event_parser.event_names
+
+def merge(summaries, transition_dict, event_parser, result):
+	'''Add one worker's result.  Event names go through event_parser in the
+	order each file saw them, so one file gives the report process_any does'''
+	filename, file_summaries, file_transitions, file_events = result
+	for name in file_events:
+		event_parser.add_event_name(name)
+	for name, summary in file_summaries:
+		if name in summaries:
+			summaries[name].merge(summary)
+		else:
+			summaries[name] = summary
+	for name, v in file_transitions.iteritems():
+		if name in transition_dict:
+			transition_dict[name].extend(v)
+		else:
+			transition_dict[name] = v
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="Combined RRC transition statistics over many QXDM event files.")
+	parser.add_argument("paths", nargs="+", help="directories or globs of event files")
+	parser.add_argument("--pattern", default="*.txt", help="files to pick up from directories")
+	parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(), help="worker processes")
+	parser.add_argument("--root", help="prefix for the combined interval and correlation files")
+	parser.add_argument("--stream", action="store_true", help="parse each file with process_any's streaming mode")
+	parser.add_argument("--window", type=int, default=1000)
+	parser.add_argument("--binary", action="store_true", help="also write the correlation rows as float64 (see correlation.py)")
+	parser.add_argument("--rules", metavar="FILE", help="JSON correlation rules to use instead of the built-in ones")
+	process_any.add_output_arguments(parser)
+	args = parser.parse_args(argv[1:])
+	process_any.setup_logging(args)
+
+	files = find_files(args.paths, args.pattern)
+	if not files:
+		print >>sys.stderr, "no event files found"
+		return 1
+
+	# kinds in the order the files list them, as one file's report does
+	summaries = OrderedDict()
+	transition_dict = {}
+	event_parser = process_any.EventParser()
+	# the interval and correlation files need every transition
+	work = [(f, args.stream, args.window, args.root != None) for f in files]
+	pool = multiprocessing.Pool(args.jobs)
+	try:
+		# imap keeps file order, so the report does not depend on scheduling
+		for result in pool.imap(process_file, work):
+			merge(summaries, transition_dict, event_parser, result)
+			print >>sys.stderr, "parsed", result[0]
+	finally:
+		pool.close()
+		pool.join()
+
+	rules = None
+	if args.rules:
+		rules = correlation.load_rules(args.rules)
+	out = process_any.open_output(args)
+	try:
+		process_any.report(transition_dict, event_parser.distinct_events, args.root, args.binary, rules, out, args.format, summaries)
+	finally:
+		if out != sys.stdout:
+			out.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -0,0 +1,718 @@
+#!/usr/bin/python
+
+# Micro-benchmarks for the event-parsing code.
+#
+#	./benchmark.py secondary [lines]
+#	./benchmark.py stats [values]
+#	./benchmark.py store [events]
+#	./benchmark.py transitions [transitions]
+#	./benchmark.py correlation [rows]
+#	./benchmark.py packets [packets]
+#	./benchmark.py merge [packets]
+#	./benchmark.py headers [events]
+#	./benchmark.py signal [lines]
+#	./benchmark.py suite [records]
+#
+# suite times the main stages on made-up input (see synthetic.py), each in a
+# process of its own, at 10^4, 10^5, ... records up to the number given;
+# 10^7 takes a few GB of disk and a good while.
+
+import sys, os, re, math, time, random, bisect, heapq, tempfile, shutil, struct, socket, resource, multiprocessing
+import process_any, robustnetLib, event_store, correlation, timestamps, signal_series, synthetic
+
+# One payload line per event type handled by the secondary attribute table,
+# plus a miss and an event type with no entry.
+SECONDARY_SAMPLES = [
+	("EVENT_LTE_RRC_TIMER_STATUS", "Payload String = Timer Name = T310, Timer Value = 1000, Timer State = Stopped"),
+	("EVENT_LTE_EMM_TIMER_START", "Payload String = Timer ID = TIMER T3411"),
+	("EVENT_LTE_EMM_TIMER_EXPIRY", "Payload String = Timer ID = 17"),
+	("EVENT_LTE_EMM_INCOMING_MSG", "Payload String = Message ID = Attach Accept"),
+	("EVENT_LTE_CM_OUTGOING_MSG", "Payload String = Message ID = Service Request"),
+	("EVENT_LTE_RRC_UL_MSG", "Payload String = Channel Type = UL DCCH, Message Type = Measurement Report"),
+	("EVENT_LTE_RRC_DL_MSG", "Payload String = Channel Type = DL DCCH, Message Type = Connection Release"),
+	("EVENT_LTE_RACH_ACCESS_START", "Payload String = RACH Cause = Connection Request, RACH Contention = Contention Based"),
+	("EVENT_LTE_RRC_PAGING_DRX_CYCLE", "Payload String = DRX Cycle = 128"),
+	("EVENT_LTE_RACH_RAID_MATCH", "Payload String = Match = 1"),
+	("EVENT_LTE_TIMING_ADVANCE", "Payload String = Timer Value = 10, Timing Advance = 20"),
+	("EVENT_LTE_MAC_TIMER", "Payload String = Timer type = TA Timer, Action = Start"),
+	("EVENT_LTE_MAC_RESET", "Payload String = Cause = RLF"),
+	("EVENT_LTE_RACH_ACCESS_RESULT", "Payload String = Result = Success"),
+	("EVENT_LTE_ML1_PHR_REPORT", "Payload String = Power Headroom = -3, PHR Trigger = Periodic"),
+	("EVENT_LTE_BSR_SR_REQUEST", "Payload String = Is BSR Timer Expired = 0, Is Higher Priority Data Arrial = 1, Is Retx BSR Timer Expired = 0, Is Request To Include BSR Report = 1, Is Request To Send SR = 1"),
+	("EVENT_LTE_RRC_SECURITY_CONFIG", "Payload String = Status = Success"),
+	("EVENT_LTE_RRC_NEW_CELL_IND", "Payload String = Cause = Reselection, Frequency = 5230, Cell ID = 2"),
+	("EVENT_LTE_MAC_RESET", "Payload String = Bogus = 3"),
+	("EVENT_WCDMA_L1_STATE", "Payload String = L1 State = DCH"),
+]
+
+class LegacyEvent:
+	'''Event.__getSecondary as it was before the pattern table, minus the prints'''
+	def __init__(self, event):
+		self.event = event
+		self.secondary_attributes = {}
+
+	def getSecondary(self, line):
+		match_string = None
+		match_labels = None
+		if self.event == "EVENT_LTE_RRC_TIMER_STATUS":
+			match_string = ["Timer Name = ([A-Za-z0-9 _]+), Timer Value = ([0-9]+), Timer State = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Timer Name", "Timer Value", "Timer State")
+		elif self.event == "EVENT_LTE_EMM_TIMER_START" or \
+				self.event == "EVENT_LTE_EMM_TIMER_EXPIRY":
+			match_string = ["Timer ID = TIMER (T[0-9]+)", "(Timer ID = [0-9]+)"]
+			match_labels = ("Timer ID",)
+		elif self.event == "RRC_STATE_CHANGE_TRIGGER":
+			match_string = ["RRC State Change Trigger = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Trigger",)
+		elif self.event == "EVENT_LTE_EMM_OUTGOING_MSG" or \
+				self.event == "EVENT_LTE_EMM_OTA_OUTGOING_MSG" or \
+				self.event == "EVENT_LTE_ESM_OUTGOING_MSG" or \
+				self.event == "EVENT_LTE_EMM_INCOMING_MSG" or \
+				self.event == "EVENT_LTE_CM_OUTGOING_MSG":
+			match_string = ["Message ID = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Message ID",)
+		elif self.event == "EVENT_LTE_RRC_UL_MSG":
+			match_string = ["Message Type = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Message Type",)
+		elif self.event == "EVENT_LTE_RACH_ACCESS_START":
+			match_string = ["RACH Cause = ([A-Za-z0-9 _]+), RACH Contention = ([A-Za-z0-9 _]+)"]
+			match_labels = ("RACH Cause", "RACH Contention")
+		elif self.event == "EVENT_LTE_RRC_PAGING_DRX_CYCLE":
+			match_string = ["DRX Cycle = ([0-9]+)"]
+			match_labels = ("DRX_CYCLE",)
+		elif self.event == "EVENT_LTE_RACH_RAID_MATCH":
+			match_string = ["Match = ([0-9]+)"]
+			match_labels = ("Match",)
+		elif self.event == "EVENT_LTE_TIMING_ADVANCE":
+			match_string = ["Timer Value = ([0-9]+), Timing Advance = ([0-9]+)"]
+			match_labels = ("Timer Value", "Timing Advance")
+		elif self.event == "EVENT_LTE_MAC_TIMER":
+			match_string = ["Timer type = ([A-Za-z0-9 _]+), Action = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Timer type", "Action")
+		elif self.event == "EVENT_LTE_MAC_RESET":
+			match_string = ["Cause = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Cause",)
+		elif self.event == "EVENT_LTE_RACH_ACCESS_RESULT":
+			match_string = ["Result = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Result",)
+		elif self.event == "EVENT_LTE_RRC_UL_MSG" or \
+				self.event == "EVENT_LTE_RRC_DL_MSG":
+			match_string = ["Channel Type = ([A-Za-z0-9 _]+), Message Type = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Channel Type", "Message Type")
+		elif self.event == "EVENT_LTE_ML1_PHR_REPORT":
+			match_string = ["Power Headroom = ([-A-Za-z0-9 _]+), PHR Trigger = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Power Headroom", "PHR Trigger")
+		elif self.event == "EVENT_LTE_BSR_SR_REQUEST":
+			match_string = ["Is BSR Timer Expired = ([0-9]+), Is Higher Priority Data Arrial = ([0-9]+), Is Retx BSR Timer Expired = ([0-9]+), Is Request To Include BSR Report = ([0-9]+), Is Request To Send SR = ([0-9]+)"]
+			match_labels = ("Is BSR Timer Expired", \
+					"Is Higher Priority Data Arrial", \
+					"Is Retx BSR Timer Expired", \
+					"Is Request To Include BSR Report", \
+					"Is Request To Send SR")
+		elif self.event == "EVENT_LTE_RRC_SECURITY_CONFIG":
+			match_string = ["Status = ([A-Za-z0-9 _]+)"]
+			match_labels = ("Status",)
+		elif self.event == "EVENT_LTE_RRC_NEW_CELL_IND":
+			match_string = ["Cause = ([A-Za-z0-9 _]+), Frequency = ([0-9]+), Cell ID = ([0-9]+)"]
+			match_labels = ("Cause", "Frequency", "Cell ID")
+
+		matched = True
+		if match_string != None and match_labels != None:
+			for s in match_string:
+				match = re.search(s, line)
+				if match == None:
+					continue
+				for i in range(len(match.groups())):
+					if i < len(match_labels):
+						self.secondary_attributes[match_labels[i]] = match.group(i+1)
+				break
+			matched = match != None
+		return self.secondary_attributes, matched
+
+def legacy_secondary(event, line):
+	return LegacyEvent(event).getSecondary(line)
+
+def table_secondary(event, line):
+	attributes = {}
+	matched = process_any.match_secondary(event, line, attributes)
+	return attributes, matched
+
+def timed(func, samples, repeat):
+	start = time.time()
+	for i in xrange(repeat):
+		for event, line in samples:
+			func(event, line)
+	return time.time() - start
+
+def bench_secondary(n):
+	samples = SECONDARY_SAMPLES
+	for event, line in samples:
+		old = legacy_secondary(event, line)
+		new = table_secondary(event, line)
+		if old != new or old[0].items() != new[0].items():
+			print "MISMATCH", event, old, new
+			sys.exit(1)
+
+	repeat = max(1, n / len(samples))
+	lines = repeat * len(samples)
+	legacy = timed(legacy_secondary, samples, repeat)
+	table = timed(table_secondary, samples, repeat)
+	print "secondary attributes,", lines, "payload lines"
+	print "\tif/elif chain:", legacy, "s", int(lines / legacy), "lines/s"
+	print "\tpattern table:", table, "s", int(lines / table), "lines/s"
+	print "\tspeedup:", legacy / table
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def rank_error(values, got, q):
+	'''How far q is from the ranks got has in sorted values: from the
+	fraction below it to the fraction at or below it'''
+	low = bisect.bisect_left(values, got) / float(len(values))
+	high = bisect.bisect_right(values, got) / float(len(values))
+	return max(0.0, low - q, q - high)
+
+def bench_stats(n):
+	random.seed(1)
+	# skewed like our interval times, split over 8 "files" and merged
+	values = [int(random.lognormvariate(6, 1)) for i in xrange(n)]
+	start = time.time()
+	exact = (robustnetLib.meanValue(values), robustnetLib.stdevValue(values), robustnetLib.quartileResult(values))
+	list_time = time.time() - start
+
+	start = time.time()
+	parts = [robustnetLib.StreamSummary() for i in range(8)]
+	for i in xrange(n):
+		parts[i % 8].add(values[i])
+	summary = parts[0]
+	for part in parts[1:]:
+		summary.merge(part)
+	stream = (summary.meanValue(), summary.stdevValue(), summary.quartileResult())
+	stream_time = time.time() - start
+
+	print "statistics,", n, "values"
+	print "\tlists:", list_time, "s, mean", exact[0], "stdev", exact[1]
+	print "\tstreaming:", stream_time, "s, mean", stream[0], "stdev", stream[1], \
+		"centroids", len(summary.digest.centroids)
+	values.sort()
+	for q, want, got in zip(QUANTILES, exact[2], stream[2]):
+		print "\t%d%%: exact %s, digest %.2f, rank error %.4f" % (q * 100, want, got, rank_error(values, got, q))
+
+	# whole milliseconds repeat a lot; these must stay within the bound too
+	for name, values in (("lognormal", [random.lognormvariate(6, 1) for i in xrange(n)]), \
+			("lognormal ms", [int(random.lognormvariate(6, 1)) for i in xrange(n)]), \
+			("0-100 ms", [random.randint(0, 100) for i in xrange(n)])):
+		parts = [robustnetLib.QuantileDigest() for i in range(8)]
+		for i in xrange(n):
+			parts[i % 8].add(values[i])
+		for part in parts[1:]:
+			parts[0].merge(part)
+		values.sort()
+		errors = []
+		for q in QUANTILES:
+			error = rank_error(values, parts[0].quantile(q), q)
+			errors.append("%.4f" % error)
+			bound = 2 * math.pi * math.sqrt(q * (1 - q)) / parts[0].compression + 1.0 / parts[0].compression
+			if error > bound:
+				print "OUT OF BOUND", name, q, error, bound
+				sys.exit(1)
+		print "\t%s, rank errors %s" % (name, " ".join(errors))
+
+def rss():
+	'''Resident set size of this process in bytes (Linux only)'''
+	return int(open("/proc/self/statm").read().split()[1]) * 4096
+
+def fake_events(n):
+	random.seed(1)
+	names = [name for name, line in SECONDARY_SAMPLES]
+	lines = dict(SECONDARY_SAMPLES)
+	states = process_any.lte_states
+	t = 0
+	for i in xrange(n):
+		event = process_any.Event()
+		t += random.randint(0, 20)
+		event.time = t
+		event.event = random.choice(names)
+		event.event_line = "2013 Jun 12  18:51:02.371  [00]  0x1FFB  Event  --  " + event.event
+		if random.random() < 0.05:
+			event.after_state = random.choice(states)
+			event.before_state = random.choice(states)
+		process_any.match_secondary(event.event, lines[event.event], event.secondary_attributes)
+		if random.random() < 0.5:
+			event.RSSI = -70.5
+			event.power_ratio = 9.5
+		yield event
+
+def bench_store(n):
+	base = rss()
+	start = time.time()
+	store = event_store.EventStore()
+	for event in fake_events(n):
+		store.append(event)
+	ordered = sum(1 for event in store.iter_ordered())
+	store_time = time.time() - start
+	store_bytes = rss() - base
+	del store
+
+	base = rss()
+	start = time.time()
+	all_events = {}
+	for event in fake_events(n):
+		all_events.setdefault(event.time, []).append(event)
+	ordered = sum(len(all_events[k]) for k in sorted(all_events.keys()))
+	object_time = time.time() - start
+	object_bytes = rss() - base
+
+	print "event storage,", n, "events"
+	print "\tEvent objects:", object_bytes / n, "bytes/event", object_time, "s"
+	print "\tEventStore:", store_bytes / n, "bytes/event", store_time, "s"
+
+class DenseTransition(process_any.Transition):
+	'''Transition with the eight dicts prefilled for every distinct event, as
+	it was before SparseDict'''
+	distinct_events = set()
+
+	def __init__(self, state, time):
+		process_any.Transition.__init__(self, state, time)
+		for name in ("time_to_reach_first", "time_to_reach_last"):
+			setattr(self, name, dict.fromkeys(self.distinct_events, None))
+		for name in ("duplicates_first", "duplicates_last", "duplicates_all"):
+			setattr(self, name, dict.fromkeys(self.distinct_events, 0))
+		for name in ("attributes_first", "attributes_last", "attributes_all"):
+			setattr(self, name, dict((v, {}) for v in self.distinct_events))
+
+def run_transitions(cls, n, distinct):
+	random.seed(1)
+	signal = signal_series.SignalSeries()
+	kept = []
+	start = time.time()
+	for i in xrange(n):
+		transition = cls("Connected", i * 1000)
+		transition.end_time = i * 1000 + 900
+		# a handful of the distinct events happen in each transition
+		for name in random.sample(distinct, 8):
+			event = process_any.Event()
+			event.event = name
+			event.time = i * 1000 + random.randint(0, 900)
+			transition.between.append([name, 1, event])
+		transition.find_stats_and_finalize(None, signal)
+		transition.between = []
+		kept.append(transition)
+	return kept, time.time() - start
+
+def bench_transitions(n):
+	distinct = ["EVENT_FAKE_%d" % i for i in range(150)]
+	DenseTransition.distinct_events = process_any.EventParser().distinct_events | set(distinct)
+
+	base = rss()
+	kept, sparse_time = run_transitions(process_any.Transition, n, distinct)
+	sparse_bytes = rss() - base
+	del kept
+
+	base = rss()
+	kept, dense_time = run_transitions(DenseTransition, n, distinct)
+	dense_bytes = rss() - base
+
+	print "transition bookkeeping,", n, "transitions,", len(distinct), "distinct events, 8 per transition"
+	print "\tdense dicts:", dense_time, "s", dense_bytes / n, "bytes/transition"
+	print "\tsparse dicts:", sparse_time, "s", sparse_bytes / n, "bytes/transition"
+
+def bench_correlation(n):
+	random.seed(1)
+	rows = [[random.randint(0, 2000)] + [random.choice("01") for i in range(15)] + [-79.85, -53.6] + \
+			[random.randint(-1, 500) for i in range(8)] for j in range(1000)]
+	directory = tempfile.mkdtemp()
+	try:
+		root = os.path.join(directory, "res")
+		start = time.time()
+		for i in xrange(n):
+			# what find_correlation used to do for every transition
+			f = open(root + "_closing.txt", "a")
+			for x in rows[i % len(rows)]:
+				print >>f, x,
+			print >>f
+			f.close()
+		open_time = time.time() - start
+		old = open(root + "_closing.txt").read()
+
+		start = time.time()
+		writer = correlation.CorrelationWriter(root, ["closing"])
+		for i in xrange(n):
+			writer.write("closing", rows[i % len(rows)])
+		writer.close()
+		writer_time = time.time() - start
+		if open(root + "_closing.txt").read() != old:
+			print "MISMATCH"
+			sys.exit(1)
+
+		start = time.time()
+		writer = correlation.CorrelationWriter(root, ["closing"], binary=True)
+		for i in xrange(n):
+			writer.write("closing", rows[i % len(rows)])
+		writer.close()
+		binary_time = time.time() - start
+	finally:
+		shutil.rmtree(directory)
+
+	print "correlation rows,", n, "rows"
+	print "\topen/append/close per row:", open_time, "s"
+	print "\tCorrelationWriter:", writer_time, "s"
+	print "\tCorrelationWriter, binary too:", binary_time, "s"
+
+def write_packets(n, verbose, fields, pcap):
+	'''The same n packets as tshark -V text, as tshark -T fields output
+	and as an Ethernet pcap'''
+	pcap.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+	random.seed(1)
+	t = time.mktime((2013, 6, 12, 18, 51, 0, 0, 0, -1))
+	for i in xrange(n):
+		t += random.random() * 0.5
+		sent = random.random() < 0.5
+		src, dst = ("141.212.113.208", "10.0.0.5") if sent else ("10.0.0.5", "141.212.113.208")
+		size = random.randint(60, 1500)
+		port = random.choice(["50000", "50000", "443"])
+		seconds = int(t)
+		fraction = "%03d" % int((t - seconds) * 1000)
+		print >>verbose, "Frame %d: %d bytes on wire (%d bits), %d bytes captured (%d bits)" % (i + 1, size, size * 8, size, size * 8)
+		print >>verbose, "    Encapsulation type: Ethernet (1)"
+		print >>verbose, "    Arrival Time: %s.%s EDT" % (time.strftime("%b %d, %Y %H:%M:%S", time.localtime(seconds)), fraction)
+		print >>verbose, "    Frame Number: %d" % (i + 1)
+		print >>verbose, "    Frame Length: %d bytes (%d bits)" % (size, size * 8)
+		print >>verbose, "Ethernet II, Src: 00:11:22:33:44:55, Dst: 66:77:88:99:aa:bb"
+		print >>verbose, "Internet Protocol Version 4, Src: %s (%s), Dst: %s (%s)" % (src, src, dst, dst)
+		print >>verbose, "    Version: 4"
+		print >>verbose, "    Header length: 20 bytes"
+		print >>verbose, "    Total Length: %d" % (size - 14)
+		print >>verbose, "    Time to live: 64"
+		print >>verbose, "User Datagram Protocol, Src Port: %s (%s), Dst Port: 40000 (40000)" % (port, port)
+		print >>verbose, "    Length: %d" % (size - 34)
+		print >>verbose, "Data (%d bytes)" % (size - 42)
+		print >>fields, "\t".join((str(size), "%d.%s" % (seconds, fraction), src, dst, port, "40000"))
+		frame = "\0" * 12 + struct.pack(">HBBHHHBBH4s4sHHHH", 0x0800, 0x45, 0, size - 14, 0, 0, 64, 17, 0, \
+				socket.inet_aton(src), socket.inet_aton(dst), int(port), 40000, size - 34, 0) + "\0" * (size - 42)
+		pcap.write(struct.pack("<IIII", seconds, int(fraction) * 1000, size, size) + frame)
+
+def bench_packets(n):
+	directory = tempfile.mkdtemp()
+	try:
+		verbose = os.path.join(directory, "verbose.txt")
+		fields = os.path.join(directory, "fields.txt")
+		pcap = os.path.join(directory, "trace.pcap")
+		files = open(verbose, "w"), open(fields, "w"), open(pcap, "wb")
+		write_packets(n, *files)
+		for f in files:
+			f.close()
+
+		start = time.time()
+		old = process_any.load_packets(verbose)
+		verbose_time = time.time() - start
+		start = time.time()
+		new = process_any.load_packets(fields)
+		fields_time = time.time() - start
+		start = time.time()
+		captured = process_any.load_packets(pcap)
+		pcap_time = time.time() - start
+
+		# the verbose reader never keeps the last packet
+		key = lambda p: (p.time, p.src, p.dst, p.size)
+		if map(key, old) != map(key, new[:len(old)]) or map(key, new) != map(key, captured):
+			print "MISMATCH"
+			sys.exit(1)
+		print "packet ingest,", n, "packets,", len(new), "kept"
+		print "\ttshark -V:", os.path.getsize(verbose) >> 10, "KB", verbose_time, "s"
+		print "\ttshark -T fields:", os.path.getsize(fields) >> 10, "KB", fields_time, "s"
+		print "\tpcap:", os.path.getsize(pcap) >> 10, "KB", pcap_time, "s"
+		print "\tspeedup over tshark -V: fields", verbose_time / fields_time, "pcap", verbose_time / pcap_time
+	finally:
+		shutil.rmtree(directory)
+
+def bench_merge(n):
+	'''States for n packets against a log with one state change per 20
+	packets'''
+	random.seed(1)
+	changes = []
+	t = 0
+	for i in xrange(n / 20):
+		t += random.randint(1, 4000)
+		changes.append((t, random.choice(process_any.lte_states)))
+	packet_times = sorted(random.randint(0, t) for i in xrange(n))
+
+	# the old way: everything into one dict by time, sort, forward fill
+	start = time.time()
+	all_events = {}
+	for change_time, state in changes:
+		all_events.setdefault(change_time, []).append(state)
+	for packet_time in packet_times:
+		all_events.setdefault(packet_time, []).append(None)
+	filled = []
+	state = None
+	for k in sorted(all_events.keys()):
+		for item in all_events[k]:
+			if item != None:
+				state = item
+			else:
+				filled.append(state)
+	sort_time = time.time() - start
+
+	# merge_packets: join the two time-ordered streams, and the states are
+	# filled forward as TransitionBuilder does
+	start = time.time()
+	decorated_changes = ((change_time, 0, state) for change_time, state in changes)
+	decorated_packets = ((packet_time, 1, None) for packet_time in packet_times)
+	merged = []
+	state = None
+	for item in heapq.merge(decorated_changes, decorated_packets):
+		if item[1] == 0:
+			state = item[2]
+		else:
+			merged.append(state)
+	merge_time = time.time() - start
+	if merged != filled:
+		print "MISMATCH"
+		sys.exit(1)
+
+	print "packet states,", n, "packets,", len(changes), "state changes"
+	print "\tmerge into all_events, sort, fill:", sort_time, "s"
+	print "\tmerge-join, fill:", merge_time, "s"
+
+def legacy_times(lines):
+	'''Event.__getTime as it was: a regex over every line of an event,
+	adding up a time of day'''
+	times = []
+	t = None
+	for line in lines:
+		if line.startswith("2013"):
+			if t != None:
+				times.append(t)
+			t = 0
+		if t != None:
+			match = re.search('(\d+):(\d+):(\d+)[.](\d+)', line)
+			if match:
+				t += int(match.group(4))
+				t += int(match.group(3)) * 1000
+				t += int(match.group(2)) * 60 * 1000
+				t += int(match.group(1)) * 3600 * 1000
+	times.append(t)
+	return times
+
+def header_times(lines):
+	times = []
+	for line in lines:
+		if timestamps.is_header(line):
+			times.append(timestamps.header_time(line))
+	return times
+
+def bench_headers(n):
+	random.seed(1)
+	lines = []
+	t = 18 * 3600 * 1000
+	for i in xrange(n):
+		t += random.randint(0, 50)
+		ms = t % 1000
+		s = t / 1000
+		lines.append("2013 Jun 12  %02d:%02d:%02d.%03d  [00]  0x1FFB  Event  --  EVENT_LTE_RRC_TIMER_STATUS" % \
+				(s / 3600 % 24, s / 60 % 60, s % 60, ms))
+		lines.append("Payload String = Timer Name = T310, Timer Value = 1000, Timer State = Stopped")
+		if i % 4 == 0:
+			lines.append("|   0|  -62.36|  -105.22|  -12.36|  1|  2|  -9.52|  3|  4|  5|")
+
+	start = time.time()
+	old = legacy_times(lines)
+	legacy_time = time.time() - start
+	start = time.time()
+	new = header_times(lines)
+	header_time = time.time() - start
+	# same times, up to the date
+	midnight = new[0] - old[0]
+	if [x - midnight for x in new] != old:
+		print "MISMATCH"
+		sys.exit(1)
+	print "event timestamps,", n, "events,", len(lines), "lines"
+	print "\tregex on every line:", legacy_time, "s"
+	print "\theader slicing:", header_time, "s"
+	print "\tspeedup:", legacy_time / header_time
+
+def legacy_signal(line):
+	'''Event.__getSignalStrengths as it was, minus the print'''
+	line = line.split("|")
+	if len(line) < 10:
+		return None
+	try:
+		if float(line[2]) >= 0:
+			return float(line[3]), float(line[4]), float(line[7])
+		else:
+			return float(line[2]), float(line[3]), float(line[6])
+	except:
+		return None
+
+def bench_signal(n):
+	random.seed(1)
+	lines = []
+	# a measurement table for every ten events, as in our logs
+	for i in xrange(n / 22):
+		for j in range(10):
+			event, payload = random.choice(SECONDARY_SAMPLES)
+			lines.append("2013 Jun 12  18:51:02.371  [00]  0x1FFB  Event  --  " + event)
+			lines.append(payload)
+		lines.append("|  # | RSSI | RSRP | RSRQ | a | b | c | d | e | f|")
+		lines.append("|   0|  %.2f|  %.2f|  %.2f|  1|  2|  %.2f|  3|  4|  5|" % \
+				(-60 - random.random() * 20, -90 - random.random() * 20, -10 - random.random() * 5, -8 - random.random() * 4))
+
+	start = time.time()
+	old = [legacy_signal(line) for line in lines]
+	legacy_time = time.time() - start
+	start = time.time()
+	new = [signal_series.parse_row(line) for line in lines]
+	row_time = time.time() - start
+	if old != new:
+		print "MISMATCH"
+		sys.exit(1)
+
+	series = signal_series.SignalSeries()
+	for i, row in enumerate(new):
+		if row != None:
+			series.add(i, *row)
+	start = time.time()
+	for i in xrange(0, len(lines), 2):
+		series.at(i)
+	lookup_time = time.time() - start
+
+	print "signal strengths,", len(lines), "lines,", len(series), "measurements"
+	print "\tsplit every line:", legacy_time, "s"
+	print "\tprefix check first:", row_time, "s"
+	print "\tspeedup:", legacy_time / row_time
+	print "\t", len(lines) / 2, "lookups:", lookup_time, "s"
+
+MOBIPERF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mobiperf-measurement")
+
+def parse_file(filename):
+	'''An EventParser that has read filename the way parse does, one
+	addNewLine per line'''
+	event_parser = process_any.EventParser()
+	f = open(filename)
+	for line in process_any.event_lines(f):
+		event_parser.addNewLine(line)
+	f.close()
+	return event_parser
+
+def suite_events(filename):
+	start = time.time()
+	event_parser = parse_file(filename)
+	seconds = time.time() - start
+	return sum(len(v) for v in event_parser.all_events.itervalues()), seconds
+
+def suite_transitions(filename):
+	event_parser = parse_file(filename)
+	events = list(event_parser.ordered_events())
+	event_parser.all_events = {}
+	start = time.time()
+	process_any.build_transitions(events, event_parser.signal)
+	return len(events), time.time() - start
+
+def suite_packets(filename):
+	start = time.time()
+	pa = process_any.packet_analyzer.PacketAnalyzer(process_any.TARGET_IP)
+	f = open(filename)
+	for line in f:
+		pa.add_line(line)
+	f.close()
+	pa.find_timings()
+	return pa.frames, time.time() - start
+
+def suite_measurements(directory):
+	import parse_mobiperf_measurements
+	datalist = parse_mobiperf_measurements.MeasurementSet()
+	start = time.time()
+	for folder in sorted(os.listdir(directory)):
+		parse_mobiperf_measurements.parse_measurement(os.path.join(directory, folder), datalist)
+	return len(datalist), time.time() - start
+
+def suite_table(directory):
+	import parse_mobiperf_measurements
+	table = parse_mobiperf_measurements.MeasurementTable()
+	start = time.time()
+	for folder in sorted(os.listdir(directory)):
+		parse_mobiperf_measurements.load_table(os.path.join(directory, folder), table)
+	table.summary()
+	return len(table), time.time() - start
+
+def write_events(filename, n):
+	f = open(filename, "w")
+	synthetic.write_lines(synthetic.qxdm_lines(n), f)
+	f.close()
+
+def write_tshark(filename, n):
+	f = open(filename, "w")
+	synthetic.write_lines(synthetic.tshark_lines(n), f)
+	f.close()
+
+def write_measurements(directory, n):
+	import synthetic_measurements
+	synthetic_measurements.write_dataset(directory, n)
+
+# what is timed, what its input is made with and what it is made of
+SUITE = [
+	("addNewLine", suite_events, write_events, "events"),
+	("transitions", suite_transitions, write_events, "events"),
+	("PacketAnalyzer", suite_packets, write_tshark, "packets"),
+	("parse_measurement", suite_measurements, write_measurements, "measurements"),
+	("load_table", suite_table, write_measurements, "measurements"),
+]
+
+def run_suite_target(target, path):
+	'''Run in a fresh process, so that the peak memory is this run's own
+	(the input, where it is read in before the timing starts, included)'''
+	base = rss()
+	records, seconds = target(path)
+	# kilobytes on Linux
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - base
+	return records, seconds, peak
+
+def suite_scales(n):
+	'''10^4, 10^5, ... up to n'''
+	scales = []
+	scale = 10000
+	while scale < n:
+		scales.append(scale)
+		scale *= 10
+	return scales + [n]
+
+def bench_suite(n):
+	sys.path.insert(0, MOBIPERF)
+	suite = SUITE
+	try:
+		import parse_mobiperf_measurements
+	except ImportError, e:
+		print "parse_measurement skipped:", e
+		suite = [item for item in suite if item[2] != write_measurements]
+	directory = tempfile.mkdtemp()
+	try:
+		print "%-18s %9s %9s %11s %9s" % ("", "input", "seconds", "records/s", "peak MB")
+		for name, target, write, unit in suite:
+			for scale in suite_scales(n):
+				path = os.path.join(directory, "%s_%d" % (unit, scale))
+				if not os.path.exists(path):
+					write(path, scale)
+				pool = multiprocessing.Pool(1)
+				try:
+					records, seconds, peak = pool.apply(run_suite_target, (target, path))
+				finally:
+					pool.close()
+					pool.join()
+				print "%-18s %9d %9.3f %11d %9.1f  (%d %s)" % (name, scale, seconds, records / max(seconds, 1e-6), \
+						peak / 1048576.0, records, unit)
+				sys.stdout.flush()
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	benchmarks = {"secondary": bench_secondary, "stats": bench_stats, "store": bench_store, \
+			"transitions": bench_transitions, "correlation": bench_correlation, \
+			"packets": bench_packets, "merge": bench_merge, \
+			"headers": bench_headers, "signal": bench_signal, "suite": bench_suite}
+	if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+		print "usage:", sys.argv[0], "|".join(sorted(benchmarks.keys())), "[n]"
+		sys.exit(1)
+	n = 200000
+	if len(sys.argv) > 2:
+		n = int(sys.argv[2])
+	benchmarks[sys.argv[1]](n)
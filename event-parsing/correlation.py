@@ -0,0 +1,296 @@
+#!/usr/bin/python
+
+# The per-transition correlation rows (<root>_<type>.txt): which rows a
+# transition gets, and writing them out.
+#
+# A rule says which transitions it covers (a substring of the transition's
+# name), the file they go to, the occasional events to flag, the pairs of
+# events to time and any extra columns.  A RuleSet compiles each rule once
+# and remembers which rule every transition name it has seen maps to, so a
+# transition costs a few dict lookups.  Rule sets load from JSON files
+# laid out like DEFAULT_RULES, with lists for the pairs:
+#
+#	[{"match": "connected -> closing closing ->", "ignore_case": true,
+#	  "type": "closing", "occasionals": ["EVENT_LTE_UL_OUT_OF_SYNC"],
+#	  "time_matters": [["-begin-", "EVENT_LTE_MAC_TIMER"]],
+#	  "extras": ["closing_timers"]}]
+#
+# "-begin-" and "-end-" in a pair stand for the start and end of the
+# transition.  Extras are looked up by name in EXTRAS.
+#
+# CorrelationWriter keeps one handle per transition type open for the whole
+# report and writes rows out in batches, instead of opening and closing the
+# file for every transition.  With binary=True each type also gets
+#
+#	<root>_<type>.f8	every value of every row, as native float64
+#				(NaN where the text has None)
+#	<root>_<type>.rows	native C long offsets into .f8 where each row
+#				starts, plus one past the end of the last row
+#
+# Rows are not all the same length (the closing rows have optional timer
+# columns), so row i is values[rows[i]:rows[i+1]].  With numpy:
+#
+#	values = numpy.fromfile(root + "_closing.f8")
+#	rows = numpy.fromfile(root + "_closing.rows", dtype=numpy.int_)
+#	table = numpy.split(values, rows[1:-1])
+
+import os, json
+from array import array
+
+NAN = float("nan")
+
+def _float(x):
+	try:
+		return float(x)
+	except (TypeError, ValueError):
+		return NAN
+
+# the first rule that matches a transition's name is the one used
+DEFAULT_RULES = [
+	{"match": "camped -> connecting connecting -> connected", "ignore_case": True, "type": "connecting",
+		"occasionals": ["EVENT_LTE_EMM_INCOMING_MSG", "EVENT_LTE_EMM_TIMER_EXPIRY", "EVENT_LTE_RACH_ACCESS_START", "EVENT_LTE_EMM_TIMER_START"],
+		"time_matters": [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RACH_RAID_MATCH"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_MAC_TIMER"), ("EVENT_LTE_RACH_RAID_MATCH", "EVENT_LTE_RACH_ACCESS_RESULT"), ("EVENT_LTE_RRC_UL_MSG", "EVENT_LTE_RRC_DL_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_UL_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_PAGING_DRX_CYCLE")],
+		"extras": []},
+	{"match": "connected -> closing closing ->", "ignore_case": True, "type": "closing",
+		"occasionals": ["EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_LTE_RACH_ACCESS_RESULT", "EVENT_LTE_UL_OUT_OF_SYNC", "EVENT_LTE_RACH_ACCESS_START", "EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_INCOMING_MSG", "EVENT_LTE_CM_OUTGOING_MSG", "EVENT_LTE_RACH_RAID_MATCH", "EVENT_LTE_TIMING_ADVANCE", "EVENT_LTE_ML1_PHR_REPORT", "EVENT_LTE_BSR_SR_REQUEST", "EVENT_SLOTTED_MODE_OPERATION", "EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_SD_EVENT_ACTION", "EVENT_IDLE_HANDOFF"],
+		"time_matters": [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_MAC_TIMER"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_TIMER_STATUS"), ("EVENT_LTE_MAC_TIMER", "EVENT_LTE_RRC_TIMER_STATUS")],
+		"extras": ["closing_timers"]},
+	{"match": "closing -> idle not camped idle not camped -> idle camped", "ignore_case": True, "type": "idle_nc",
+		"occasionals": ["EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_INCOMING_MSG", "EVENT_IPV6_SM_EVENT", "EVENT_LTE_RRC_DL_MSG", "EVENT_LTE_ESM_OUTGOING_MSG"],
+		"time_matters": [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_EMM_TIMER_START"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_EMM_INCOMING_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_TIMER_STATUS"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_NEW_CELL_IND")],
+		"extras": ["idle_timer_value"]},
+	{"match": "CELL_PCH -> CELL_FACH CELL_FACH -> CELL_DCH", "ignore_case": False, "type": "fach_promote",
+		"occasionals": ["CELL_UPDATE_MSG", "MEASUREMENT_REPORT_MSG"],
+		"time_matters": [("-begin-", "RADIO_BEARER_RECONFIGURATION_MSG"), ("RADIO_BEARER_RECONFIGURATION_MSG", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG"), ("-begin-", "CELL_UPDATE_CONFIRM_MSG"), ("RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG", "-end-")],
+		"extras": []},
+	{"match": "CELL_DCH -> CELL_FACH CELL_FACH -> CELL_DCH", "ignore_case": False, "type": "fach_temp",
+		"occasionals": [],
+		"time_matters": [("-begin-", "EVENT_WCDMA_RLC_CONFIG"), ("EVENT_WCDMA_RLC_CONFIG", "EVENT_WCDMA_RLC_CONFIG"), ("EVENT_WCDMA_RLC_CONFIG", "-end-"), ("RADIO_BEARER_RECONFIGURATION_MSG", "-end-"), ("RADIO_BEARER_RECONFIGURATION_MSG", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG")],
+		"extras": []},
+	{"match": "CELL_DCH -> CELL_FACH CELL_FACH -> CELL_PCH", "ignore_case": False, "type": "fach_demote",
+		"occasionals": [],
+		"time_matters": [("-begin-", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_MSG", "-end-"), ("-begin-", "EVENT_WCDMA_RLC_CONFIG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_MSG", "PHYSICAL_CHANNEL_RECONFIGURATION_COMPLETE_MSG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_COMPLETE_MSG", "-end-")],
+		"extras": []},
+	{"match": "Disconnected -> Connecting Connecting -> CELL_DCH", "ignore_case": False, "type": "hspdap_connecting",
+		"occasionals": ["PACKET_RCV", "RRC_CONNECTION_REJECT_MSG", "RRC_CONNECTION_REQUEST_MSG"],
+		"time_matters": [("-begin-", "EVENT_WCDMA_PRACH"), ("-begin-", "RRC_CONNECTION_REQUEST_MSG"), ("-begin-", "EVENT_WCDMA_L1_STATE"), ("RRC_CONNECTION_REQUEST_MSG", "-end-"), ("EVENT_WCDMA_RRC_URNTI", "-end-"), ("RRC_CONNECTION_SETUP_MSG", "RRC_CONNECTION_SETUP_COMPLETE_MSG"), ("EVENT_WCDMA_L1_STATE", "EVENT_WCDMA_RRC_URNTI"), ("-begin-", "EVENT_WCDMA_ASET"), ("EVENT_WCDMA_ASET", "-end-"), ("EVENT_WCDMA_RRC_URNTI", "EVENT_WCDMA_ASET")],
+		"extras": []},
+	{"match": "CELL_DCH -> Disconnected Disconnected -> Connecting", "ignore_case": False, "type": "hspdap_disconnected",
+		"occasionals": ["PAGING_TYPE_1_MSG", "EVENT_WCDMA_RRCCSP_SCAN_START", "PACKET_RCV", "EVENT_LTE_EMM_TIMER_EXPIRY"],
+		"time_matters": [("EVENT_GMM_STATE", "-end-"), ("EVENT_WCDMA_CONN_REQ_CAUSE", "-end-"), ("-begin-", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("-begin-", "EVENT_WCDMA_RRCCSP_SCAN_START"), ("EVENT_WCDMA_RRCCSP_SCAN_START", "EVENT_WCDMA_L1_STATE"), ("EVENT_WCDMA_L1_STATE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_WCDMA_L1_ACQ_SUBSTATE", "EVENT_WCDMA_L1_STATE"), ("EVENT_WCDMA_L1_ACQ_SUBSTATE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_WCDMA_CONN_REL_CAUSE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_PLMN_INFORMATION", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("-begin-", "EVENT_WCDMA_L1_STATE"), ("-begin-", "EVENT_MM_STATE"), ("-begin-", "EVENT_WCDMA_CONN_REL_CAUSE"), ("-begin-", "EVENT_PLMN_INFORMATION"), ("RRC_CONNECTION_REQUEST_MSG", "-end"), ("EVENT_WCDMA_CONN_REQ_CAUSE", "RRC_CONNECTION_REQUEST_MSG"), ("EVENT_GMM_STATE", "RRC_CONNECTION_REQUEST_MSG")],
+		"extras": []},
+	{"match": "Connecting -> CELL_DCH CELL_DCH -> Disconnected", "ignore_case": False, "type": "hspdap_dch",
+		"occasionals": ["DOWNLINK_DIRECT_TRANSFER_MSG", "UPLINK_DIRECT_TRANSFER_MSG"],
+		"time_matters": [("-begin-", "EVENT_CM_CELL_SRV_IND"), ("-begin-", "INITIAL_DIRECT_TRANSFER_MSG"), ("-begin-", "EVENT_CM_COUNTRY_SELECTED"), ("-begin-", "EVENT_NAS_MESSAGE_SENT"), ("-begin-", "EVENT_LTE_EMM_TIMER_START"), ("-begin-", "ACTIVE_SET_UPDATE_MSG"), ("-begin-", "ACTIVE_SET_UPDATE_COMPLETE_MSG"), ("-begin-", "SECURITY_MODE_COMMAND_MSG"), ("-begin-", "EVENT_WCDMA_ASET"), ("-begin-", "SECURITY_MODE_COMPLETE_MSG"), ("-begin-", "EVENT_GMM_STATE"), ("-begin-", "EVENT_NAS_MESSAGE_RECEIVED"), ("SIGNALLING_CONNECTION_RELEASE_INDICATION_MSG", "-end-"), ("EVENT_IPV6_SM_EVENT", "-end-"), ("RRC_CONNECTION_RELEASE_COMPLETE_MSG", "-end-"), ("EVENT_EUL_RECONFIG_OR_ASU", "-end-"), ("EVENT_HS_DSCH_STATUS", "-end-"), ("EVENT_WCDMA_L1_STATE", "-end-"), ("SECURITY_MODE_COMMAND_MSG", "SECURITY_MODE_COMPLETE_MSG"), ("EVENT_NAS_MESSAGE_SENT", "EVENT_NAS_MESSAGE_RECEIVED"), ("ACTIVE_SET_UPDATE_MSG", "ACTIVE_SET_UPDATE_COMPLETE_MSG")],
+		"extras": []},
+]
+
+def closing_timers(transition, distinct_events):
+	first = transition.time_to_reach_first
+	last = transition.time_to_reach_last
+	values = []
+	if first.get("EVENT_LTE_MAC_TIMER") != None:
+		values.append(first["EVENT_LTE_MAC_TIMER"] - last["EVENT_LTE_MAC_TIMER"])
+	if first.get("EVENT_LTE_RRC_TIMER_STATUS") != None:
+		values.append(first["EVENT_LTE_RRC_TIMER_STATUS"] - last["EVENT_LTE_RRC_TIMER_STATUS"])
+	if "EVENT_LTE_MAC_TIMER" in distinct_events:
+		if "Start" in transition.attributes_first.get("EVENT_LTE_MAC_TIMER", {}):
+			values.append(1)
+		else:
+			values.append(0)
+	return values
+
+def idle_timer_value(transition, distinct_events):
+	attributes = transition.attributes_first.get("EVENT_LTE_RRC_TIMER_STATUS", {})
+	return [attributes.get("Timer Value", -1)]
+
+# extra columns a rule can ask for: name -> function(transition,
+# distinct_events) returning the values to add to the row
+EXTRAS = {
+	"closing_timers": closing_timers,
+	"idle_timer_value": idle_timer_value,
+}
+
+class Rule:
+	def __init__(self, match, type, occasionals=(), time_matters=(), extras=(), ignore_case=False):
+		self.ignore_case = ignore_case
+		self.match = match.lower() if ignore_case else match
+		self.transition_type = str(type)
+		self.occasionals = [str(o) for o in occasionals]
+		# start, end, and which of the cases below can apply
+		self.pairs = [(str(start), str(end), start == end, start == "-begin-", end == "-end-") \
+				for start, end in time_matters]
+		for extra in extras:
+			if extra not in EXTRAS:
+				raise ValueError("unknown correlation extra " + extra)
+		self.extras = [EXTRAS[extra] for extra in extras]
+		# event name -> indices of the occasionals it contains
+		self.hits = {}
+
+	def matches(self, name):
+		if self.ignore_case:
+			name = name.lower()
+		return self.match in name
+
+	def __hits(self, name):
+		hits = self.hits.get(name)
+		if hits == None:
+			hits = tuple(i for i, o in enumerate(self.occasionals) if o in name)
+			self.hits[name] = hits
+		return hits
+
+	def row(self, transition, distinct_events):
+		first = transition.time_to_reach_first
+		last = transition.time_to_reach_last
+		inter_time = transition.end_time - transition.begin_time
+
+		occasionals = [0] * len(self.occasionals)
+		for name, count in transition.duplicates_all.iteritems():
+			if count > 0:
+				for i in self.__hits(name):
+					occasionals[i] = 1
+
+		row = [inter_time]
+		row.extend(occasionals)
+		row.append(transition.RSSI)
+		row.append(transition.power_ratio)
+
+		for start, end, same, from_begin, to_end in self.pairs:
+			start_first = first.get(start)
+			if same and start_first != None and last.get(end) != None:
+				row.append((inter_time - last[end]) - start_first)
+			elif start_first != None and first.get(end) != None:
+				row.append(first[end] - start_first)
+			elif from_begin and first.get(end) != None:
+				row.append(first[end])
+			elif to_end and last.get(start) != None:
+				row.append(last[start])
+			else:
+				row.append(-1)
+
+		for extra in self.extras:
+			row.extend(extra(transition, distinct_events))
+		return row
+
+class RuleSet:
+	def __init__(self, rules=DEFAULT_RULES):
+		self.rules = [Rule(**dict((str(k), v) for k, v in rule.iteritems())) for rule in rules]
+		# transition name -> first rule that matches it, or None
+		self.by_name = {}
+
+	def rule(self, name):
+		try:
+			return self.by_name[name]
+		except KeyError:
+			pass
+		rule = None
+		for r in self.rules:
+			if r.matches(name):
+				rule = r
+				break
+		self.by_name[name] = rule
+		return rule
+
+	def types(self):
+		return sorted(set(rule.transition_type for rule in self.rules))
+
+def load_rules(filename):
+	f = open(filename)
+	rules = json.load(f)
+	f.close()
+	return RuleSet(rules)
+
+class CorrelationWriter:
+	'''With sizes, a dict of path: length from sizes() of an earlier
+	writer, rows are added after what was there then (anything written
+	after that is cut off) instead of to empty files.'''
+	def __init__(self, root, types, binary=False, batch=4096, sizes=None):
+		self.root = root
+		self.types = types
+		self.binary = binary
+		# rows held per type before they are written out
+		self.batch = batch
+		self.files = {}
+		self.rows = {}
+		self.values = {}
+		self.offsets = {}
+		self.count = {}
+		for transition_type in types:
+			for suffix in (".txt", ".f8", ".rows"):
+				path = self.__path(transition_type, suffix)
+				if not os.path.isfile(path):
+					continue
+				if sizes != None and path in sizes:
+					f = open(path, "r+b")
+					f.truncate(sizes[path])
+					f.close()
+				else:
+					# rows are appended, so start from empty files
+					os.remove(path)
+
+	def __path(self, transition_type, suffix):
+		return self.root + "_" + transition_type + suffix
+
+	def __open(self, transition_type):
+		files = [open(self.__path(transition_type, ".txt"), "a")]
+		if self.binary:
+			files.append(open(self.__path(transition_type, ".f8"), "ab"))
+			files.append(open(self.__path(transition_type, ".rows"), "ab"))
+			self.values[transition_type] = array("d")
+			self.offsets[transition_type] = array("l")
+			# values already in the file
+			self.count[transition_type] = os.path.getsize(self.__path(transition_type, ".f8")) / 8
+		self.files[transition_type] = files
+		self.rows[transition_type] = []
+
+	def write(self, transition_type, row):
+		'''Add one row, a list of values, to transition_type's files'''
+		if transition_type not in self.files:
+			self.__open(transition_type)
+		# as print >>f, x, would have written them
+		rows = self.rows[transition_type]
+		rows.append(" ".join(map(str, row)) + "\n")
+		if self.binary:
+			self.offsets[transition_type].append(self.count[transition_type])
+			self.count[transition_type] += len(row)
+			self.values[transition_type].extend(map(_float, row))
+		if len(rows) >= self.batch:
+			self.__flush(transition_type)
+
+	def __flush(self, transition_type):
+		files = self.files[transition_type]
+		files[0].write("".join(self.rows[transition_type]))
+		del self.rows[transition_type][:]
+		if self.binary:
+			self.values[transition_type].tofile(files[1])
+			self.offsets[transition_type].tofile(files[2])
+			del self.values[transition_type][:]
+			del self.offsets[transition_type][:]
+
+	def flush(self):
+		for transition_type in self.files:
+			self.__flush(transition_type)
+			for f in self.files[transition_type]:
+				f.flush()
+
+	def sizes(self):
+		'''Write out the rows held and return the length of each file, to
+		carry on from with a later writer (before close, which ends the
+		.rows files)'''
+		self.flush()
+		sizes = {}
+		for transition_type in self.types:
+			for suffix in (".txt", ".f8", ".rows"):
+				path = self.__path(transition_type, suffix)
+				if os.path.isfile(path):
+					sizes[path] = os.path.getsize(path)
+		return sizes
+
+	def close(self):
+		for transition_type, files in self.files.iteritems():
+			self.__flush(transition_type)
+			if self.binary:
+				array("l", [self.count[transition_type]]).tofile(files[2])
+			for f in files:
+				f.close()
+		self.files = {}
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+# On-disk cache of parsed event files, so a rerun with different filters
+# does not have to parse the text again.
+#
+# Each event file gets one entry: a pickled header (cache key, side tables
+# of the EventStore and whatever else the caller wants back) followed by the
+# raw bytes of every column, each starting on an 8 byte boundary.  The
+# columns are memory-mapped back as ctypes arrays rather than read, so a
+# load costs little more than the header and only the pages a run touches
+# are read.  Entries are keyed by the file's path, size, mtime and a hash of
+# its contents, and the least recently used ones are removed once the cache
+# outgrows its cap.
+
+import os, hashlib, cPickle, mmap, ctypes
+from array import array
+import event_store
+
+# bump when the parser or the entry layout changes what a cached file means
+FORMAT = 5
+
+# what each array typecode of the columns maps back to
+CTYPES = {"d": ctypes.c_double, "i": ctypes.c_int, "l": ctypes.c_long}
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rrc-analysis", "events")
+
+# bytes hashed at each of the start, middle and end of the file
+SAMPLE = 1 << 20
+
+def content_hash(path, size, full=False):
+	'''sha1 of the file, or with full=False of 1 MB samples at its start,
+	middle and end, which is enough to notice a re-export'''
+	h = hashlib.sha1()
+	f = open(path, "rb")
+	if full or size <= 3 * SAMPLE:
+		for block in iter(lambda: f.read(SAMPLE), ""):
+			h.update(block)
+	else:
+		for offset in (0, size / 2, size - SAMPLE):
+			f.seek(offset)
+			h.update(f.read(SAMPLE))
+	f.close()
+	return h.hexdigest()
+
+def aligned(offset):
+	return (offset + 7) & ~7
+
+def map_columns(f, offset, rows, columns):
+	'''{name: column} for the columns of rows entries each, laid out in f
+	from offset on.  A column is a ctypes array over a private (copy on
+	write) map of the file, which indexes and iterates like an array.'''
+	size = os.fstat(f.fileno()).st_size
+	end = offset
+	for name, typecode in columns:
+		end = aligned(end) + rows * array(typecode).itemsize
+	if end > size:
+		raise EOFError("entry cut short")
+	mapped = {}
+	if rows == 0:
+		# an empty map cannot be made
+		for name, typecode in columns:
+			mapped[name] = array(typecode)
+		return mapped
+	data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+	for name, typecode in columns:
+		offset = aligned(offset)
+		# the column keeps the map open
+		mapped[name] = (CTYPES[typecode] * rows).from_buffer(data, offset)
+		offset += rows * array(typecode).itemsize
+	return mapped
+
+def cache_key(path, full_hash=False):
+	st = os.stat(path)
+	return (os.path.abspath(path), st.st_size, st.st_mtime, content_hash(path, st.st_size, full_hash))
+
+class EventCache:
+	def __init__(self, directory=DEFAULT_DIR, max_bytes=1 << 30, full_hash=False):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.full_hash = full_hash
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def entry(self, path):
+		name = hashlib.sha1(os.path.abspath(path)).hexdigest()
+		return os.path.join(self.directory, name + ".events")
+
+	def load(self, path):
+		'''Return (store, extra) cached for path, or None if there is no
+		valid entry'''
+		entry = self.entry(path)
+		if not os.path.isfile(entry):
+			return None
+		f = open(entry, "rb")
+		try:
+			header = cPickle.load(f)
+			if header["format"] != FORMAT or header["key"] != cache_key(path, self.full_hash):
+				f.close()
+				os.remove(entry)
+				return None
+			store = event_store.EventStore()
+			for name, value in header["tables"].iteritems():
+				setattr(store, name, value)
+			columns = map_columns(f, f.tell(), header["rows"], header["columns"])
+			for name, column in columns.iteritems():
+				setattr(store, name, column)
+		except (EOFError, KeyError, ValueError, cPickle.UnpicklingError):
+			# cut short or from an incompatible version
+			f.close()
+			os.remove(entry)
+			return None
+		f.close()
+		# mark as recently used
+		os.utime(entry, None)
+		return store, header["extra"]
+
+	def save(self, path, store, extra=None):
+		header = {
+			"format": FORMAT,
+			"key": cache_key(path, self.full_hash),
+			"rows": len(store),
+			"columns": [(name, getattr(store, name).typecode) for name in event_store.EventStore.COLUMNS],
+			"tables": dict((name, getattr(store, name)) for name in event_store.EventStore.TABLES),
+			"extra": extra,
+		}
+		entry = self.entry(path)
+		tmp = entry + ".tmp%d" % os.getpid()
+		f = open(tmp, "wb")
+		cPickle.dump(header, f, 2)
+		for name in event_store.EventStore.COLUMNS:
+			f.write("\0" * (aligned(f.tell()) - f.tell()))
+			getattr(store, name).tofile(f)
+		f.close()
+		# readers never see a half-written entry
+		os.rename(tmp, entry)
+		self.evict(entry)
+
+	def evict(self, keep=None):
+		'''Remove least recently used entries, other than keep, until the
+		cache fits max_bytes'''
+		entries = []
+		total = 0
+		for name in os.listdir(self.directory):
+			if not name.endswith(".events"):
+				continue
+			path = os.path.join(self.directory, name)
+			st = os.stat(path)
+			entries.append((st.st_mtime, st.st_size, path))
+			total += st.st_size
+		entries.sort()
+		for mtime, size, path in entries:
+			if total <= self.max_bytes:
+				break
+			if path == keep:
+				continue
+			os.remove(path)
+			total -= size
+
+	def clear(self):
+		for name in os.listdir(self.directory):
+			if name.endswith(".events"):
+				os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+
+# Column storage for parsed events.  Instead of one Event object (with its
+# raw line, its own attribute dict and a dozen attributes) per event, the
+# store keeps one array per field and interns event names and states to
+# small integer codes.  Secondary attributes are interned the same way, as
+# the same few payloads repeat all through a log; subtypes, which few events
+# have, live in a side table keyed by row.
+
+from array import array
+
+NAN = float("nan")
+
+def _value(x):
+	if x == None:
+		return NAN
+	return x
+
+def _optional(x):
+	if x != x:
+		return None
+	return x
+
+class StoredEvent:
+	'''A row of an EventStore, with the attributes Transition and
+	TransitionBuilder expect from an Event'''
+	__slots__ = ("time", "event", "event_line", "before_state", "after_state", "subtype", \
+			"secondary_attributes", "RSSI", "RSRP", "RSRQ", "power_ratio")
+
+	def printme(self):
+		print self.time, "\t", self.after_state, "\t", self.event, self.subtype
+		for k, v in self.secondary_attributes.iteritems():
+			print "\t", k, ":", v
+
+class EventStore:
+	# the arrays, all one entry per row, and the tables they index into
+	COLUMNS = ("times", "events", "before_states", "after_states", "RSSI", "RSRP", "RSRQ", \
+			"power_ratio", "attributes")
+	TABLES = ("attribute_sets", "attribute_codes", "subtypes", "names", "name_codes", "states", "state_codes")
+
+	def __init__(self):
+		self.times = array("d")
+		self.events = array("i")
+		# -1 stands for no state
+		self.before_states = array("i")
+		self.after_states = array("i")
+		# NaN stands for no measurement
+		self.RSSI = array("d")
+		self.RSRP = array("d")
+		self.RSRQ = array("d")
+		self.power_ratio = array("d")
+		# -1 stands for no attributes
+		self.attributes = array("i")
+		self.attribute_sets = []
+		self.attribute_codes = {}
+		self.subtypes = {}
+		self.names = []
+		self.name_codes = {}
+		self.states = []
+		self.state_codes = {}
+
+	def __len__(self):
+		return len(self.times)
+
+	def __intern(self, value, values, codes):
+		code = codes.get(value)
+		if code == None:
+			code = len(values)
+			codes[value] = code
+			values.append(value)
+		return code
+
+	def __state(self, state):
+		if state == None:
+			return -1
+		return self.__intern(state, self.states, self.state_codes)
+
+	def __attributes(self, attributes):
+		if not attributes:
+			return -1
+		key = tuple(attributes.iteritems())
+		code = self.attribute_codes.get(key)
+		if code == None:
+			code = len(self.attribute_sets)
+			self.attribute_codes[key] = code
+			# rows with equal attributes share one dict; nothing downstream
+			# changes them
+			self.attribute_sets.append(attributes)
+		return code
+
+	def append(self, event):
+		row = len(self.times)
+		self.times.append(event.time)
+		self.events.append(self.__intern(event.event, self.names, self.name_codes))
+		self.before_states.append(self.__state(event.before_state))
+		self.after_states.append(self.__state(event.after_state))
+		self.RSSI.append(_value(event.RSSI))
+		self.RSRP.append(_value(event.RSRP))
+		self.RSRQ.append(_value(event.RSRQ))
+		self.power_ratio.append(_value(event.power_ratio))
+		self.attributes.append(self.__attributes(event.secondary_attributes))
+		if event.subtype:
+			self.subtypes[row] = event.subtype
+
+	def state_code(self, state):
+		'''The code state is stored as, -1 for None'''
+		return self.__state(state)
+
+	def extend(self, other):
+		'''Append the rows of other, another EventStore'''
+		offset = len(self.times)
+		names = [self.__intern(name, self.names, self.name_codes) for name in other.names]
+		states = [self.__state(state) for state in other.states]
+		attribute_sets = [self.__attributes(attributes) for attributes in other.attribute_sets]
+		self.times.extend(other.times)
+		self.events.extend(array("i", [names[c] for c in other.events]))
+		self.before_states.extend(array("i", [states[c] if c >= 0 else -1 for c in other.before_states]))
+		self.after_states.extend(array("i", [states[c] if c >= 0 else -1 for c in other.after_states]))
+		self.RSSI.extend(other.RSSI)
+		self.RSRP.extend(other.RSRP)
+		self.RSRQ.extend(other.RSRQ)
+		self.power_ratio.extend(other.power_ratio)
+		self.attributes.extend(array("i", [attribute_sets[c] if c >= 0 else -1 for c in other.attributes]))
+		for row, subtype in other.subtypes.iteritems():
+			self.subtypes[row + offset] = subtype
+
+	def event(self, row):
+		e = StoredEvent()
+		e.time = int(self.times[row])
+		e.event = self.names[self.events[row]]
+		e.event_line = None
+		before = self.before_states[row]
+		e.before_state = self.states[before] if before >= 0 else None
+		after = self.after_states[row]
+		e.after_state = self.states[after] if after >= 0 else None
+		e.subtype = self.subtypes.get(row, "")
+		attributes = self.attributes[row]
+		if attributes >= 0:
+			e.secondary_attributes = self.attribute_sets[attributes]
+		else:
+			e.secondary_attributes = {}
+		e.RSSI = _optional(self.RSSI[row])
+		e.RSRP = _optional(self.RSRP[row])
+		e.RSRQ = _optional(self.RSRQ[row])
+		e.power_ratio = _optional(self.power_ratio[row])
+		return e
+
+	def order(self):
+		'''Rows sorted by time; rows with the same time stay in the order
+		they were added, as they do in EventParser.all_events'''
+		return array("l", sorted(xrange(len(self.times)), key=self.times.__getitem__))
+
+	def iter_ordered(self):
+		for row in self.order():
+			yield self.event(row)
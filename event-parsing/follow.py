@@ -0,0 +1,309 @@
+#!/usr/bin/python
+
+# Follow a QXDM event file that is still being exported (as on a drive
+# test) and keep its transition statistics up to date, parsing only the
+# lines added since the last look.
+#
+#	./follow.py live_events.txt -o report.txt --checkpoint live.ckpt
+#
+# Closed transitions are not kept: each goes into the running summary of
+# its kind and, with a root, its interval and correlation rows are written
+# out as it closes.  The parser's state (the event being read, the RRC
+# state, the reorder buffer, the open transition and the summaries) is
+# pickled to the checkpoint file along with how far into the file it got
+# and how long the root's files were, so a restart picks up from there
+# instead of reading the file again.  Stop with ^C.  A resumed run writes
+# the same report and files as one that never stopped.
+#
+# The correlation rows of a transition are written when it closes, so they
+# go by the event types seen up to then, and the rows of different kinds
+# are in the order they closed.
+
+import sys, os, glob, time, argparse, logging, cPickle
+from collections import OrderedDict
+import process_any, correlation, transition_report
+
+log = logging.getLogger("follow")
+
+# bytes at the start of the file that tell it apart from a new export
+HEAD = 4096
+
+class RootFiles:
+	'''The interval and correlation files of root, written as transitions
+	close.  The intervals of each kind go to a file of their own,
+	<root>_intervals.<n>.part for the nth kind, which close() puts together
+	into <root>_intervals.txt.  With sizes (from sizes()), the files are
+	carried on from where they were then.'''
+	def __init__(self, root, rules=None, binary=False, sizes=None):
+		if rules == None:
+			rules = process_any.correlation_rules
+		self.root = root
+		self.rules = rules
+		self.writer = correlation.CorrelationWriter(root, rules.types(), binary, sizes=sizes)
+		self.parts = {}
+		if sizes == None:
+			sizes = {}
+		for path in glob.glob(root + "_intervals.*.part"):
+			if path in sizes:
+				f = open(path, "r+b")
+				f.truncate(sizes[path])
+				f.close()
+			else:
+				os.remove(path)
+
+	def __part(self, n):
+		return "%s_intervals.%d.part" % (self.root, n)
+
+	def add(self, n, name, transition, distinct_events):
+		'''Write the rows of transition, of the nth kind, name'''
+		if "None" not in name and transition.end_time != 0:
+			if n not in self.parts:
+				self.parts[n] = open(self.__part(n), "a")
+			self.parts[n].write(str(transition.end_time - transition.begin_time) + "\n")
+		transition.find_correlation(name, self.writer, distinct_events, self.rules)
+
+	def sizes(self):
+		'''Write out what is held and return the length of every file'''
+		sizes = self.writer.sizes()
+		for n, f in self.parts.iteritems():
+			f.flush()
+			sizes[self.__part(n)] = os.path.getsize(self.__part(n))
+		return sizes
+
+	def abandon(self):
+		'''Close the files without putting the intervals together'''
+		self.writer.close()
+		for f in self.parts.itervalues():
+			f.close()
+		self.parts = {}
+
+	def close(self, names):
+		'''Close the files and write <root>_intervals.txt, with the kinds
+		in names (in the order they were numbered) as process_any lays it
+		out'''
+		self.abandon()
+		out = open(self.root + "_intervals.txt", "w")
+		for n, name in enumerate(names):
+			if "None" in name:
+				continue
+			out.write(name + "\n")
+			if os.path.isfile(self.__part(n)):
+				f = open(self.__part(n))
+				intervals = f.read()
+				f.close()
+			else:
+				intervals = ""
+			if intervals:
+				out.write(intervals)
+			else:
+				out.write("\n")
+		out.close()
+
+class LiveParser:
+	def __init__(self, filename, window=1000):
+		self.filename = os.path.abspath(filename)
+		self.window = window
+		self.files = None
+		self.restart()
+
+	def restart(self):
+		files = self.files
+		self.offset = 0
+		self.head = ""
+		self.parser = process_any.EventParser()
+		self.buf = process_any.ReorderBuffer(self.window)
+		self.builder = process_any.TransitionBuilder(self.parser.signal, release_events=True)
+		# TransitionSummary of each kind, kept up as they close, in the
+		# order the kinds first closed (which a pickle keeps, unlike a dict's)
+		self.summaries = OrderedDict()
+		self.changed = set()
+		# root and the lengths of its files as of the last checkpoint
+		self.root = None
+		self.root_sizes = None
+		if files != None:
+			# start them over too
+			files.abandon()
+			self.open_files(files.root, files.rules, files.writer.binary)
+
+	def open_files(self, root, rules=None, binary=False):
+		'''Write the interval and correlation files of root from here on,
+		carrying on with the ones of the last checkpoint if it had them'''
+		sizes = None
+		if root == self.root:
+			sizes = self.root_sizes
+		elif self.offset > 0:
+			log.warning("%s was not written before byte %d, so its files miss what came before", root, self.offset)
+		self.files = RootFiles(root, rules, binary, sizes)
+		self.root = root
+
+	def __lines(self, f):
+		for line in iter(f.readline, ""):
+			if not line.endswith("\n"):
+				# still being written
+				return
+			self.offset += len(line)
+			yield line
+
+	def poll(self):
+		'''Parse whatever was added to the file since the last poll'''
+		f = open(self.filename)
+		try:
+			head = f.read(HEAD)
+			f.seek(0, 2)
+			if f.tell() < self.offset or head[:len(self.head)] != self.head:
+				log.warning("%s was truncated or replaced, starting over", self.filename)
+				self.restart()
+			self.head = head
+			f.seek(self.offset)
+			for event in process_any.parse_events(self.__lines(f), self.parser):
+				event = self.buf.push(event)
+				if event != None:
+					self.__add(event)
+		finally:
+			f.close()
+		# transitions to come begin no earlier than the open one (but for
+		# events released late), so older signal strengths are not needed
+		self.parser.signal.drop_before(self.builder.transition.begin_time)
+
+	def __add(self, event):
+		transition = self.builder.add(event)
+		if transition == None:
+			return
+		name = transition.transition + " " + transition.after_transition
+		if name not in self.summaries:
+			self.summaries[name] = transition_report.TransitionSummary(name)
+		self.summaries[name].add(transition)
+		self.changed.add(name)
+		if self.files != None:
+			self.files.add(self.summaries.keys().index(name), name, transition, self.parser.distinct_events)
+
+	def set_window(self, window):
+		'''Hold window events back for reordering from now on'''
+		self.window = window
+		for event in self.buf.resize(window):
+			self.__add(event)
+
+	def finish(self):
+		'''Let out the events held back for reordering, when no checkpoint
+		will carry them on to the next run'''
+		for event in self.buf.drain():
+			self.__add(event)
+
+	def report(self, out, format="text"):
+		'''Write the statistics of the transitions closed so far'''
+		writer = transition_report.ReportWriter(out, format)
+		for name in self.summaries:
+			if "None" in name:
+				continue
+			writer.add(self.summaries[name].result(self.parser.distinct_events))
+		self.changed.clear()
+		writer.close()
+
+	def close_files(self):
+		if self.files != None:
+			self.files.close(self.summaries.keys())
+			self.files = None
+
+	def __getstate__(self):
+		# the summaries stand for the closed transitions; the files only
+		# need their lengths
+		if self.files != None:
+			self.root_sizes = self.files.sizes()
+		state = self.__dict__.copy()
+		del state["files"], state["changed"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.files = None
+		self.changed = set()
+
+def replace_file(filename, write):
+	'''Call write on a temporary file that then replaces filename, so
+	readers never see half of one'''
+	tmp = filename + ".tmp"
+	f = open(tmp, "wb")
+	try:
+		write(f)
+	finally:
+		f.close()
+	os.rename(tmp, filename)
+
+def save_checkpoint(live, filename):
+	replace_file(filename, lambda f: cPickle.dump(live, f, cPickle.HIGHEST_PROTOCOL))
+
+def load_checkpoint(filename):
+	f = open(filename, "rb")
+	try:
+		return cPickle.load(f)
+	finally:
+		f.close()
+
+def write_report(live, args):
+	if args.output:
+		replace_file(args.output, lambda f: live.report(f, args.format))
+	else:
+		live.report(sys.stdout, args.format)
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="Transition statistics of a QXDM event file that is still growing.")
+	parser.add_argument("eventfile", help="QXDM events dumped to text")
+	parser.add_argument("root", nargs="?", help="prefix for the interval and correlation files, written as transitions close")
+	parser.add_argument("--checkpoint", metavar="FILE", help="save the parser state to FILE and resume from it")
+	parser.add_argument("--interval", type=float, default=60, help="seconds between reports")
+	parser.add_argument("--poll", type=float, default=1, help="seconds between looks at the file")
+	parser.add_argument("--window", type=int, default=1000, help="events held back for reordering")
+	parser.add_argument("--once", action="store_true", help="read what is there, report and exit; with --checkpoint, events still in the reorder window wait for the next run")
+	parser.add_argument("--binary", action="store_true", help="also write the correlation rows as float64 (see correlation.py)")
+	parser.add_argument("--rules", metavar="FILE", help="JSON correlation rules to use instead of the built-in ones")
+	process_any.add_output_arguments(parser)
+	args = parser.parse_args(argv[1:])
+	process_any.setup_logging(args)
+
+	live = None
+	if args.checkpoint and os.path.exists(args.checkpoint):
+		live = load_checkpoint(args.checkpoint)
+		if live.filename != os.path.abspath(args.eventfile):
+			log.warning("%s is a checkpoint of %s, starting over", args.checkpoint, live.filename)
+			live = None
+		else:
+			log.info("resuming at byte %d", live.offset)
+	if live == None:
+		live = LiveParser(args.eventfile, args.window)
+	if args.root:
+		rules = None
+		if args.rules:
+			rules = correlation.load_rules(args.rules)
+		live.open_files(args.root, rules, args.binary)
+	if live.window != args.window:
+		log.info("reorder window was %d, now %d", live.window, args.window)
+		live.set_window(args.window)
+
+	last_report = time.time()
+	saved = live.offset
+	try:
+		while True:
+			live.poll()
+			if args.once:
+				break
+			if time.time() - last_report >= args.interval:
+				if live.changed:
+					write_report(live, args)
+				if args.checkpoint and live.offset != saved:
+					save_checkpoint(live, args.checkpoint)
+					saved = live.offset
+				last_report = time.time()
+			time.sleep(args.poll)
+	except KeyboardInterrupt:
+		pass
+
+	if args.checkpoint:
+		save_checkpoint(live, args.checkpoint)
+	else:
+		live.finish()
+	live.close_files()
+	write_report(live, args)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -1,13 +1,16 @@
 #!/usr/bin/python
 
-import packet_analyzer
+import packet_analyzer, pcap_reader
 import sys
 
 filename = sys.argv[1]
-f = open(filename)
 pa = packet_analyzer.PacketAnalyzer("141.212.113.208")
-for line in f:
-	pa.add_line(line)
+if pcap_reader.is_capture(filename):
+	pa.add_pcap(filename)
+else:
+	f = open(filename)
+	for line in f:
+		pa.add_line(line)
 pa.printall()
 pa.find_timings()
 pa.output_timing_results()
@@ -1,6 +1,16 @@
 #!/usr/bin/python
 
 import re
+import pcap_reader, timestamps
+
+# The fields add_fields expects, in this order, as written by
+#	tshark -r trace.pcap -T fields -e frame.len -e frame.time_epoch \
+#		-e ip.src -e ip.dst -e udp.srcport -e udp.dstport > trace.txt
+# which is a small fraction of the size of the tshark -V text.
+FIELDS = ("frame.len", "frame.time_epoch", "ip.src", "ip.dst", "udp.srcport", "udp.dstport")
+
+# UDP ports our measurement packets use
+CANDIDATE_PORTS = set([50000])
 
 def extractFirst(s, line):
 	'''XXX make global'''
@@ -26,9 +36,12 @@ class PacketAnalyzer():
 		self.cur_packet = None
 		self.cur_test = None
 		self.time = 0
+		# packets seen, kept or not
+		self.frames = 0
 
 	def add_line(self, line):
 		if line.startswith("Frame"):
+			self.frames += 1
 			if self.cur_packet != None and self.cur_packet.is_candidate:
 				self.all_packets.append(self.cur_packet)
 			self.cur_packet = Packet()
@@ -44,18 +57,58 @@ class PacketAnalyzer():
 		elif line.startswith("User Datagram Protocol") and "50000" in line:
 			self.cur_packet.is_candidate = True
 
+	def add_fields(self, line):
+		'''Take one line of tshark -T fields output (see FIELDS).  Only
+		candidate packets are kept, as with add_line.'''
+		fields = line.rstrip("\r\n").split("\t")
+		if len(fields) < 6:
+			return
+		self.frames += 1
+		size, epoch, src, dst, sport, dport = fields[:6]
+		if "50000" not in sport and "50000" not in dport:
+			return
+		if src and dst:
+			# tunnelled packets list every header's address; the
+			# verbose text ends up with the innermost
+			src = src.split(",")[-1]
+			dst = dst.split(",")[-1]
+		else:
+			src = dst = None
+		seconds, _, fraction = epoch.partition(".")
+		self.add_packet(size, int(seconds), timestamps.fraction_ms(fraction), src, dst)
+
+	def add_pcap(self, filename):
+		'''Take every candidate packet straight from a pcap or pcapng file'''
+		# read_packets skips the others before they get here
+		for seconds, millis, size, src, dst, sport, dport in pcap_reader.read_packets(filename, CANDIDATE_PORTS):
+			self.frames += 1
+			self.add_packet(str(size), seconds, millis, src, dst)
+
+	def add_packet(self, size, seconds, millis, src, dst):
+		'''Keep a candidate packet sent at epoch time seconds plus millis'''
+		packet = Packet()
+		packet.size = size
+		packet.time = seconds * 1000 + millis
+		self.time = packet.time
+		packet.src = src
+		packet.dst = dst
+		packet.is_candidate = True
+		self.all_packets.append(packet)
+
+	def count(self, stats):
+		'''Add what was read to stats, a pipeline_stats.Stats'''
+		stats.count("packet_frames", self.frames)
+		stats.count("packets", len(self.all_packets))
+
 	def printall(self):
 		for p in self.all_packets:
 			p.printme_simple()
 
-        def getTime(self, line, packet):
-                match = re.search('(\d+):(\d+):(\d+)[.](\d+)', line)
-                packet.time = 0
-                if match:
-                        packet.time += int(match.group(4))
-                        packet.time += int(match.group(3)) * 1000
-                        packet.time += int(match.group(2)) * 60 * 1000
-                        packet.time += int(match.group(1)) * 3600 * 1000
+	def getTime(self, line, packet):
+		'''Epoch milliseconds of an Arrival Time line'''
+		packet.time = timestamps.arrival_time(line)
+		if packet.time == None:
+			packet.time = 0
 		self.time = packet.time
 		return self.time
 
@@ -124,3 +177,7 @@ class TestPacket():
 				print self.end_time -self.begin_time
 			except:
 				return
+
+def is_fields_line(line):
+	'''Whether line is from tshark -T fields output rather than tshark -V'''
+	return "\t" in line and line.split("\t", 1)[0].isdigit()
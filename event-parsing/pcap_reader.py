@@ -0,0 +1,193 @@
+#!/usr/bin/python
+
+# Reads IPv4 packets straight out of pcap and pcapng captures, so they do
+# not have to go through tshark first.  The file is mmapped and only the
+# record, link, IP and UDP headers are unpacked.
+#
+# Link types handled: Ethernet (with 802.1Q tags), Linux cooked capture
+# (v1 and v2, as tcpdump -i any writes), BSD loopback and raw IP.  Other
+# packets are skipped.
+
+import mmap, struct, socket
+
+PCAP_MAGIC = (0xa1b2c3d4, 0xa1b23c4d)		# microsecond, nanosecond
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER = 0x1a2b3c4d
+PCAPNG_IDB = 1
+PCAPNG_OPB = 2
+PCAPNG_EPB = 6
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 14, 101, 228)
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+IPPROTO_UDP = 17
+
+USHORT = struct.Struct(">H")
+IP_HEADER = struct.Struct(">B5xHxB")
+PORTS = struct.Struct(">HH")
+
+def is_capture(filename):
+	'''Whether filename is a pcap or pcapng file rather than text'''
+	f = open(filename, "rb")
+	head = f.read(4)
+	f.close()
+	if len(head) < 4:
+		return False
+	magic = struct.unpack("<I", head)[0]
+	swapped = struct.unpack(">I", head)[0]
+	return magic in PCAP_MAGIC or swapped in PCAP_MAGIC or magic == PCAPNG_SHB
+
+def ip_offset(data, offset, length, linktype):
+	'''Offset of the IPv4 header in a frame, or None if it is not IPv4'''
+	if linktype == LINKTYPE_ETHERNET:
+		if length < 14:
+			return None
+		ethertype = USHORT.unpack_from(data, offset + 12)[0]
+		header = 14
+		while ethertype in ETHERTYPE_VLAN and length >= header + 4:
+			ethertype = USHORT.unpack_from(data, offset + header + 2)[0]
+			header += 4
+		if ethertype != ETHERTYPE_IPV4:
+			return None
+		return offset + header
+	if linktype in LINKTYPE_RAW:
+		return offset
+	if linktype == LINKTYPE_LINUX_SLL:
+		if length < 16 or USHORT.unpack_from(data, offset + 14)[0] != ETHERTYPE_IPV4:
+			return None
+		return offset + 16
+	if linktype == LINKTYPE_LINUX_SLL2:
+		if length < 20 or USHORT.unpack_from(data, offset)[0] != ETHERTYPE_IPV4:
+			return None
+		return offset + 20
+	if linktype == LINKTYPE_NULL:
+		# the address family is in the capturing host's byte order
+		if length < 4 or (struct.unpack_from("<I", data, offset)[0] != 2 and \
+				struct.unpack_from(">I", data, offset)[0] != 2):
+			return None
+		return offset + 4
+	return None
+
+def decode(data, offset, length, linktype, ports):
+	'''(src, dst, sport, dport) of the IPv4 frame at offset, or None.
+	sport and dport are None unless it is UDP.  With ports, only UDP
+	packets to or from one of them are decoded.'''
+	ip = ip_offset(data, offset, length, linktype)
+	if ip == None:
+		return None
+	end = offset + length
+	if end - ip < 20:
+		return None
+	version_ihl, fragment, protocol = IP_HEADER.unpack_from(data, ip)
+	if version_ihl >> 4 != 4:
+		return None
+	sport = dport = None
+	header = (version_ihl & 0xf) * 4
+	if protocol == IPPROTO_UDP and fragment & 0x1fff == 0 and end - ip >= header + 4:
+		sport, dport = PORTS.unpack_from(data, ip + header)
+	if ports != None and sport not in ports and dport not in ports:
+		return None
+	src = socket.inet_ntoa(data[ip + 12:ip + 16])
+	dst = socket.inet_ntoa(data[ip + 16:ip + 20])
+	return src, dst, sport, dport
+
+def read_pcap(data, ports):
+	magic = struct.unpack_from("<I", data, 0)[0]
+	if magic in PCAP_MAGIC:
+		endian = "<"
+	else:
+		endian = ">"
+		magic = struct.unpack_from(">I", data, 0)[0]
+	# fraction units per millisecond
+	per_ms = 1000 if magic == PCAP_MAGIC[0] else 1000000
+	linktype = struct.unpack_from(endian + "I", data, 20)[0] & 0xffff
+	record = struct.Struct(endian + "IIII")
+	offset = 24
+	size = len(data)
+	while offset + 16 <= size:
+		seconds, fraction, captured, length = record.unpack_from(data, offset)
+		offset += 16
+		if offset + captured > size:
+			break
+		packet = decode(data, offset, captured, linktype, ports)
+		if packet != None:
+			yield (seconds, fraction / per_ms, length) + packet
+		offset += captured
+
+def tsresol(data, offset, end, endian):
+	'''Timestamp units per second from an interface block's options'''
+	while offset + 4 <= end:
+		code, length = struct.unpack_from(endian + "HH", data, offset)
+		if code == 0:
+			break
+		if code == 9 and length >= 1:
+			value = ord(data[offset + 4])
+			if value & 0x80:
+				return 2 ** (value & 0x7f)
+			return 10 ** value
+		offset += 4 + (length + 3) / 4 * 4
+	return 1000000
+
+def read_pcapng(data, ports):
+	size = len(data)
+	offset = 0
+	endian = "<"
+	interfaces = []
+	while offset + 12 <= size:
+		block_type = struct.unpack_from(endian + "I", data, offset)[0]
+		if block_type == PCAPNG_SHB:
+			# each section can have its own byte order and interfaces
+			if struct.unpack_from("<I", data, offset + 8)[0] == PCAPNG_BYTE_ORDER:
+				endian = "<"
+			else:
+				endian = ">"
+			interfaces = []
+		length = struct.unpack_from(endian + "I", data, offset + 4)[0]
+		if length < 12 or offset + length > size:
+			break
+		body = offset + 8
+		if block_type == PCAPNG_IDB:
+			linktype = struct.unpack_from(endian + "H", data, body)[0]
+			interfaces.append((linktype, tsresol(data, body + 8, offset + length - 4, endian)))
+		elif block_type in (PCAPNG_EPB, PCAPNG_OPB):
+			if block_type == PCAPNG_EPB:
+				interface, high, low, captured, original = struct.unpack_from(endian + "IIIII", data, body)
+			else:
+				interface, drops, high, low, captured, original = struct.unpack_from(endian + "HHIIII", data, body)
+			if interface < len(interfaces):
+				linktype, units = interfaces[interface]
+				packet = decode(data, body + 20, captured, linktype, ports)
+				if packet != None:
+					stamp = (high << 32) | low
+					seconds = stamp // units
+					yield (seconds, (stamp - seconds * units) * 1000 // units, original) + packet
+		offset += length
+
+def read_packets(filename, ports=None):
+	'''Yield (seconds, milliseconds, size, src, dst, sport, dport) for each
+	IPv4 packet in a pcap or pcapng file.  seconds is the epoch time,
+	milliseconds the part of a second after it and size the length on the
+	wire.  With ports, a set of port numbers, only UDP packets to or from
+	one of them are returned.'''
+	f = open(filename, "rb")
+	try:
+		data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	except ValueError:
+		# empty file
+		f.close()
+		return
+	try:
+		if struct.unpack_from("<I", data, 0)[0] == PCAPNG_SHB:
+			packets = read_pcapng(data, ports)
+		else:
+			packets = read_pcap(data, ports)
+		for packet in packets:
+			yield packet
+	finally:
+		data.close()
+		f.close()
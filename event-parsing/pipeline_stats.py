@@ -0,0 +1,152 @@
+#!/usr/bin/python
+
+# Where a run's time goes and how much it got through, written out as JSON
+# (process_any --stats) so runs of different versions can be compared.
+#
+# Stage times are exclusive: while a stage is running inside another, only
+# the inner one is charged, so pulling events through a chain of generators
+# still splits up by stage.  The coarse stages are always timed; timing
+# every event and the parser's steps on every line costs a little, so that
+# is only done once enable() is called.
+#
+# With enable(trace_memory=True), each stage is also charged, the same
+# exclusive way, with how much the peak resident size of the process grew
+# while it ran (getrusage's ru_maxrss, kilobytes on Linux).  Memory freed
+# and reused does not show, so this points at the stages that push the
+# peak up rather than at everything they allocate.
+
+import time, resource, platform
+
+# bump when the layout of summary() changes
+FORMAT = 2
+
+def max_rss():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class Stats:
+	def __init__(self):
+		self.enabled = False
+		self.names = []
+		self.seconds = {}
+		self.calls = {}
+		self.counters = {}
+		self.event_types = {}
+		self.stack = []
+		self.mark = None
+		self.started = time.time()
+		self.trace_memory = False
+		self.rss_growth = {}
+		self.rss_mark = max_rss()
+
+	def enable(self, trace_memory=False):
+		self.enabled = True
+		if trace_memory:
+			self.trace_memory = True
+			self.rss_mark = max_rss()
+
+	def __charge(self, now):
+		if self.stack:
+			self.seconds[self.stack[-1]] += now - self.mark
+		self.mark = now
+		if self.trace_memory:
+			rss = max_rss()
+			if self.stack:
+				stage = self.stack[-1]
+				self.rss_growth[stage] = self.rss_growth.get(stage, 0) + rss - self.rss_mark
+			self.rss_mark = rss
+
+	def start(self, stage):
+		if stage not in self.seconds:
+			self.names.append(stage)
+			self.seconds[stage] = 0.0
+			self.calls[stage] = 0
+		self.__charge(time.time())
+		self.stack.append(stage)
+		self.calls[stage] += 1
+
+	def stop(self):
+		self.__charge(time.time())
+		self.stack.pop()
+
+	def iterate(self, stage, iterable):
+		'''iterable, with the time spent getting each item charged to stage'''
+		if not self.enabled:
+			return iterable
+		return self.__iterate(stage, iter(iterable))
+
+	def __iterate(self, stage, it):
+		while True:
+			self.start(stage)
+			try:
+				item = next(it)
+			except StopIteration:
+				return
+			finally:
+				self.stop()
+			yield item
+
+	def count_events(self, events):
+		'''events, counted by type as they go by'''
+		if not self.enabled:
+			return events
+		return self.__count_events(events)
+
+	def __count_events(self, events):
+		types = self.event_types
+		for event in events:
+			types[event.event] = types.get(event.event, 0) + 1
+			yield event
+
+	def instrument(self, cls, name, stage):
+		'''Charge the calls of method name of cls to stage'''
+		method = cls.__dict__[name]
+		stats = self
+		def timed(*args, **kwargs):
+			stats.start(stage)
+			try:
+				return method(*args, **kwargs)
+			finally:
+				stats.stop()
+		setattr(cls, name, timed)
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def merge_counters(self, counters):
+		for name, n in counters.iteritems():
+			self.count(name, n)
+
+	def stage_seconds(self, prefix):
+		'''Time spent in prefix and the stages named prefix.*'''
+		return sum(seconds for name, seconds in self.seconds.iteritems() \
+				if name == prefix or name.startswith(prefix + "."))
+
+	def summary(self):
+		parse = self.stage_seconds("parse")
+		rates = {}
+		if parse > 0:
+			rates["lines_per_second"] = self.counters.get("lines", 0) / parse
+			rates["events_per_second"] = self.counters.get("events", 0) / parse
+		summary = {
+			"format": FORMAT,
+			"python": platform.python_version(),
+			"started": self.started,
+			"wall_seconds": time.time() - self.started,
+			"stages": [self.__stage(name) for name in self.names],
+			"counters": self.counters,
+			"event_types": self.event_types,
+			"rates": rates,
+			# kilobytes on Linux
+			"max_rss": max_rss(),
+			"children_max_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+		}
+		return summary
+
+	def __stage(self, name):
+		stage = {"stage": name, "seconds": self.seconds[name], "calls": self.calls[name]}
+		if self.trace_memory:
+			stage["max_rss_growth"] = self.rss_growth.get(name, 0)
+		return stage
+
+# the one every module counts into
+stats = Stats()
@@ -1,8 +1,7 @@
 #!/usr/bin/python
 
-import sys, re, operator, os
-import robustnetLib, packet_analyzer
-from collections import Counter
+import sys, re, operator, os, heapq, argparse, time, logging, mmap, multiprocessing, cStringIO, json
+import robustnetLib, packet_analyzer, pcap_reader, event_store, event_cache, correlation, timestamps, signal_series, transition_report, pipeline_stats
 
 # TODO:
 #	Total repeats of all
@@ -10,15 +9,12 @@ from collections import Counter
 #	Port to 4G
 
 
+log = logging.getLogger("process_any")
+stats = pipeline_stats.stats
+
 def reverseTime(t):
-	ms = t % 1000
-	t = t / 1000
-	s = t % 60
-	t = t / 60
-	m = t  %60
-	t = t /60
-	h = t
-	return str(h) + ":" +str(m) +":" + str(s) + "." + str(ms)
+	tm = time.localtime(t / 1000)
+	return str(tm.tm_hour) + ":" + str(tm.tm_min) + ":" + str(tm.tm_sec) + "." + str(t % 1000)
 	
 
 event_list = ["EVENT_LTE_BSR_SR_REQUEST", \
@@ -50,14 +46,107 @@ event_list = ["EVENT_LTE_BSR_SR_REQUEST", \
 
 lte_states = ["Inactive", "Idle Not Camped", "Idle Camped", "Connecting", "Connected", "Closing"]
 
-class Event:
-	all_events = {}	
-	current_event = None
-	last_state = None
-	distinct_events = set(["PACKET_SENT", "PACKET_RCV"])
-	power_ratio = None
-	RSSI = None
+# the phone's address in our packet traces
+TARGET_IP = "141.212.113.208"
+
+# which transitions get a row in <root>_<type>.txt, and what goes in it
+correlation_rules = correlation.RuleSet()
+
+# Secondary attributes pulled out of "Payload String" lines, keyed by event.
+# Each entry holds compiled patterns (tried in order until one matches) and
+# the labels their groups are stored under.  Add new event types with
+# register_secondary; a later registration replaces an earlier one.
+class SecondaryPattern:
+	def __init__(self, patterns, labels):
+		self.patterns = [re.compile(p) for p in patterns]
+		self.labels = labels
+		# more groups than labels only happens with a bad registration
+		self.extra_groups = max([p.groups for p in self.patterns]) > len(labels)
+
+secondary_patterns = {}
+
+def register_secondary(events, patterns, labels):
+	entry = SecondaryPattern(patterns, labels)
+	for event in events:
+		secondary_patterns[event] = entry
+
+def match_secondary(event, line, attributes):
+	'''Fill attributes from line, return False if event is known but nothing matched'''
+	entry = secondary_patterns.get(event)
+	if entry == None:
+		return True
+	for pattern in entry.patterns:
+		match = pattern.search(line)
+		if match == None:
+			continue
+		groups = match.groups()
+		if entry.extra_groups:
+			for i in range(len(entry.labels), len(groups)):
+				log.debug("unlabelled group in %s", line)
+				stats.count("secondary_unlabelled_groups")
+		attributes.update(zip(entry.labels, groups))
+		return True
+	return False
+
+register_secondary(["EVENT_LTE_RRC_TIMER_STATUS"], \
+	["Timer Name = ([A-Za-z0-9 _]+), Timer Value = ([0-9]+), Timer State = ([A-Za-z0-9 _]+)"], \
+	("Timer Name", "Timer Value", "Timer State"))
+register_secondary(["EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_TIMER_EXPIRY"], \
+	["Timer ID = TIMER (T[0-9]+)", "(Timer ID = [0-9]+)"], \
+	("Timer ID",))
+register_secondary(["RRC_STATE_CHANGE_TRIGGER"], \
+	["RRC State Change Trigger = ([A-Za-z0-9 _]+)"], \
+	("Trigger",))
+register_secondary(["EVENT_LTE_EMM_OUTGOING_MSG", "EVENT_LTE_EMM_OTA_OUTGOING_MSG", \
+		"EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_LTE_EMM_INCOMING_MSG", "EVENT_LTE_CM_OUTGOING_MSG"], \
+	["Message ID = ([A-Za-z0-9 _]+)"], \
+	("Message ID",))
+register_secondary(["EVENT_LTE_RRC_UL_MSG"], \
+	["Message Type = ([A-Za-z0-9 _]+)"], \
+	("Message Type",))
+register_secondary(["EVENT_LTE_RACH_ACCESS_START"], \
+	["RACH Cause = ([A-Za-z0-9 _]+), RACH Contention = ([A-Za-z0-9 _]+)"], \
+	("RACH Cause", "RACH Contention"))
+register_secondary(["EVENT_LTE_RRC_PAGING_DRX_CYCLE"], \
+	["DRX Cycle = ([0-9]+)"], \
+	("DRX_CYCLE",))
+register_secondary(["EVENT_LTE_RACH_RAID_MATCH"], \
+	["Match = ([0-9]+)"], \
+	("Match",))
+register_secondary(["EVENT_LTE_TIMING_ADVANCE"], \
+	["Timer Value = ([0-9]+), Timing Advance = ([0-9]+)"], \
+	("Timer Value", "Timing Advance"))
+register_secondary(["EVENT_LTE_MAC_TIMER"], \
+	["Timer type = ([A-Za-z0-9 _]+), Action = ([A-Za-z0-9 _]+)"], \
+	("Timer type", "Action"))
+register_secondary(["EVENT_LTE_MAC_RESET"], \
+	["Cause = ([A-Za-z0-9 _]+)"], \
+	("Cause",))
+register_secondary(["EVENT_LTE_RACH_ACCESS_RESULT"], \
+	["Result = ([A-Za-z0-9 _]+)"], \
+	("Result",))
+# UL_MSG is caught by the "Message Type" entry above, as it always was
+register_secondary(["EVENT_LTE_RRC_DL_MSG"], \
+	["Channel Type = ([A-Za-z0-9 _]+), Message Type = ([A-Za-z0-9 _]+)"], \
+	("Channel Type", "Message Type"))
+register_secondary(["EVENT_LTE_ML1_PHR_REPORT"], \
+	["Power Headroom = ([-A-Za-z0-9 _]+), PHR Trigger = ([A-Za-z0-9 _]+)"], \
+	("Power Headroom", "PHR Trigger"))
+register_secondary(["EVENT_LTE_BSR_SR_REQUEST"], \
+	["Is BSR Timer Expired = ([0-9]+), Is Higher Priority Data Arrial = ([0-9]+), Is Retx BSR Timer Expired = ([0-9]+), Is Request To Include BSR Report = ([0-9]+), Is Request To Send SR = ([0-9]+)"], \
+	("Is BSR Timer Expired", \
+		"Is Higher Priority Data Arrial", \
+		"Is Retx BSR Timer Expired", \
+		"Is Request To Include BSR Report", \
+		"Is Request To Send SR"))
+register_secondary(["EVENT_LTE_RRC_SECURITY_CONFIG"], \
+	["Status = ([A-Za-z0-9 _]+)"], \
+	("Status",))
+register_secondary(["EVENT_LTE_RRC_NEW_CELL_IND"], \
+	["Cause = ([A-Za-z0-9 _]+), Frequency = ([0-9]+), Cell ID = ([0-9]+)"], \
+	("Cause", "Frequency", "Cell ID"))
 
+class Event:
 	def __init__(self):
 		self.time = 0
 		self.event = None
@@ -66,55 +155,28 @@ class Event:
 		self.after_state = None
 		self.subtype = ""
 		self.secondary_attributes = {}
-		self.RSSI = Event.RSSI 
+		# set on the events that carry a measurement
+		self.RSSI = None
 		self.RSRP = None 
 		self.RSRQ = None 
-		self.power_ratio = Event.power_ratio
+		self.power_ratio = None
 		 
 
-	def addNewLine(self, line):
-		if line.startswith("2013"):
-			#if Event.current_event != None and Event.current_event.event != None:
-			#	Event.current_event.printme()
-			self.__saveEvent()	
-			Event.current_event = Event()
-			Event.current_event.__getEvent(line)
-		if Event.current_event:
-			Event.current_event.__getTime(line)
-			Event.current_event.__getStateChange(line)
-			Event.current_event.__getSignalStrengths(line)
-			Event.current_event.__getSecondary(line)
+	def addHeader(self, line):
+		self.__getTime(line)
+		self.__getEvent(line)
 
-	def addUpperLayerPackets(self, filename):
-		f = open(filename)
-		ip = "141.212.113.208"
-		pa = packet_analyzer.PacketAnalyzer(ip)
-		for line in f:
-			pa.add_line(line)
-		for packet in pa.all_packets:
-			Event.current_event = Event()
-			Event.current_event.time = packet.time
-			if not packet.is_candidate:
-				Event.current_event.event = "PACKET_OTHER"
-			elif packet.dst == ip:
-				Event.current_event.event = "PACKET_SENT"
-			else:
-				Event.current_event.event = "PACKET_RCV"
-			#packet.printme_simple()
-			assert(Event.current_event.time != None)
-			if Event.current_event.time in Event.all_events:
-				Event.all_events[Event.current_event.time].append(Event.current_event)
-			else:
-				Event.all_events[Event.current_event.time] = [Event.current_event]
-					
+	def addNewLine(self, line, parser):
+		'''Take in a line of this event, read by parser (an EventParser)'''
+		self.__getStateChange(line, parser)
+		self.__getSignalStrengths(line, parser.signal)
+		self.__getSecondary(line)
 
 	def __getTime(self, line):
-		match = re.search('(\d+):(\d+):(\d+)[.](\d+)', line)
-		if match:
-			self.time += int(match.group(4))
-			self.time += int(match.group(3)) * 1000
-			self.time += int(match.group(2)) * 60 * 1000
-			self.time += int(match.group(1)) * 3600 * 1000
+		# only the header carries the time
+		t = timestamps.header_time(line)
+		if t != None:
+			self.time = t
 
 
 	def __getEvent(self, line):
@@ -140,110 +202,22 @@ class Event:
 				# TODO get channel
 				return
 
-			match_string = None
-			match_labels = None
-			if self.event == "EVENT_LTE_RRC_TIMER_STATUS":
-				match_string = ["Timer Name = ([A-Za-z0-9 _]+), Timer Value = ([0-9]+), Timer State = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Timer Name", "Timer Value", "Timer State")
-			elif self.event == "EVENT_LTE_EMM_TIMER_START" or \
-					self.event == "EVENT_LTE_EMM_TIMER_EXPIRY":	
-				match_string = ["Timer ID = TIMER (T[0-9]+)", "(Timer ID = [0-9]+)"]
-				match_labels = ("Timer ID",)
-			elif self.event == "RRC_STATE_CHANGE_TRIGGER":	
-				match_string = ["RRC State Change Trigger = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Trigger",)
-			elif self.event == "EVENT_LTE_EMM_OUTGOING_MSG" or \
-					self.event == "EVENT_LTE_EMM_OTA_OUTGOING_MSG" or \
-					self.event == "EVENT_LTE_ESM_OUTGOING_MSG" or \
-					self.event == "EVENT_LTE_EMM_INCOMING_MSG" or \
-					self.event == "EVENT_LTE_CM_OUTGOING_MSG":	
-				match_string = ["Message ID = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Message ID",)
-			elif self.event == "EVENT_LTE_RRC_UL_MSG":	
-				match_string = ["Message Type = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Message Type",)
-			elif self.event == "EVENT_LTE_RACH_ACCESS_START":	
-				match_string = ["RACH Cause = ([A-Za-z0-9 _]+), RACH Contention = ([A-Za-z0-9 _]+)"]
-				match_labels = ("RACH Cause", "RACH Contention")
-			elif self.event == "EVENT_LTE_RRC_PAGING_DRX_CYCLE":	
-				match_string = ["DRX Cycle = ([0-9]+)"]
-				match_labels = ("DRX_CYCLE",)
-			elif self.event == "EVENT_LTE_RACH_RAID_MATCH":	
-				match_string = ["Match = ([0-9]+)"]
-				match_labels = ("Match",)
-			elif self.event == "EVENT_LTE_TIMING_ADVANCE":	
-				match_string = ["Timer Value = ([0-9]+), Timing Advance = ([0-9]+)"]
-				match_labels = ("Timer Value", "Timing Advance")
-			elif self.event == "EVENT_LTE_MAC_TIMER":
-				match_string = ["Timer type = ([A-Za-z0-9 _]+), Action = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Timer type", "Action")
-			elif self.event == "EVENT_LTE_MAC_RESET":
-				match_string = ["Cause = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Cause",)
-			elif self.event == "EVENT_LTE_RACH_ACCESS_RESULT":	
-				match_string = ["Result = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Result",)
-			elif self.event == "EVENT_LTE_RRC_UL_MSG" or \
-					self.event == "EVENT_LTE_RRC_DL_MSG":	
-				match_string = ["Channel Type = ([A-Za-z0-9 _]+), Message Type = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Channel Type", "Message Type")
-			elif self.event == "EVENT_LTE_ML1_PHR_REPORT":	
-				match_string = ["Power Headroom = ([-A-Za-z0-9 _]+), PHR Trigger = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Power Headroom", "PHR Trigger")
-			elif self.event == "EVENT_LTE_BSR_SR_REQUEST":
-				match_string = ["Is BSR Timer Expired = ([0-9]+), Is Higher Priority Data Arrial = ([0-9]+), Is Retx BSR Timer Expired = ([0-9]+), Is Request To Include BSR Report = ([0-9]+), Is Request To Send SR = ([0-9]+)"]
-				match_labels = ("Is BSR Timer Expired", \
-						"Is Higher Priority Data Arrial", \
-						"Is Retx BSR Timer Expired", \
-						"Is Request To Include BSR Report", \
-						"Is Request To Send SR")
-			elif self.event == "EVENT_LTE_RRC_SECURITY_CONFIG":
-				match_string = ["Status = ([A-Za-z0-9 _]+)"]
-				match_labels = ("Status",)
-			elif self.event == "EVENT_LTE_RRC_NEW_CELL_IND":
-				match_string = ["Cause = ([A-Za-z0-9 _]+), Frequency = ([0-9]+), Cell ID = ([0-9]+)"]
-				match_labels = ("Cause", "Frequency", "Cell ID")
-
-			if match_string != None and match_labels != None:
-				for s in match_string:
-					match = re.search(s, line)
-					if match == None:
-						continue
-					for i in range(len(match.groups())):
-						if i < len(match_labels):
-							self.secondary_attributes[match_labels[i]] = match.group(i+1)
-						else:
-							print "ERROR on ", line
-					break
-				if match == None:
-					print "ERROR on ", line, self.event
-				
+			if not match_secondary(self.event, line, self.secondary_attributes):
+				log.debug("no secondary pattern matched %s for %s", line, self.event)
+				stats.count("secondary_misses")
 
-	def __getSignalStrengths(self, line):
+	def __getSignalStrengths(self, line, signal):
 #		if not self.event == "LTE ML1 Neighbor Measurements":
 #			return
-		line = line.split("|")
-		if len(line) < 10:
-			return
-		try:
-			# from LoadSense
-			if float(line[2]) >= 0 :
-				self.RSSI = float(line[3])
-				self.RSRP = float(line[4])
-				self.RSRQ = float(line[7])			
-			else:
-				self.RSSI = float(line[2])
-				self.RSRP = float(line[3])
-				self.RSRQ = float(line[6])			
-			self.power_ratio = self.RSRP/self.RSRQ
-			Event.RSSI = self.RSSI
-			Event.power_ratio = self.power_ratio
-			print line[2], line
-		except:
+		row = signal_series.parse_row(line)
+		if row == None:
 			return
+		self.RSSI, self.RSRP, self.RSRQ = row
+		self.power_ratio = self.RSRP/self.RSRQ
+		signal.add(self.time, self.RSSI, self.RSRP, self.RSRQ)
 
 
-	def __getStateChange(self, line):
+	def __getStateChange(self, line, parser):
 		if self.event== "EVENT_LTE_RRC_STATE_CHANGE" and line.startswith("Payload String"):
 			match = re.search("RRC State = ([A-Za-z_ ]+)", line)
 			if match:
@@ -255,12 +229,12 @@ class Event:
 #				if state in line:
 #					self.after_state = state
 #					break
-			if Event.last_state == "Connecting" and self.after_state == "Closing":
-				print self.event_line
-			if Event.last_state == self.after_state:
+			if parser.last_state == "Connecting" and self.after_state == "Closing":
+				log.debug("Connecting -> Closing at %s", self.event_line)
+			if parser.last_state == self.after_state:
 				return
-			self.before_state = Event.last_state
-			Event.last_state = self.after_state
+			self.before_state = parser.last_state
+			parser.last_state = self.after_state
 		if self.event == "EVENT_WCDMA_RRC_STATE" and line.startswith("Payload String = Previous state:"):
 			match = re.search('([A-Z]+_[A-Z]+).*([A-Z]+_[A-Z]+)', line)
 			if match:
@@ -270,17 +244,7 @@ class Event:
 			if match:
 				self.before_state = match.group(1)
 				self.after_state = match.group(2)
-			Event.last_state = self.after_state
-				
-	def __saveEvent(self):
-		if Event.current_event == None or Event.current_event.event == None:
-			return	
-#		Event.current_event.__print()
-		Event.distinct_events.add(Event.current_event.event)
-		if Event.current_event.time in Event.all_events:
-			Event.all_events[Event.current_event.time].append(Event.current_event)
-		else:
-			Event.all_events[Event.current_event.time] = [Event.current_event]
+			parser.last_state = self.after_state
 
 	def printme(self):
 		print self.time, "\t", self.after_state, "\t", self.event, self.subtype
@@ -288,29 +252,145 @@ class Event:
 			print "\t", k, ":", v
 
 
+class EventParser:
+	'''Everything about one QXDM event log being read: its events, the RRC
+	state it is in, the event types seen so far and its signal strength
+	measurements.  Use a new one for each file; nothing is shared between
+	them, so one process can parse any number of files.'''
+
+	def __init__(self):
+		self.all_events = {}
+		self.current_event = None
+		self.last_state = None
+		# distinct_events in the order they were added, as a pickled set
+		# comes back in another order
+		self.event_names = ["PACKET_SENT", "PACKET_RCV"]
+		self.distinct_events = set(self.event_names)
+		# every signal strength measurement in the log
+		self.signal = signal_series.SignalSeries()
+		# when set to a list, finished events go here instead of all_events
+		self.pending = None
+
+	def addNewLine(self, line):
+		if timestamps.is_header(line):
+			#if self.current_event != None and self.current_event.event != None:
+			#	self.current_event.printme()
+			self.__saveEvent()	
+			self.current_event = Event()
+			self.current_event.addHeader(line)
+		if self.current_event:
+			self.current_event.addNewLine(line, self)
+
+	def addUpperLayerPackets(self, filename):
+		for packet in load_packets(filename):
+			event = packet_event(packet)
+			assert(event.time != None)
+			if event.time in self.all_events:
+				self.all_events[event.time].append(event)
+			else:
+				self.all_events[event.time] = [event]
+
+	def add_event_name(self, name):
+		if name not in self.distinct_events:
+			self.distinct_events.add(name)
+			self.event_names.append(name)
+
+	def __saveEvent(self):
+		event = self.current_event
+		if event == None or event.event == None:
+			return	
+#		event.__print()
+		if event.event not in self.distinct_events:
+			self.add_event_name(event.event)
+		if self.pending != None:
+			self.pending.append(event)
+			return
+		if event.time in self.all_events:
+			self.all_events[event.time].append(event)
+		else:
+			self.all_events[event.time] = [event]
+
+	def ordered_events(self):
+		'''Every event in all_events, sorted by time'''
+		for k in sorted(self.all_events.keys()):
+			for event in self.all_events[k]:
+				yield event
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state["distinct_events"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.distinct_events = set()
+		for name in self.event_names:
+			self.distinct_events.add(name)
+
+
+def load_packets(filename):
+	'''Packets from a pcap or pcapng capture, a tshark -V text dump or
+	tshark -T fields output (see packet_analyzer.FIELDS)'''
+	pa = packet_analyzer.PacketAnalyzer(TARGET_IP)
+	stats.start("packets")
+	try:
+		if pcap_reader.is_capture(filename):
+			pa.add_pcap(filename)
+			return pa.all_packets
+		f = open(filename)
+		first = f.readline()
+		add = pa.add_line
+		if packet_analyzer.is_fields_line(first):
+			add = pa.add_fields
+		add(first)
+		lines = 1
+		for line in f:
+			add(line)
+			lines += 1
+		f.close()
+		stats.count("packet_lines", lines)
+		return pa.all_packets
+	finally:
+		pa.count(stats)
+		stats.stop()
+
+def packet_event(packet):
+	event = Event()
+	event.time = packet.time
+	if not packet.is_candidate:
+		event.event = "PACKET_OTHER"
+	elif packet.dst == TARGET_IP:
+		event.event = "PACKET_SENT"
+	else:
+		event.event = "PACKET_RCV"
+	#packet.printme_simple()
+	return event
+
+
+class SparseDict(dict):
+	'''Per-event dict of a Transition.  Only the events the transition saw
+	are stored; any other event reads as default (or a new empty dict).'''
+	def __init__(self, default=None, factory=None):
+		dict.__init__(self)
+		self.default = default
+		self.factory = factory
+
+	def __missing__(self, key):
+		if self.factory != None:
+			return self.factory()
+		return self.default
+
+
 # questions to answer:
 #	What events are between them
 #	we list all unexpected events, including system stuff
 class Transition():
-	all_transitions = []
-	last_transition = None
 	#filter_meta = ["sys_info", "measure_report", "measure_control", "EVENT_WCDMA_RRC_STATE", "mobility_confirm", "cell_update", "cell_update_confirm"] 
 	filter_meta = []
 
 #["radio_reconfig", "radio_reconfig_complete", "rlc_config", "cell_update", "update_confirm"]
 
 
-	def __create_dict(self, lists, d = False, item = 0):
-		retval = {}
-		for v in Event.distinct_events:
-			if lists:
-				retval[v] = []
-			elif d:
-				retval[v] = {}
-			else:
-				retval[v] = item
-		return retval 
-
 	def __init__(self, state, time):
 		self.state = state
 		self.begin_time = time
@@ -319,27 +399,23 @@ class Transition():
 		self.after_transition = None
 		self.between = []
 #		self.time_to_reach_first = { "radio_reconfig":0, "radio_reconfig_complete":0, "rlc_config":0, "phy_reconfig":0, "phy_reconfig_complete":0}
-		self.time_to_reach_first = self.__create_dict(False, item=None)
-		self.time_to_reach_last = self.__create_dict(False, item=None)
-		self.attributes_first = self.__create_dict(False, d=True)
-		self.attributes_last = self.__create_dict(False, d=True)
-		self.attributes_all = self.__create_dict(False, d=True)
-		self.duplicates_first = self.__create_dict(False)
-		self.duplicates_last = self.__create_dict(False)
-		self.duplicates_all = self.__create_dict(False)
+		self.time_to_reach_first = SparseDict(None)
+		self.time_to_reach_last = SparseDict(None)
+		self.attributes_first = SparseDict(factory=dict)
+		self.attributes_last = SparseDict(factory=dict)
+		self.attributes_all = SparseDict(factory=dict)
+		self.duplicates_first = SparseDict(0)
+		self.duplicates_last = SparseDict(0)
+		self.duplicates_all = SparseDict(0)
+		# signal as last measured by the begin and end of the transition
+		self.begin_RSSI = None
+		self.begin_power_ratio = None
 		self.RSSI = None
 		self.power_ratio = None 
 		interferers = {}	
 
 	def update(self, event):
 		#print event.before_state, event.after_state, event.event, reverseTime(event.time)
-		if event.RSSI != None:
-			self.RSSI = event.RSSI
-		print "RSSI", event.RSSI
-		if event.power_ratio != None:
-			self.power_ratio = event.power_ratio
-		#	print "power ratio", event.power_ratio
-			
 		if event.after_state != self.state and not event.event.startswith("PACKET"):
 			self.after_transition=  str(event.before_state) + " -> " + str(event.after_state)
 			self.end_time = event.time
@@ -356,12 +432,12 @@ class Transition():
 				self.transition = str(event.before_state) + " -> " + str(event.after_state)
 		return True
 
-	def find_stats_and_finalize(self, event):
+	def find_stats_and_finalize(self, event, signal):
 		for item in self.between:
 			subtype = item[0]
 			count = item[1]
 			event = item[2]
-			if subtype in self.time_to_reach_first and self.time_to_reach_first[subtype] == None:
+			if self.time_to_reach_first[subtype] == None:
 				self.time_to_reach_first[subtype] = event.time - self.begin_time
 				# TODO update
 				self.duplicates_first[subtype] = count
@@ -373,309 +449,530 @@ class Transition():
 			self.duplicates_last[subtype] = count
 			self.attributes_last[subtype] = event.secondary_attributes
 			self.duplicates_all[subtype] += count
+			if subtype not in self.attributes_all:
+				self.attributes_all[subtype] = {}
 			robustnetLib.mergeDict(event.secondary_attributes, self.attributes_all, subtype)
+		self.begin_RSSI, self.begin_power_ratio = signal.at(self.begin_time)
+		self.RSSI, self.power_ratio = signal.at(self.end_time)
 		#print "Final RSSI", self.RSSI
 
-	def __print_attributes(self, attribute_dict, event):
-		if len(attribute_dict[event]) > 0:
-			print "\t\t   ATTRIBUTES:"
-		for k, v in attribute_dict[event].iteritems():
-			print "\t\t\t", k, "|",
-			if len(v) > 0 and isinstance(v[0], int):
-				try:
-					avg = float(sum(v))/len(v)
-					stdev = robustnetLib.stdevValue(v, avg)
-					print "average:", avg, "stdev:", stdev
-					continue
-				except:
-					pass
-			counter = Counter(v).most_common(3)
-			for items in counter:
-				print items[0], ":", items[1], "|",
-			print
-			
-	def fraction_there(self, l):
-		if l == None or len(l) == 0:
-			return 0
-		new_l = [1 if x >= 1 else 0 for x in l]
-		return robustnetLib.meanValue(new_l)	
-			
-	def find_correlation(self, name, f_root):
-		f = None
-		if "camped -> connecting connecting -> connected" in name.lower():
-			occasionals = ["EVENT_LTE_EMM_INCOMING_MSG", "EVENT_LTE_EMM_TIMER_EXPIRY", "EVENT_LTE_RACH_ACCESS_START", "EVENT_LTE_EMM_TIMER_START"]
-			time_matters = [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RACH_RAID_MATCH"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_MAC_TIMER"), ("EVENT_LTE_RACH_RAID_MATCH", "EVENT_LTE_RACH_ACCESS_RESULT"), ("EVENT_LTE_RRC_UL_MSG", "EVENT_LTE_RRC_DL_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_UL_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_PAGING_DRX_CYCLE")]
-			transition_type = "connecting"			
-		elif "connected -> closing closing ->" in name.lower():
-			occasionals = ["EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_LTE_RACH_ACCESS_RESULT", "EVENT_LTE_UL_OUT_OF_SYNC", "EVENT_LTE_RACH_ACCESS_START", "EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_INCOMING_MSG", "EVENT_LTE_CM_OUTGOING_MSG", "EVENT_LTE_RACH_RAID_MATCH", "EVENT_LTE_TIMING_ADVANCE", "EVENT_LTE_ML1_PHR_REPORT", "EVENT_LTE_BSR_SR_REQUEST", "EVENT_SLOTTED_MODE_OPERATION", "EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_SD_EVENT_ACTION", "EVENT_IDLE_HANDOFF"]
-			time_matters = [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_MAC_TIMER"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_TIMER_STATUS"), ("EVENT_LTE_MAC_TIMER", "EVENT_LTE_RRC_TIMER_STATUS")]
-			transition_type = "closing"
-		elif "closing -> idle not camped idle not camped -> idle camped" in name.lower():
-
-			transition_type = "idle_nc"
-			occasionals = ["EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_INCOMING_MSG", "EVENT_IPV6_SM_EVENT", "EVENT_LTE_RRC_DL_MSG", "EVENT_LTE_ESM_OUTGOING_MSG"]
-			time_matters = [("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_EMM_TIMER_START"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_EMM_INCOMING_MSG"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_TIMER_STATUS"), ("EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RRC_NEW_CELL_IND")]
-		elif "CELL_PCH -> CELL_FACH CELL_FACH -> CELL_DCH" in name:
-			transition_type = "fach_promote"
-			occasionals = ["CELL_UPDATE_MSG", "MEASUREMENT_REPORT_MSG"]
-			time_matters = [("-begin-", "RADIO_BEARER_RECONFIGURATION_MSG"), ("RADIO_BEARER_RECONFIGURATION_MSG", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG"), ("-begin-", "CELL_UPDATE_CONFIRM_MSG"), ("RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG", "-end-")]
-		elif "CELL_DCH -> CELL_FACH CELL_FACH -> CELL_DCH" in name:
-			transition_type = "fach_temp"
-			occasionals = []
-			time_matters = [("-begin-", "EVENT_WCDMA_RLC_CONFIG"), ("EVENT_WCDMA_RLC_CONFIG", "EVENT_WCDMA_RLC_CONFIG"), ("EVENT_WCDMA_RLC_CONFIG", "-end-"), ("RADIO_BEARER_RECONFIGURATION_MSG", "-end-"), ("RADIO_BEARER_RECONFIGURATION_MSG", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG")]
-		elif "CELL_DCH -> CELL_FACH CELL_FACH -> CELL_PCH" in name:
-			transition_type  = "fach_demote"
-			occasionals = []
-			time_matters = [("-begin-", "RADIO_BEARER_RECONFIGURATION_COMPLETE_MSG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_MSG", "-end-"), ("-begin-", "EVENT_WCDMA_RLC_CONFIG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_MSG", "PHYSICAL_CHANNEL_RECONFIGURATION_COMPLETE_MSG"), ("PHYSICAL_CHANNEL_RECONFIGURATION_COMPLETE_MSG", "-end-")]
-		elif "Disconnected -> Connecting Connecting -> CELL_DCH" in name:
-			transition_type = "hspdap_connecting"
-			occasionals = ["PACKET_RCV", "RRC_CONNECTION_REJECT_MSG", "RRC_CONNECTION_REQUEST_MSG"]
-			time_matters = [("-begin-", "EVENT_WCDMA_PRACH"), ("-begin-", "RRC_CONNECTION_REQUEST_MSG"), ("-begin-", "EVENT_WCDMA_L1_STATE"), ("RRC_CONNECTION_REQUEST_MSG", "-end-"), ("EVENT_WCDMA_RRC_URNTI", "-end-"), ("RRC_CONNECTION_SETUP_MSG", "RRC_CONNECTION_SETUP_COMPLETE_MSG"), ("EVENT_WCDMA_L1_STATE", "EVENT_WCDMA_RRC_URNTI"), ("-begin-", "EVENT_WCDMA_ASET"), ("EVENT_WCDMA_ASET", "-end-"), ("EVENT_WCDMA_RRC_URNTI","EVENT_WCDMA_ASET")]
-		elif "CELL_DCH -> Disconnected Disconnected -> Connecting" in name:
-			transition_type = "hspdap_disconnected"
-			occasionals = ["PAGING_TYPE_1_MSG", "EVENT_WCDMA_RRCCSP_SCAN_START", "PACKET_RCV", "EVENT_LTE_EMM_TIMER_EXPIRY"]
-			time_matters = [("EVENT_GMM_STATE", "-end-"), ("EVENT_WCDMA_CONN_REQ_CAUSE", "-end-"), ("-begin-", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("-begin-", "EVENT_WCDMA_RRCCSP_SCAN_START"), ("EVENT_WCDMA_RRCCSP_SCAN_START", "EVENT_WCDMA_L1_STATE"), ("EVENT_WCDMA_L1_STATE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_WCDMA_L1_ACQ_SUBSTATE", "EVENT_WCDMA_L1_STATE"), ("EVENT_WCDMA_L1_ACQ_SUBSTATE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_WCDMA_CONN_REL_CAUSE", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("EVENT_PLMN_INFORMATION", "EVENT_WCDMA_L1_ACQ_SUBSTATE"), ("-begin-", "EVENT_WCDMA_L1_STATE"), ("-begin-", "EVENT_MM_STATE"), ("-begin-", "EVENT_WCDMA_CONN_REL_CAUSE"), ("-begin-", "EVENT_PLMN_INFORMATION"), ("RRC_CONNECTION_REQUEST_MSG", "-end"), ("EVENT_WCDMA_CONN_REQ_CAUSE", "RRC_CONNECTION_REQUEST_MSG"), ("EVENT_GMM_STATE", "RRC_CONNECTION_REQUEST_MSG")]
-		elif "Connecting -> CELL_DCH CELL_DCH -> Disconnected" in name:
-			transition_type = "hspdap_dch"
-			occasionals = ["DOWNLINK_DIRECT_TRANSFER_MSG", "UPLINK_DIRECT_TRANSFER_MSG"]
-			time_matters = [("-begin-", "EVENT_CM_CELL_SRV_IND"), ("-begin-", "INITIAL_DIRECT_TRANSFER_MSG"), ("-begin-", "EVENT_CM_COUNTRY_SELECTED"), ("-begin-", "EVENT_NAS_MESSAGE_SENT"), ("-begin-", "EVENT_LTE_EMM_TIMER_START"), ("-begin-", "ACTIVE_SET_UPDATE_MSG"), ("-begin-", "ACTIVE_SET_UPDATE_COMPLETE_MSG"), ("-begin-", "SECURITY_MODE_COMMAND_MSG"), ("-begin-", "EVENT_WCDMA_ASET"), ("-begin-", "SECURITY_MODE_COMPLETE_MSG"), ("-begin-", "EVENT_GMM_STATE"), ("-begin-", "EVENT_NAS_MESSAGE_RECEIVED"), ("SIGNALLING_CONNECTION_RELEASE_INDICATION_MSG", "-end-"), ("EVENT_IPV6_SM_EVENT", "-end-"), ("RRC_CONNECTION_RELEASE_COMPLETE_MSG", "-end-"), ("EVENT_EUL_RECONFIG_OR_ASU", "-end-"), ("EVENT_HS_DSCH_STATUS", "-end-"), ("EVENT_WCDMA_L1_STATE", "-end-"), ("SECURITY_MODE_COMMAND_MSG", "SECURITY_MODE_COMPLETE_MSG"), ("EVENT_NAS_MESSAGE_SENT", "EVENT_NAS_MESSAGE_RECEIVED"), ("ACTIVE_SET_UPDATE_MSG", "ACTIVE_SET_UPDATE_COMPLETE_MSG")]
+	def find_correlation(self, name, writer, distinct_events, rules=None):
+		if rules == None:
+			rules = correlation_rules
+		rule = rules.rule(name)
+		if rule == None:
+			return
+		writer.write(rule.transition_type, rule.row(self, distinct_events))
+
+class ReorderBuffer():
+	'''Hands events back in time order while holding at most window of them.
+
+	Events that arrive more than window places out of order can only be
+	released late; late counts how often that happened.'''
+
+	def __init__(self, window):
+		self.window = window
+		self.heap = []
+		self.seq = 0
+		self.last_time = None
+		self.late = 0
+
+	def push(self, event):
+		'''Add event, return the event that is now due or None'''
+		heapq.heappush(self.heap, (event.time, self.seq, event))
+		self.seq += 1
+		if len(self.heap) > self.window:
+			return self.__release()
+		return None
+
+	def drain(self):
+		while self.heap:
+			yield self.__release()
+
+	def resize(self, window):
+		'''Hold at most window events from now on, yielding the ones that
+		are due under it'''
+		self.window = window
+		while len(self.heap) > window:
+			yield self.__release()
+
+	def __release(self):
+		event = heapq.heappop(self.heap)[2]
+		if self.last_time != None and event.time < self.last_time:
+			self.late += 1
 		else:
-			return 
+			self.last_time = event.time
+		return event
 
-		f = open(f_root + "_" + transition_type + ".txt", "a")
-		inter_time = self.end_time - self.begin_time
-		print >>f, inter_time,
-
-		occasionals_match = [False for i in occasionals]
-		for k, v in self.duplicates_all.iteritems():
-			for i in range(len(occasionals)):
-				if occasionals[i] in k and v > 0:
-					occasionals_match[i] = True
-
-		for item in occasionals_match:
-			if item:
-				print >>f, "1",
-			else:
-				print >>f, "0",
-			
-		print >>f, self.RSSI, self.power_ratio,
-
-		for t_pair in time_matters:
-			start = t_pair[0]
-			end = t_pair[1]
-			
-			if start == end and start in self.time_to_reach_first and self.time_to_reach_first[start] != None and end in self.time_to_reach_last and self.time_to_reach_last[end] != None:
-				print >>f, (inter_time - self.time_to_reach_last[end]) - self.time_to_reach_first[start],
-						
-			elif start in self.time_to_reach_first and end in self.time_to_reach_first and self.time_to_reach_first[start] != None and self.time_to_reach_first[end] != None:
-				print >>f, self.time_to_reach_first[end] - self.time_to_reach_first[start], 
-			elif start == "-begin-" and end in self.time_to_reach_first and self.time_to_reach_first[end] != None:
-				print >>f, self.time_to_reach_first[end],
-			elif end == "-end-" and start in self.time_to_reach_last and self.time_to_reach_last[start] != None:
-#				print >>f, inter_time - self.time_to_reach_last[start],
-				print >>f, self.time_to_reach_last[start],
-			else:
-				print >>f, -1,
-
-		if transition_type == "closing":
-			if "EVENT_LTE_MAC_TIMER" in self.time_to_reach_first and self.time_to_reach_first["EVENT_LTE_MAC_TIMER"] != None:
-				print >>f, self.time_to_reach_first["EVENT_LTE_MAC_TIMER"] - self.time_to_reach_last["EVENT_LTE_MAC_TIMER"],
-			if "EVENT_LTE_RRC_TIMER_STATUS" in self.time_to_reach_first and self.time_to_reach_first["EVENT_LTE_RRC_TIMER_STATUS"] != None:
-				print >>f, self.time_to_reach_first["EVENT_LTE_RRC_TIMER_STATUS"] - self.time_to_reach_last["EVENT_LTE_RRC_TIMER_STATUS"],
-			if "EVENT_LTE_MAC_TIMER" in self.attributes_first and self.attributes_first["EVENT_LTE_MAC_TIMER"] != None:
-				if "Start" in self.attributes_first["EVENT_LTE_MAC_TIMER"]:
-					print >>f, "1",
-				else:
-					print >>f, "0",
 
-		if transition_type == "idle_nc":
-			if "EVENT_LTE_RRC_TIMER_STATUS" in self.attributes_first and "Timer Value" in self.attributes_first["EVENT_LTE_RRC_TIMER_STATUS"]:
-				print >>f, self.attributes_first["EVENT_LTE_RRC_TIMER_STATUS"]["Timer Value"],
-			else:
-				print >>f, -1,
+class TransitionBuilder():
+	'''Fills in missing states on time-ordered events and cuts them into
+	Transitions, returning each one as it closes.  signal is the
+	SignalSeries of the log the events are from.'''
 
-		print >>f
-		f.close()
+	def __init__(self, signal, release_events=False):
+		self.signal = signal
+		self.last_before_state = None
+		self.last_after_state = None
+		self.transition = Transition("None", 0)
+		# drop the events a closed transition holds once its stats are in
+		self.release_events = release_events
 
-	def merge_dicts_and_print(self, l, name, transition_file):
-		DEVELOP = False
-		if DEVELOP:
-			result = []
-			for item in l:
-				for i in range(len(item.between)):
-					if i >= len(result):
-						result.append({})
-					val = item.between[i][0]
-					if val not in result[i]:
-						result[i][val] = 1
-					else:
-						result[i][val] += 1
-		
-			for item in result:
-				sorted_result = sorted(item.iteritems(), key=operator.itemgetter(1), reverse=True)
-#				for k, v in sorted_result:
-#					print k + ":", v,
-#				print
-		time_to_reach_first = self.__create_dict(True, item=None)
-		duplicates_first = self.__create_dict(True)
-		attributes_first = self.__create_dict(False, d=True)
-		
-		time_to_reach_last= self.__create_dict(True, item=None)
-		duplicates_last = self.__create_dict(True)
-		attributes_last = self.__create_dict(False, d=True)
-
-		duplicates_all = self.__create_dict(True)
-		attributes_all = self.__create_dict(False, d=True)
-
-		inter_time = []
-
-		for item in l:
-			for k, v in item.time_to_reach_first.iteritems():
-				time_to_reach_first[k].append(v)
-			for k, v in item.duplicates_first.iteritems():
-				duplicates_first[k].append(v)
-			for k, v in item.time_to_reach_last.iteritems():
-				time_to_reach_last[k].append(v)
-			for k, v in item.duplicates_last.iteritems():
-				duplicates_last[k].append(v)
-			for k, v in item.duplicates_all.iteritems():
-				duplicates_all[k].append(v)
-			for k, v in item.attributes_first.iteritems():
-				robustnetLib.mergeDict(v, attributes_first, k)
-			for k, v in item.attributes_last.iteritems():
-				robustnetLib.mergeDict(v, attributes_last, k)
-			for k, v in item.attributes_all.iteritems():
-				robustnetLib.mergeDict(v, attributes_all, k, True)
-			if item.end_time != 0:
-				inter_time.append(item.end_time - item.begin_time)
-		if transition_file:	
-			print >>transition_file, name
-			print >>transition_file, robustnetLib.listToStr(inter_time, DEL = "\n")
-		print name
-		print "average:", robustnetLib.meanValue(inter_time), "stdev:", robustnetLib.stdevValue(inter_time)
-		print "min-ish:", robustnetLib.quartileResult(inter_time)[0]
-		print "min:", min(inter_time)
-		for k in time_to_reach_first.keys():
-			if max(duplicates_first[k]) == 0 and max(duplicates_last[k]) == 0:
-				continue
-			print "\t", k 
-			print "\t\tBEGIN: ",
-                        print "time from start:", robustnetLib.meanValue(time_to_reach_first[k]),
-			print "frequency appears: ", self.fraction_there(duplicates_first[k]),
-			print "duplicates:", robustnetLib.meanValue(duplicates_first[k]),
-			print "min appearances:", min(duplicates_first[k]),
-			print "number of tests:", len(duplicates_first[k])
-			self.__print_attributes(attributes_first, k)
-			print "\t\tALL: ",
-			print "frequency appears:", self.fraction_there(duplicates_all[k]),
-			print "duplicates:", robustnetLib.meanValue(duplicates_all[k]),
-			print "number of tests:", len(duplicates_all[k])
-			self.__print_attributes(attributes_all, k)
-			print "\t\tEND: ",
-			print "time from end:", robustnetLib.meanValue(time_to_reach_last[k]),
-			print "frequency appears:", self.fraction_there(duplicates_last[k]),
-			print "duplicates:", robustnetLib.meanValue(duplicates_last[k]),
-			print "min appearances:", min(duplicates_last[k])
-			print "RSSI and power ratio:", item.RSSI, item.power_ratio
-			
-			self.__print_attributes(attributes_last, k)
-
-f = open(sys.argv[1])
-
-#in_relevant_section = False
-event_parser = Event()
-
-#########################################################################
-#	Parse file, extract important info				#
-#########################################################################
-
-for line in f:
-	line = line.strip()
-	if len(line) != 0 and  line[0] == "%":
-		continue
-
-#	if line.startswith("2013"):
-#		in_relevant_section = True
-#	if len(line) == 0:
-#		in_relevant_section = not in_relevant_section
-#		continue
-#	if in_relevant_section:
-	event_parser.addNewLine(line)
-
-if len(sys.argv) > 2:
-	event_parser.addUpperLayerPackets(sys.argv[2])
-
-transition_file = None
-if len(sys.argv) > 3:
-	transition_file = open(sys.argv[3] + "_intervals.txt", "w")
-
-#########################################################################
-#	Put in order							#
-#########################################################################
-all_keys = Event.all_events.keys()
-all_keys = sorted(all_keys)
-last_key = -1
-last_before_state = None
-last_after_state = None
-sorted_events = []
-for k in all_keys:
-	actual_time = 0	
-#	if last_key != -1:
-#		actual_time = k - last_key
-	
-			
-	for event in Event.all_events[k]:
-		#if not event.event.startswith("EVENT_LTE") and not event.event.startswith("PACKET") and not event.event.startswith("EVENT_RRC"):
-#			continue
-		#event.time = actual_time
+	def add(self, event):
 		if event.before_state != None:
-			last_before_state = event.before_state
+			self.last_before_state = event.before_state
 		else:
-			event.before_state = last_before_state
-			
+			event.before_state = self.last_before_state
+
 		if event.after_state != None:
-			last_after_state = event.after_state
+			self.last_after_state = event.after_state
 		else:
-			event.after_state = last_after_state
-
-		#event.printme()
-		sorted_events.append(event)
-		actual_time = 0
-
-	last_key = k
-
+			event.after_state = self.last_after_state
 
-#########################################################################
-#	Process, generate statistics					#
-#########################################################################
-
-#for event in all_events:
-transition = Transition("None", 0)
-transition_dict = {}
-for event in sorted_events:
-	if not transition.update(event):
+		if self.transition.update(event):
+			return None
 		# finished updating, go to next one
-		transition.find_stats_and_finalize(event)
+		closed = self.transition
+		closed.find_stats_and_finalize(event, self.signal)
+		if self.release_events:
+			closed.between = []
+		self.transition = Transition(event.after_state, event.time)
 		# save if valid
-		if transition.transition != None and transition.after_transition != None:
+		if closed.transition != None and closed.after_transition != None:
+			return closed
+		return None
+
+
+def event_lines(f):
+	lines = 0
+	try:
+		for line in f:
+			lines += 1
+			line = line.strip()
+			if len(line) != 0 and  line[0] == "%":
+				continue
+			yield line
+	finally:
+		stats.count("lines", lines)
+
+def parse_events(f, parser=None):
+	'''Parse f with parser (a new EventParser by default), yielding each
+	event as soon as it is complete (in file order)'''
+	if parser == None:
+		parser = EventParser()
+	parser.pending = []
+	try:
+		for line in event_lines(f):
+			parser.addNewLine(line)
+			if not parser.pending:
+				continue
+			for event in parser.pending:
+				yield event
+			del parser.pending[:]
+	finally:
+		parser.pending = None
+
+def stream_events(f, packets=None, window=1000, parser=None):
+	'''Parse f and yield its events in time order without keeping them all.
+
+	Only window events are held back for reordering.  packets, if given,
+	must be sorted by time; they are merged in as PACKET_* events.'''
+	buf = ReorderBuffer(window)
+
+	def parsed():
+		for event in parse_events(f, parser):
+			event = buf.push(event)
+			if event != None:
+				yield event
+		for event in buf.drain():
+			yield event
+
+	events = parsed()
+	if packets != None:
+		events = merge_packets(events, packets)
+	for event in events:
+		yield event
+	if buf.late:
+		log.warning("%d events were more than %d places out of order", buf.late, window)
+
+def sorted_packets(packets):
+	'''packets in time order; captures almost always are already'''
+	for i in xrange(1, len(packets)):
+		if packets[i].time < packets[i - 1].time:
+			return sorted(packets, key=lambda p: p.time)
+	return packets
+
+def merge_packets(events, packets):
+	'''Join time-ordered events with time-ordered packets, turned into
+	PACKET_* events.  Packets go after events with the same timestamp.'''
+	decorated_events = ((event.time, 0, i, event) for i, event in enumerate(events))
+	decorated_packets = ((p.time, 1, i, p) for i, p in enumerate(packets))
+	for item in heapq.merge(decorated_events, decorated_packets):
+		if item[1] == 0:
+			yield item[3]
+		else:
+			yield packet_event(item[3])
+
+def store_events(f, parser=None):
+	'''Parse f into an EventStore'''
+	store = event_store.EventStore()
+	for event in parse_events(f, parser):
+		store.append(event)
+	return store
+
+def load_store(eventfile, jobs=1, parser=None):
+	'''Parse eventfile into an EventStore, in jobs processes'''
+	if jobs > 1:
+		return parallel_store(eventfile, jobs, parser=parser)
+	return store_events(open(eventfile), parser)
+
+def cached_store(eventfile, cache, jobs=1, parser=None):
+	'''EventStore for eventfile, from cache if it has a current copy.
+	parser gets the event types and signal strengths either way.'''
+	if parser == None:
+		parser = EventParser()
+	cached = cache.load(eventfile)
+	if cached != None:
+		store, extra = cached
+		# the same insertion order a parse would have produced
+		for name in store.names:
+			parser.add_event_name(name)
+		parser.signal = extra["signal"]
+		return store
+	store = load_store(eventfile, jobs, parser)
+	cache.save(eventfile, store, {"signal": parser.signal})
+	return store
+
+# what a chunk's parser takes the RRC state to be before its first state
+# change; stitch_chunk puts in the real one
+UNKNOWN_STATE = "<state at the end of the previous chunk>"
+
+def chunk_offsets(filename, chunks):
+	'''Byte offsets that cut filename into about chunks pieces, each but
+	the first starting at a QXDM header line'''
+	f = open(filename, "rb")
+	size = os.fstat(f.fileno()).st_size
+	if size == 0:
+		f.close()
+		return [0, 0]
+	data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	offsets = [0]
+	try:
+		for i in range(1, chunks):
+			pos = max(size * i / chunks, offsets[-1])
+			while pos >= 0:
+				pos = data.find("\n", pos)
+				if pos < 0:
+					break
+				pos += 1
+				end = data.find("\n", pos)
+				if end < 0:
+					end = size
+				if timestamps.is_header(data[pos:end].strip()):
+					offsets.append(pos)
+					break
+			if pos < 0:
+				break
+	finally:
+		data.close()
+		f.close()
+	offsets.append(size)
+	return offsets
+
+def parse_chunk(args):
+	'''Worker: parse the bytes from begin to end of filename into an
+	EventStore.  Returns it with the chunk's signal series, the state it
+	ends in and its counters.'''
+	filename, begin, end, last = args
+	# only this chunk's counts go back
+	stats.counters = {}
+	parser = EventParser()
+	parser.last_state = UNKNOWN_STATE
+	f = open(filename)
+	f.seek(begin)
+	data = f.read(end - begin)
+	f.close()
+	store = store_events(cStringIO.StringIO(data), parser)
+	event = parser.current_event
+	if not last and event != None and event.event != None:
+		# the header starting the next chunk would have saved it
+		store.append(event)
+	return store, parser.signal, parser.last_state, stats.counters
+
+def stitch_chunk(store, state):
+	'''Give the first state change of a chunk the before state a serial
+	parse would have, now that state, the one it starts in, is known'''
+	unknown = store.state_codes.get(UNKNOWN_STATE)
+	if unknown == None:
+		return
+	# only the first change can have it; after that the chunk knows its state
+	row = store.before_states.index(unknown)
+	after = store.states[store.after_states[row]]
+	if state == None or state == after:
+		store.before_states[row] = -1
+	else:
+		store.before_states[row] = store.state_code(state)
+
+def parallel_store(eventfile, jobs, chunks=None, parser=None):
+	'''EventStore of eventfile, parsed in pieces by jobs processes.  The
+	pieces are put back together in order, giving what store_events (and
+	parser) would have.'''
+	if parser == None:
+		parser = EventParser()
+	if chunks == None:
+		chunks = jobs * 4
+	offsets = chunk_offsets(eventfile, chunks)
+	work = [(eventfile, offsets[i], offsets[i + 1], i + 2 == len(offsets)) for i in range(len(offsets) - 1)]
+	store = event_store.EventStore()
+	state = None
+	pool = multiprocessing.Pool(jobs)
+	try:
+		for chunk, signal, last_state, counters in pool.imap(parse_chunk, work):
+			stats.merge_counters(counters)
+			stitch_chunk(chunk, state)
+			store.extend(chunk)
+			parser.signal.extend(signal)
+			if last_state != UNKNOWN_STATE:
+				state = last_state
+	finally:
+		pool.close()
+		pool.join()
+	parser.last_state = state
+	for name in store.names:
+		parser.add_event_name(name)
+	return store
+
+def build_transitions(events, signal, release_events=False):
+	'''Group the closed transitions of a time-ordered event stream by name.
+	signal is the SignalSeries of the log the events are from.'''
+	builder = TransitionBuilder(signal, release_events)
+	transition_dict = {}
+	stats.start("transitions")
+	try:
+		for event in stats.count_events(events):
+			transition = builder.add(event)
+			if transition == None:
+				continue
 			name = transition.transition + " " + transition.after_transition
 			if name in transition_dict:
 				transition_dict[name].append(transition)
 			else:
 				transition_dict[name] = [transition]
-		transition = Transition(event.after_state, event.time)
-
-if transition_file:
-	for suffix in ["connecting", "closing", "idle_nc", "fach_demote", "fach_promote", "fach_temp", "hspdap_dch", "hspdap_disconnected", "hspdap_connecting"]:
-		if os.path.isfile(sys.argv[3] + "_" + suffix + ".txt"):
-			os.remove(sys.argv[3] + "_" + suffix + ".txt")	
-
-for k, v in transition_dict.iteritems():
-
-	if "None" not in k:
-		v[0].merge_dicts_and_print(v, k, transition_file)
-	if transition_file:
-		for item in v:
-			item.find_correlation(k, sys.argv[3])
-
-
+	finally:
+		stats.stop()
+	return transition_dict
+
+def parse(eventfile, packetfile=None, stream=False, window=1000, columnar=False, cache=None, jobs=1, parser=None):
+	'''Parse a QXDM event file (and tshark packet file), return its
+	transitions grouped by name.  cache is an event_cache.EventCache to
+	load parsed events from and save them to.  With more than one job
+	the event file is parsed in parallel (into a column store).  parser,
+	a new EventParser, is left with the event types seen, which report
+	needs.'''
+	if parser == None:
+		parser = EventParser()
+	packets = None
+	if packetfile:
+		packets = sorted_packets(load_packets(packetfile))
+
+	if columnar or cache != None or jobs > 1:
+		stats.start("parse")
+		try:
+			if cache != None:
+				store = cached_store(eventfile, cache, jobs, parser)
+			else:
+				store = load_store(eventfile, jobs, parser)
+		finally:
+			stats.stop()
+		events = stats.iterate("order", store.iter_ordered())
+		release_events = True
+	elif stream:
+		# parsed as the transitions are built
+		events = stats.iterate("parse", stream_events(open(eventfile), None, window, parser))
+		release_events = True
+	else:
+		stats.start("parse")
+		try:
+			for line in event_lines(open(eventfile)):
+				parser.addNewLine(line)
+		finally:
+			stats.stop()
+		events = stats.iterate("order", parser.ordered_events())
+		release_events = False
+
+	if packets:
+		events = stats.iterate("merge_packets", merge_packets(events, packets))
+	return build_transitions(events, parser.signal, release_events)
+
+def report(transition_dict, distinct_events, root=None, binary=False, rules=None, out=None, format="text", summaries=None):
+	'''Write the statistics of each kind of transition to out (stdout by
+	default) as text, json or csv, and with root, the interval and
+	correlation files.  distinct_events are the event types seen, as kept
+	by EventParser.  summaries, by name, are TransitionSummaries already
+	kept of the transitions; the interval and correlation files still need
+	the transitions themselves.'''
+	if rules == None:
+		rules = correlation_rules
+	if out == None:
+		out = sys.stdout
+	if summaries == None:
+		kinds = transition_dict
+	else:
+		kinds = summaries
+	report_writer = transition_report.ReportWriter(out, format)
+	transition_file = None
+	writer = None
+	if root:
+		transition_file = open(root + "_intervals.txt", "w")
+		writer = correlation.CorrelationWriter(root, rules.types(), binary)
+
+	stats.start("report")
+	try:
+		for k in kinds:
+			v = transition_dict.get(k, [])
+
+			if "None" not in k:
+				if summaries == None:
+					summary = transition_report.summarize(v, k, distinct_events)
+				else:
+					summary = summaries[k].result(distinct_events)
+				report_writer.add(summary)
+				if transition_file:
+					transition_file.write(k + "\n" + robustnetLib.listToStr(transition_report.intervals(v), DEL = "\n") + "\n")
+			if writer:
+				stats.start("report.correlation")
+				try:
+					for item in v:
+						item.find_correlation(k, writer, distinct_events, rules)
+				finally:
+					stats.stop()
+		report_writer.close()
+	finally:
+		if writer:
+			writer.close()
+			transition_file.close()
+		stats.stop()
+
+# steps of the parser and the transition builder timed with --stats-detail
+DETAIL_STAGES = ((Event, "_Event__getTime", "parse.time"), \
+	(Event, "_Event__getEvent", "parse.event_name"), \
+	(Event, "_Event__getStateChange", "parse.state_change"), \
+	(Event, "_Event__getSignalStrengths", "parse.signal"), \
+	(Event, "_Event__getSecondary", "parse.secondary"), \
+	(EventParser, "_EventParser__saveEvent", "parse.save"), \
+	(Transition, "update", "transitions.update"), \
+	(Transition, "find_stats_and_finalize", "transitions.finalize"))
+
+def enable_stats(detail=False, trace_memory=False):
+	'''Time each stage per event and count events by type.  With detail,
+	also time each step of the parser on every line, which makes the run
+	noticeably slower.  With trace_memory, also charge each stage with how
+	much it grew the peak resident size.'''
+	stats.enable(trace_memory)
+	if detail:
+		for cls, name, stage in DETAIL_STAGES:
+			stats.instrument(cls, name, stage)
+
+def profile_summary(profile, top=20):
+	'''The functions of a cProfile run that took the most time of their
+	own'''
+	import pstats
+	functions = []
+	for (filename, line, name), (calls, total_calls, own, cumulative, callers) in \
+			pstats.Stats(profile).stats.iteritems():
+		functions.append({"function": "%s:%d(%s)" % (filename, line, name), "calls": total_calls, \
+				"own_seconds": own, "seconds": cumulative})
+	functions.sort(key=lambda f: f["own_seconds"], reverse=True)
+	return functions[:top]
+
+def write_stats(filename, profile=None):
+	'''Write the stats summary as JSON to filename, - for stderr'''
+	if "events" not in stats.counters:
+		stats.count("events", sum(n for name, n in stats.event_types.iteritems() if not name.startswith("PACKET_")))
+	summary = stats.summary()
+	if profile != None:
+		summary["profile"] = profile_summary(profile)
+	if filename == "-":
+		json.dump(summary, sys.stderr, indent=1, sort_keys=True)
+		sys.stderr.write("\n")
+		return
+	f = open(filename, "w")
+	json.dump(summary, f, indent=1, sort_keys=True)
+	f.write("\n")
+	f.close()
+
+def add_output_arguments(parser):
+	parser.add_argument("--format", choices=transition_report.FORMATS, default="text", help="how to write the report")
+	parser.add_argument("-o", "--output", metavar="FILE", help="write the report to FILE instead of stdout")
+	parser.add_argument("-v", "--verbose", action="store_true", help="log parser debugging messages")
+	parser.add_argument("-q", "--quiet", action="store_true", help="log only errors")
+
+def setup_logging(args):
+	level = logging.WARNING
+	if args.verbose:
+		level = logging.DEBUG
+	elif args.quiet:
+		level = logging.ERROR
+	logging.basicConfig(level=level, format="%(name)s: %(levelname)s: %(message)s")
+
+def open_output(args):
+	if args.output:
+		return open(args.output, "w")
+	return sys.stdout
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="Statistics on the events seen around RRC state transitions.")
+	parser.add_argument("eventfile", help="QXDM events dumped to text")
+	parser.add_argument("packetfile", nargs="?", help="pcap or pcapng capture, or one converted to text with tshark")
+	parser.add_argument("root", nargs="?", help="prefix for the interval and correlation files")
+	parser.add_argument("--stream", action="store_true", help="order events with a small reorder buffer instead of holding the whole log")
+	parser.add_argument("--window", type=int, default=1000, help="events held back for reordering with --stream")
+	parser.add_argument("--columnar", action="store_true", help="keep parsed events in a compact column store instead of Event objects")
+	parser.add_argument("--cache", nargs="?", const=event_cache.DEFAULT_DIR, metavar="DIR", help="reuse parsed events cached in DIR (implies --columnar)")
+	parser.add_argument("--cache-size", type=int, default=1024, metavar="MB", help="size cap of the cache")
+	parser.add_argument("-j", "--jobs", type=int, default=1, help="parse the event file in this many processes (implies --columnar)")
+	parser.add_argument("--binary", action="store_true", help="also write the correlation rows as float64 (see correlation.py)")
+	parser.add_argument("--rules", metavar="FILE", help="JSON correlation rules to use instead of the built-in ones")
+	add_output_arguments(parser)
+	parser.add_argument("--stats", metavar="FILE", help="write stage times and counters as JSON to FILE (- for stderr)")
+	parser.add_argument("--stats-detail", action="store_true", help="with --stats, also time each step of the parser")
+	parser.add_argument("--profile", metavar="FILE", help="run under cProfile and save its stats to FILE")
+	parser.add_argument("--trace-memory", action="store_true", help="with --stats, also charge each stage with how much it grew the peak resident size")
+	args = parser.parse_args(argv[1:])
+	setup_logging(args)
+	if args.stats:
+		enable_stats(args.stats_detail, args.trace_memory)
+	profile = None
+	if args.profile:
+		import cProfile
+		profile = cProfile.Profile()
+		profile.enable()
+
+	rules = None
+	if args.rules:
+		rules = correlation.load_rules(args.rules)
+
+	cache = None
+	if args.cache:
+		cache = event_cache.EventCache(args.cache, args.cache_size << 20)
+
+	#########################################################################
+	#	Parse file, put in order, generate statistics			#
+	#########################################################################
+	event_parser = EventParser()
+	transition_dict = parse(args.eventfile, args.packetfile, args.stream, args.window, args.columnar, cache, args.jobs, event_parser)
+	out = open_output(args)
+	try:
+		report(transition_dict, event_parser.distinct_events, args.root, args.binary, rules, out, args.format)
+	finally:
+		if out != sys.stdout:
+			out.close()
+
+	if profile != None:
+		profile.disable()
+		profile.dump_stats(args.profile)
+	if args.stats:
+		write_stats(args.stats, profile)
+
+if __name__ == "__main__":
+	main(sys.argv)
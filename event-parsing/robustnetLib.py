@@ -67,3 +67,200 @@ def listToStr(li, DEL = "\t"):
     """author: Haokun """
     return DEL.join(str(li)[1:-1].split(", "))
 
+
+# Streaming versions of the statistics above.  They see each value once,
+# keep O(1) state, and two of them (e.g. from different files or worker
+# processes) can be merged into one.  None values are skipped, as above.
+
+# Standard deviation by Welford's method, merged with the pairwise update of
+# Chan et al.  stdev() matches stdevValue (population stdev).  The mean is
+# taken from the running sum, as meanValue takes it.
+class RunningStats:
+    def __init__(self):
+        self.n = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        if x == None:
+            return
+        self.n += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.total += other.total
+
+    def meanValue(self):
+        if not self.n:
+            return 0.0
+        return self.total * 1.0 / self.n
+
+    def stdev(self):
+        if not self.n:
+            return 0.0
+        return math.sqrt(self.m2 / self.n)
+
+# Approximate quantiles with a merging t-digest (Dunning & Ertl).  Values are
+# folded into centroids using the k1 scale function, which keeps centroids
+# small near the tails.  Repeats of a value stay together in an exact
+# centroid, and one that holds at least 1/compression of the values is never
+# folded in with other values, so tied data such as whole milliseconds keeps
+# its exact values.  Centroids are only folded once there are more than
+# 5*compression distinct values, so until then quantile() is exact.
+#
+# quantile(q) returns a value whose rank (anywhere from the fraction of the
+# values below it to the fraction at or below it) is off from q by at most
+# 2*pi*sqrt(q*(1-q))/compression, the most a centroid around q can hold,
+# plus 1/compression, the most a repeated value that was folded into a
+# centroid can hold.  For the default compression of 200 that is 1.2% at the
+# 5th/95th percentile, 1.9% at the quartiles and 2.1% at the median, merged
+# or not; benchmark.py stats checks it on continuous and on tied data.  The
+# digest keeps fewer than 5*compression centroids; once folded, about
+# compression/2, plus at most compression exact ones for heavily repeated
+# values.  min and max are exact.
+class QuantileDigest:
+    def __init__(self, compression=200):
+        self.compression = compression
+        # (mean, weight, exact): exact when every value in it is mean
+        self.centroids = []
+        self.buffer = []
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, x, w=1):
+        if x == None:
+            return
+        self.buffer.append((x, w, True))
+        self.count += w
+        if self.min == None or x < self.min:
+            self.min = x
+        if self.max == None or x > self.max:
+            self.max = x
+        if len(self.buffer) >= 5 * self.compression:
+            self.__compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self.buffer.extend(other.centroids)
+        self.buffer.extend(other.buffer)
+        self.count += other.count
+        if self.min == None or other.min < self.min:
+            self.min = other.min
+        if self.max == None or other.max > self.max:
+            self.max = other.max
+        if len(self.buffer) >= 5 * self.compression:
+            self.__compress()
+
+    def __k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def __sorted(self):
+        '''Centroids and buffer in order, with repeats of a value together'''
+        items = []
+        for x, w, exact in sorted(self.centroids + self.buffer):
+            if items and exact and items[-1][2] and items[-1][0] == x:
+                items[-1] = (x, items[-1][1] + w, True)
+            else:
+                items.append((x, w, exact))
+        return items
+
+    def __compress(self):
+        items = self.__sorted()
+        self.buffer = []
+        if len(items) < 5 * self.compression:
+            # few enough distinct values to keep them all
+            self.centroids = items
+            return
+        total = float(self.count)
+        # exact centroids this heavy are left alone
+        heavy = total / self.compression
+        merged = []
+        mean, weight, exact = items[0]
+        before = 0
+        limit = self.__k(0.0) + 1
+        for x, w, x_exact in items[1:]:
+            if not (exact and weight >= heavy) and not (x_exact and w >= heavy) and \
+                    self.__k(min(1.0, (before + weight + w) / total)) <= limit:
+                weight += w
+                mean += (x - mean) * w / weight
+                exact = False
+            else:
+                merged.append((mean, weight, exact))
+                before += weight
+                limit = self.__k(before / total) + 1
+                mean, weight, exact = x, w, x_exact
+        merged.append((mean, weight, exact))
+        self.centroids = merged
+
+    def quantile(self, q):
+        '''The value at rank q*count, as quartileResult picks it: exact inside
+        an exact centroid, otherwise interpolated between the centres of the
+        centroids around it'''
+        if self.count == 0:
+            return 0
+        target = q * self.count
+        # the last point (rank, value) known to be on the curve
+        last_rank, last_value = 0.0, self.min
+        before = 0
+        for mean, weight, exact in self.__sorted():
+            # an exact centroid covers the ranks from before to before +
+            # weight; any other is taken to be at its centre
+            if exact:
+                rank = before
+            else:
+                rank = before + weight / 2.0
+            if target < rank:
+                if rank == last_rank:
+                    return mean
+                return last_value + (mean - last_value) * (target - last_rank) / (rank - last_rank)
+            before += weight
+            if exact:
+                if target < before:
+                    return mean
+                last_rank, last_value = before, mean
+            else:
+                last_rank, last_value = rank, mean
+        if self.count == last_rank:
+            return self.max
+        return last_value + (self.max - last_value) * (target - last_rank) / (self.count - last_rank)
+
+# Streaming stand-in for meanValue/stdevValue/quartileResult on one metric
+class StreamSummary:
+    def __init__(self, compression=200):
+        self.stats = RunningStats()
+        self.digest = QuantileDigest(compression)
+
+    def add(self, x):
+        self.stats.add(x)
+        self.digest.add(x)
+
+    def extend(self, li):
+        for x in li:
+            self.add(x)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.digest.merge(other.digest)
+
+    def meanValue(self):
+        return self.stats.meanValue()
+
+    def stdevValue(self):
+        return self.stats.stdev()
+
+    # [5%, 25%, 50%, 75%, 95%], like quartileResult
+    def quartileResult(self):
+        return [self.digest.quantile(q) for q in (0.05, 0.25, 0.5, 0.75, 0.95)]
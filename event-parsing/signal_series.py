@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+# Signal strength measurements (the rows of QXDM's LTE ML1 measurement
+# tables) as a time series.  A transition looks up the signal at its begin
+# and end times with a bisect instead of carrying along whatever value was
+# parsed last.
+
+import bisect
+from array import array
+
+def parse_row(line):
+	'''(RSSI, RSRP, RSRQ) from a measurement table row, or None'''
+	# rows look like "|   0|  -62.36|  -105.22|  -12.36|  1|  2|  -9.52|..."
+	if line[:1] != "|":
+		return None
+	fields = line.split("|")
+	if len(fields) < 10:
+		return None
+	try:
+		# from LoadSense
+		if float(fields[2]) >= 0:
+			row = float(fields[3]), float(fields[4]), float(fields[7])
+		else:
+			row = float(fields[2]), float(fields[3]), float(fields[6])
+	except ValueError:
+		# the table's header row
+		return None
+	if row[2] == 0:
+		# no power ratio to be had
+		return None
+	return row
+
+class SignalSeries:
+	def __init__(self):
+		self.times = array("d")
+		self.RSSI = array("d")
+		self.RSRP = array("d")
+		self.RSRQ = array("d")
+
+	def __len__(self):
+		return len(self.times)
+
+	def add(self, time, RSSI, RSRP, RSRQ):
+		if self.times and time < self.times[-1]:
+			# measurements are logged nearly in order; keep them sorted
+			i = bisect.bisect_right(self.times, time)
+		else:
+			i = len(self.times)
+		self.times.insert(i, time)
+		self.RSSI.insert(i, RSSI)
+		self.RSRP.insert(i, RSRP)
+		self.RSRQ.insert(i, RSRQ)
+
+	def extend(self, other):
+		'''Add the measurements of other, another SignalSeries, as if they
+		were added one at a time after these'''
+		if not other.times:
+			return
+		if self.times and other.times[0] < self.times[-1]:
+			for i in xrange(len(other.times)):
+				self.add(other.times[i], other.RSSI[i], other.RSRP[i], other.RSRQ[i])
+			return
+		self.times.extend(other.times)
+		self.RSSI.extend(other.RSSI)
+		self.RSRP.extend(other.RSRP)
+		self.RSRQ.extend(other.RSRQ)
+
+	def drop_before(self, time):
+		'''Forget the measurements that at(t) for t >= time no longer needs'''
+		i = self.index_at(time)
+		if i > 0:
+			for column in (self.times, self.RSSI, self.RSRP, self.RSRQ):
+				del column[:i]
+
+	def index_at(self, time):
+		'''Index of the last measurement taken at or before time, or -1'''
+		return bisect.bisect_right(self.times, time) - 1
+
+	def at(self, time):
+		'''(RSSI, power ratio) as last measured at or before time, or
+		(None, None) before the first measurement'''
+		i = self.index_at(time)
+		if i < 0:
+			return None, None
+		return self.RSSI[i], self.RSRP[i] / self.RSRQ[i]
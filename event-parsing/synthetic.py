@@ -0,0 +1,221 @@
+#!/usr/bin/python
+
+# Made-up QXDM event text and tshark packet dumps, shaped like the real ones,
+# for benchmarks and for trying things out without a phone.
+#
+#	./synthetic.py events 100000 > events.txt
+#	./synthetic.py packets 10000 > packets.txt
+#	./synthetic.py fields 10000 > packets.txt
+#
+# The event log cycles an LTE phone through the RRC states, with every event
+# in process_any.event_list turning up now and then, a signal strength table
+# every so often and a stretch of WCDMA state changes once in a while.  The
+# packets are our UDP probes (and some other traffic) over the same hours.
+# The same seed gives the same output.
+
+import sys, time, random
+import process_any, timestamps
+
+# where the logs start, in local time like the real ones
+START = (2013, 6, 12, 18, 51, 0)
+
+def start_ms():
+	return int(time.mktime(START + (0, 0, -1))) * 1000
+
+class Clock:
+	'''Epoch milliseconds moving forward, formatted for QXDM headers and
+	tshark Arrival Time lines'''
+	def __init__(self, ms):
+		self.ms = ms
+		self.second = None
+
+	def advance(self, low, high):
+		self.ms += random.randint(low, high)
+
+	def __prefix(self, ms):
+		second = ms // 1000
+		if second != self.second:
+			self.second = second
+			tm = time.localtime(second)
+			self.header = time.strftime("%Y %b %d  %H:%M:%S", tm)
+			self.arrival = time.strftime("%b %d, %Y %H:%M:%S", tm)
+			self.zone = time.strftime("%Z", tm)
+		return ms % 1000
+
+	def header_time(self, ms=None):
+		if ms == None:
+			ms = self.ms
+		millis = self.__prefix(ms)
+		return "%s.%03d" % (self.header, millis)
+
+	def arrival_time(self, ms=None):
+		if ms == None:
+			ms = self.ms
+		millis = self.__prefix(ms)
+		return "%s.%03d%06d %s" % (self.arrival, millis, random.randint(0, 999999), self.zone)
+
+# payloads that match the secondary patterns, and a few that do not
+PAYLOADS = {
+	"EVENT_LTE_BSR_SR_REQUEST": lambda: "Is BSR Timer Expired = %d, Is Higher Priority Data Arrial = %d, Is Retx BSR Timer Expired = 0, Is Request To Include BSR Report = 1, Is Request To Send SR = %d" % \
+			(random.randint(0, 1), random.randint(0, 1), random.randint(0, 1)),
+	"EVENT_LTE_CM_OUTGOING_MSG": lambda: "Message ID = " + random.choice(["Service Request", "Extended Service Request"]),
+	"EVENT_LTE_EMM_INCOMING_MSG": lambda: "Message ID = " + random.choice(["Attach Accept", "Tracking Area Update Accept", "EMM Information"]),
+	"EVENT_LTE_EMM_OTA_OUTGOING_MSG": lambda: "Message ID = " + random.choice(["Attach Complete", "Tracking Area Update Complete"]),
+	"EVENT_LTE_EMM_OUTGOING_MSG": lambda: "Message ID = " + random.choice(["Attach Request", "Tracking Area Update Request"]),
+	"EVENT_LTE_EMM_TIMER_EXPIRY": lambda: random.choice(["Timer ID = TIMER T3412", "Timer ID = TIMER T3411", "Timer ID = 17"]),
+	"EVENT_LTE_EMM_TIMER_START": lambda: random.choice(["Timer ID = TIMER T3411", "Timer ID = TIMER T3412", "Timer ID = 17"]),
+	"EVENT_LTE_ESM_OUTGOING_MSG": lambda: "Message ID = " + random.choice(["PDN Connectivity Request", "PDN Disconnect"]),
+	"EVENT_LTE_MAC_RESET": lambda: random.choice(["Cause = RLF", "Cause = Handover", "Bogus = 3"]),
+	"EVENT_LTE_MAC_TIMER": lambda: "Timer type = TA Timer, Action = " + random.choice(["Start", "Stop", "Expired"]),
+	"EVENT_LTE_ML1_PHR_REPORT": lambda: "Power Headroom = %d, PHR Trigger = %s" % (random.randint(-10, 30), random.choice(["Periodic", "Pathloss"])),
+	"EVENT_LTE_RACH_ACCESS_RESULT": lambda: "Result = " + random.choice(["Success", "Success", "Success", "Failure"]),
+	"EVENT_LTE_RACH_ACCESS_START": lambda: "RACH Cause = %s, RACH Contention = %s" % \
+			(random.choice(["Connection Request", "UL Data Arrival", "Radio Link Failure"]), random.choice(["Contention Based", "Contention Free"])),
+	"EVENT_LTE_RACH_RAID_MATCH": lambda: "Match = %d" % random.randint(0, 1),
+	"EVENT_LTE_REG_INCOMING_MSG": lambda: "Message ID = Registration Accept",
+	"EVENT_LTE_REG_OUTGOING_MSG": lambda: "Message ID = Registration Request",
+	"EVENT_LTE_RRC_DL_MSG": lambda: "Channel Type = %s, Message Type = %s" % \
+			random.choice([("DL CCCH", "Connection Setup"), ("DL DCCH", "Connection Reconfiguration"), ("DL DCCH", "Connection Release"), ("PCCH", "Paging")]),
+	"EVENT_LTE_RRC_NEW_CELL_IND": lambda: "Cause = %s, Frequency = %d, Cell ID = %d" % \
+			(random.choice(["Reselection", "Handover"]), random.choice([5230, 5780, 2175]), random.randint(1, 40)),
+	"EVENT_LTE_RRC_OUT_OF_SERVICE": lambda: None,
+	"EVENT_LTE_RRC_PAGING_DRX_CYCLE": lambda: "DRX Cycle = %d" % random.choice([32, 64, 128, 256]),
+	"EVENT_LTE_RRC_SECURITY_CONFIG": lambda: "Status = " + random.choice(["Success", "Success", "Failure"]),
+	"EVENT_LTE_RRC_STATE_CHANGE_TRIGGER": lambda: "RRC State Change Trigger = " + random.choice(["Paging", "Release", "Camping", "Data"]),
+	"EVENT_LTE_RRC_TIMER_STATUS": lambda: "Timer Name = %s, Timer Value = %d, Timer State = %s" % \
+			(random.choice(["T300", "T310", "T311"]), random.choice([10, 100, 200, 1000]), random.choice(["Started", "Stopped", "Expired"])),
+	"EVENT_LTE_RRC_UL_MSG": lambda: "Channel Type = %s, Message Type = %s" % \
+			random.choice([("UL CCCH", "Connection Request"), ("UL DCCH", "Connection Setup Complete"), ("UL DCCH", "Measurement Report")]),
+	"EVENT_LTE_TIMING_ADVANCE": lambda: "Timer Value = %d, Timing Advance = %d" % (random.choice([500, 750, 1280]), random.randint(0, 60)),
+}
+
+# events seen in each state, besides the state changes themselves
+STATE_EVENTS = {
+	"Idle Camped": ["EVENT_LTE_RRC_PAGING_DRX_CYCLE", "EVENT_LTE_RRC_TIMER_STATUS", "EVENT_LTE_RRC_NEW_CELL_IND", \
+			"EVENT_LTE_EMM_TIMER_START", "EVENT_LTE_EMM_TIMER_EXPIRY", "EVENT_LTE_RRC_OUT_OF_SERVICE"],
+	"Connecting": ["EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_RACH_ACCESS_START", "EVENT_LTE_RACH_RAID_MATCH", \
+			"EVENT_LTE_RACH_ACCESS_RESULT", "EVENT_LTE_MAC_TIMER", "EVENT_LTE_RRC_UL_MSG", "EVENT_LTE_RRC_DL_MSG", \
+			"EVENT_LTE_EMM_OUTGOING_MSG", "EVENT_LTE_CM_OUTGOING_MSG"],
+	"Connected": ["EVENT_LTE_ML1_PHR_REPORT", "EVENT_LTE_TIMING_ADVANCE", "EVENT_LTE_BSR_SR_REQUEST", \
+			"EVENT_LTE_RRC_SECURITY_CONFIG", "EVENT_LTE_RRC_UL_MSG", "EVENT_LTE_RRC_DL_MSG", "EVENT_LTE_EMM_INCOMING_MSG", \
+			"EVENT_LTE_EMM_OTA_OUTGOING_MSG", "EVENT_LTE_ESM_OUTGOING_MSG", "EVENT_LTE_REG_INCOMING_MSG", \
+			"EVENT_LTE_REG_OUTGOING_MSG", "EVENT_LTE_MAC_RESET"],
+	"Closing": ["EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_MAC_TIMER", "EVENT_LTE_RRC_TIMER_STATUS", \
+			"EVENT_LTE_RRC_DL_MSG"],
+	"Idle Not Camped": ["EVENT_LTE_RRC_STATE_CHANGE_TRIGGER", "EVENT_LTE_EMM_TIMER_EXPIRY", "EVENT_LTE_RRC_NEW_CELL_IND"],
+}
+
+LTE_CYCLE = ["Idle Camped", "Connecting", "Connected", "Closing", "Idle Not Camped"]
+
+WCDMA_CYCLE = [("CELL_PCH", "CELL_FACH"), ("CELL_FACH", "CELL_DCH"), ("CELL_DCH", "CELL_FACH"), ("CELL_FACH", "CELL_PCH")]
+WCDMA_MESSAGES = ["RADIO_BEARER_RECONFIGURATION_MSG", "CELL_UPDATE_MSG", "MEASUREMENT_REPORT_MSG", "RRC_CONNECTION_RELEASE_MSG"]
+
+def event_header(clock, name):
+	return "%s  [00]  0x1FFB  Event  --  %s" % (clock.header_time(), name)
+
+def signal_table(clock):
+	return ["%s  [00]  0xB193  LTE ML1 Serving Cell Meas Response" % clock.header_time(), \
+		"|  # | RSSI | RSRP | RSRQ | a | b | c | d | e | f|", \
+		"|   0|  %.2f|  %.2f|  %.2f|  1|  2|  %.2f|  3|  4|  5|" % (-60 - random.random() * 20, \
+			-90 - random.random() * 20, -10 - random.random() * 5, -8 - random.random() * 4)]
+
+def event_lines(clock, name, payload=None):
+	lines = [event_header(clock, name)]
+	if payload != None:
+		lines.append("Payload String = " + payload)
+	return lines
+
+def lte_cycle(clock):
+	'''Lines of one trip around the LTE states, as lists of lines per event'''
+	for state in LTE_CYCLE:
+		yield event_lines(clock, "EVENT_LTE_RRC_STATE_CHANGE", "RRC State = " + state)
+		clock.advance(1, 40)
+		for i in xrange(random.randint(1, 8)):
+			name = random.choice(STATE_EVENTS[state])
+			yield event_lines(clock, name, PAYLOADS[name]())
+			clock.advance(1, 40)
+			if random.random() < 0.1:
+				yield signal_table(clock)
+				clock.advance(1, 10)
+		if state == "Connected" or state == "Idle Not Camped":
+			clock.advance(100, 3000)
+
+def wcdma_cycle(clock):
+	for before, after in WCDMA_CYCLE:
+		yield event_lines(clock, "EVENT_WCDMA_RRC_STATE", "Previous state: %s, New state: %s" % (before, after))
+		clock.advance(1, 40)
+		yield event_lines(clock, "EVENT_RRC_MESSAGE_RECEIVED", "Channel DL_DCCH Message " + random.choice(WCDMA_MESSAGES))
+		clock.advance(1, 40)
+		if random.random() < 0.5:
+			yield event_lines(clock, "EVENT_WCDMA_RLC_CONFIG")
+			clock.advance(1, 40)
+		yield event_lines(clock, "EVENT_RRC_MESSAGE_SENT", "Channel UL_DCCH Message " + random.choice(WCDMA_MESSAGES))
+		clock.advance(50, 500)
+
+def qxdm_lines(n, seed=1, wcdma=0.1):
+	'''Lines (without newlines) of a QXDM event log with about n events.
+	wcdma is the share of cycles spent in WCDMA.'''
+	random.seed(seed)
+	clock = Clock(start_ms())
+	yield "% synthetic QXDM event log"
+	events = 0
+	while events < n:
+		if random.random() < wcdma:
+			cycle = wcdma_cycle(clock)
+		else:
+			cycle = lte_cycle(clock)
+		for lines in cycle:
+			# the parser counts the measurement tables as events too
+			events += 1
+			for line in lines:
+				yield line
+
+def tshark_lines(n, seed=1, target_ip=process_any.TARGET_IP):
+	'''Lines of tshark -V text for n packets, a quarter of them not our
+	probes'''
+	random.seed(seed)
+	clock = Clock(start_ms())
+	for i in xrange(n):
+		clock.advance(1, 400)
+		size = random.randint(60, 1500)
+		peer = "10.0.%d.%d" % (random.randint(0, 3), random.randint(1, 254))
+		src, dst = (target_ip, peer) if random.random() < 0.5 else (peer, target_ip)
+		port = "50000" if random.random() < 0.75 else "443"
+		yield "Frame %d: %d bytes on wire (%d bits), %d bytes captured (%d bits)" % (i + 1, size, size * 8, size, size * 8)
+		yield "    Encapsulation type: Ethernet (1)"
+		yield "    Arrival Time: " + clock.arrival_time()
+		yield "    Frame Number: %d" % (i + 1)
+		yield "Ethernet II, Src: 00:11:22:33:44:55, Dst: 66:77:88:99:aa:bb"
+		yield "Internet Protocol Version 4, Src: %s (%s), Dst: %s (%s)" % (src, src, dst, dst)
+		yield "    Time to live: 64"
+		yield "User Datagram Protocol, Src Port: %s (%s), Dst Port: 40000 (40000)" % (port, port)
+		yield "Data (%d bytes)" % (size - 42)
+
+def fields_lines(n, seed=1, target_ip=process_any.TARGET_IP):
+	'''The packets of tshark_lines as tshark -T fields output'''
+	for line in tshark_lines(n, seed, target_ip):
+		if line.startswith("Frame "):
+			size = line.split()[2]
+		elif line.startswith("    Arrival Time: "):
+			arrival = timestamps.arrival_time(line)
+		elif line.startswith("Internet Protocol"):
+			fields = line.split()
+			src, dst = fields[5], fields[8]
+		elif line.startswith("User Datagram Protocol"):
+			port = line.split()[5]
+			yield "\t".join((size, "%d.%03d000000" % (arrival // 1000, arrival % 1000), src, dst, port, "40000"))
+
+def write_lines(lines, out):
+	for line in lines:
+		out.write(line)
+		out.write("\n")
+
+if __name__ == "__main__":
+	generators = {"events": qxdm_lines, "packets": tshark_lines, "fields": fields_lines}
+	if len(sys.argv) < 3 or sys.argv[1] not in generators:
+		print "usage:", sys.argv[0], "|".join(sorted(generators.keys())), "n [seed]"
+		sys.exit(1)
+	seed = 1
+	if len(sys.argv) > 3:
+		seed = int(sys.argv[3])
+	write_lines(generators[sys.argv[1]](int(sys.argv[2]), seed), sys.stdout)
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+# Timestamps of QXDM header lines and tshark Arrival Time lines, as epoch
+# milliseconds in local time.  Times carry the date, so logs that run past
+# midnight keep going up.
+#
+# A QXDM header looks like
+#	2013 Jun 12  18:51:02.371  [00]  0x1FFB  Event  --  EVENT_...
+# and is read by fixed offsets, falling back to a regex when the day or
+# hour is not two digits wide.  mktime is called once per hour of log.
+
+import re, time
+
+MONTHS = dict((name, i + 1) for i, name in enumerate(
+	["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]))
+
+HEADER = re.compile(r"(\d{4}) ([A-Z][a-z]{2}) +(\d{1,2}) +(\d{1,2}):(\d{1,2}):(\d{1,2})[.](\d+)")
+ARRIVAL = re.compile(r"([A-Z][a-z]{2}) +(\d{1,2}), (\d{4}) +(\d{1,2}):(\d{1,2}):(\d{1,2})[.](\d+)")
+
+# epoch milliseconds of the start of an hour, by (year, month, day, hour)
+hours = {}
+# and of a minute, by the header text up to it
+minutes = {}
+
+def epoch_ms(year, month, day, hour, minute, second, millis):
+	key = (year, month, day, hour)
+	base = hours.get(key)
+	if base == None:
+		base = int(time.mktime((year, month, day, hour, 0, 0, 0, 0, -1))) * 1000
+		hours[key] = base
+	return base + minute * 60000 + second * 1000 + millis
+
+def fraction_ms(digits):
+	'''Milliseconds in the digits after a decimal point, however many
+	there are'''
+	if len(digits) == 3:
+		return int(digits)
+	return int((digits + "00")[:3])
+
+def is_header(line):
+	'''Whether line starts a QXDM event: a year, then a month name'''
+	return len(line) > 8 and line[:4].isdigit() and line[4] == " " and line[5:8] in MONTHS
+
+def header_time(line):
+	'''Epoch milliseconds of a QXDM header line, or None if it has no time'''
+	# "2013 Jun 12  18:51:02.371": everything up to the seconds repeats
+	# for a minute at a time
+	base = minutes.get(line[:19])
+	if base != None and line[21:22] == "." and line[25:26] in (" ", ""):
+		return base + int(line[19:21]) * 1000 + int(line[22:25])
+	if line[11:13] == "  " and line[15:16] == ":" and line[18:19] == ":" and line[21:22] == "." and \
+			line[9:11].isdigit() and line[13:15].isdigit() and line[16:18].isdigit() and line[5:8] in MONTHS:
+		base = epoch_ms(int(line[:4]), MONTHS[line[5:8]], int(line[9:11]), int(line[13:15]), int(line[16:18]), 0, 0)
+		minutes[line[:19]] = base
+		end = line.find(" ", 22)
+		if end < 0:
+			end = len(line)
+		return base + int(line[19:21]) * 1000 + fraction_ms(line[22:end])
+	match = HEADER.match(line)
+	if match == None or match.group(2) not in MONTHS:
+		return None
+	return epoch_ms(int(match.group(1)), MONTHS[match.group(2)], int(match.group(3)), \
+			int(match.group(4)), int(match.group(5)), int(match.group(6)), fraction_ms(match.group(7)))
+
+def arrival_time(line):
+	'''Epoch milliseconds of a tshark "Arrival Time: Jun 12, 2013
+	18:51:00.230123000 EDT" line, or None.  The capture is taken to be in
+	local time, as the QXDM log is.'''
+	match = ARRIVAL.search(line)
+	if match == None or match.group(1) not in MONTHS:
+		return None
+	return epoch_ms(int(match.group(3)), MONTHS[match.group(1)], int(match.group(2)), \
+			int(match.group(4)), int(match.group(5)), int(match.group(6)), fraction_ms(match.group(7)))
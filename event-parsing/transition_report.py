@@ -0,0 +1,359 @@
+#!/usr/bin/python
+
+# The per-transition report.  A TransitionSummary collects what we know
+# about one kind of transition as the transitions close, without keeping
+# them, and turns it into a plain dict; ReportWriter renders those as the
+# text process_any has always printed, as JSON or as CSV, into one buffer
+# that is written out at the end.
+
+import json, csv, cStringIO
+from collections import Counter
+import robustnetLib
+
+FORMATS = ("text", "json", "csv")
+
+CSV_COLUMNS = ("transition", "count", "average", "stdev", "min_ish", "min", "event", \
+		"begin_time_from_start", "begin_frequency", "begin_duplicates", "begin_min_appearances", "tests", \
+		"all_frequency", "all_duplicates", \
+		"end_time_from_end", "end_frequency", "end_duplicates", "end_min_appearances", \
+		"RSSI", "power_ratio")
+
+def attribute_value(v):
+	'''An attribute value as mergeDict stores it: a number if it is one'''
+	try:
+		return int(v)
+	except:
+		return v
+
+class AttributeSummary:
+	'''The values one attribute of an event took.  Numbers get a mean and
+	stdev, anything else its most common values.'''
+	def __init__(self):
+		self.n = 0
+		# whether the first value is an int and all of them are numbers
+		self.first_int = False
+		self.numeric = True
+		self.stats = robustnetLib.RunningStats()
+		self.counts = Counter()
+
+	def add(self, v):
+		if self.n == 0:
+			self.first_int = isinstance(v, int)
+		self.n += 1
+		if self.numeric and isinstance(v, (int, long, float)):
+			self.stats.add(v)
+		else:
+			self.numeric = False
+		self.counts[v] += 1
+
+	def merge(self, other):
+		if other.n == 0:
+			return
+		if self.n == 0:
+			self.first_int = other.first_int
+		self.n += other.n
+		self.numeric = self.numeric and other.numeric
+		self.stats.merge(other.stats)
+		self.counts.update(other.counts)
+
+	def result(self, name):
+		if self.first_int and self.numeric:
+			return {"name": name, "average": self.stats.meanValue(), "stdev": self.stats.stdev()}
+		# ties go to the smaller value, however the counts were put together
+		most_common = sorted(self.counts.iteritems(), key=lambda (v, n): (-n, v))[:3]
+		return {"name": name, "most_common": most_common}
+
+def summarize_attributes(attributes):
+	'''[{"name", "average", "stdev"} for numbers or {"name", "most_common"}
+	for the rest] for one event's AttributeSummaries, by name'''
+	return [attributes[k].result(k) for k in sorted(attributes)]
+
+class Appearances:
+	'''How often an event appeared at the begin (or end, or all through) of
+	the transitions of a kind, and the attributes it had there'''
+	def __init__(self):
+		# transitions it was in, and how many of those with a duplicate
+		self.n = 0
+		self.there = 0
+		self.duplicates = 0
+		self.min = None
+		# time from the start (or to the end) of the transitions it was in
+		self.time = robustnetLib.RunningStats()
+		self.attributes = {}
+
+	def add(self, duplicates, time=None):
+		self.n += 1
+		if duplicates >= 1:
+			self.there += 1
+		self.duplicates += duplicates
+		if self.min == None or duplicates < self.min:
+			self.min = duplicates
+		self.time.add(time)
+
+	def add_attributes(self, attributes, are_lists=False):
+		for k, v in attributes.iteritems():
+			if k not in self.attributes:
+				self.attributes[k] = AttributeSummary()
+			if are_lists:
+				for x in v:
+					self.attributes[k].add(x)
+			else:
+				self.attributes[k].add(attribute_value(v))
+
+	def merge(self, other):
+		self.n += other.n
+		self.there += other.there
+		self.duplicates += other.duplicates
+		if self.min == None or (other.min != None and other.min < self.min):
+			self.min = other.min
+		self.time.merge(other.time)
+		for k, v in other.attributes.iteritems():
+			if k not in self.attributes:
+				self.attributes[k] = AttributeSummary()
+			self.attributes[k].merge(v)
+
+	# the transitions it was not in count as 0 duplicates
+
+	def frequency(self, count):
+		return float(self.there)/count
+
+	def mean_duplicates(self, count):
+		return self.duplicates*1.0/count
+
+	def min_appearances(self, count):
+		if self.n < count:
+			return 0
+		return self.min
+
+class TransitionSummary:
+	'''Aggregates over the Transitions of one kind, added one at a time;
+	it keeps no list of them.  Summaries of the same kind (say from
+	different files) merge into the one for all of them.'''
+	def __init__(self, name):
+		self.name = name
+		self.count = 0
+		self.intervals = robustnetLib.StreamSummary()
+		# event: Appearances at the begin, all through and at the end
+		self.begin = {}
+		self.all = {}
+		self.end = {}
+		self.RSSI = None
+		self.power_ratio = None
+
+	def __event(self, part, k):
+		if k not in part:
+			part[k] = Appearances()
+		return part[k]
+
+	def add(self, item):
+		self.count += 1
+		for k, v in item.duplicates_first.iteritems():
+			self.__event(self.begin, k).add(v, item.time_to_reach_first[k])
+		for k, v in item.duplicates_last.iteritems():
+			self.__event(self.end, k).add(v, item.time_to_reach_last[k])
+		for k, v in item.duplicates_all.iteritems():
+			self.__event(self.all, k).add(v)
+		for k, v in item.attributes_first.iteritems():
+			self.__event(self.begin, k).add_attributes(v)
+		for k, v in item.attributes_last.iteritems():
+			self.__event(self.end, k).add_attributes(v)
+		for k, v in item.attributes_all.iteritems():
+			self.__event(self.all, k).add_attributes(v, True)
+		if item.end_time != 0:
+			self.intervals.add(item.end_time - item.begin_time)
+		# of the last transition
+		self.RSSI = item.RSSI
+		self.power_ratio = item.power_ratio
+
+	def extend(self, l):
+		for item in l:
+			self.add(item)
+
+	def merge(self, other):
+		'''Add the transitions of other, which came after these'''
+		if other.count == 0:
+			return
+		self.count += other.count
+		self.intervals.merge(other.intervals)
+		for part, other_part in ((self.begin, other.begin), (self.all, other.all), (self.end, other.end)):
+			for k, v in other_part.iteritems():
+				self.__event(part, k).merge(v)
+		self.RSSI = other.RSSI
+		self.power_ratio = other.power_ratio
+
+	def result(self, distinct_events):
+		'''The summary as a plain dict.  Events are listed in the order of a
+		dict built from distinct_events, as the text report always has.'''
+		order = {}
+		for v in distinct_events:
+			order[v] = None
+		empty = Appearances()
+		count = self.count
+		events = []
+		for k in order.keys():
+			# only the events some transition saw
+			if k not in self.all:
+				continue
+			begin = self.begin.get(k, empty)
+			all = self.all[k]
+			end = self.end.get(k, empty)
+			if begin.there == 0 and end.there == 0:
+				continue
+			events.append({
+				"event": k,
+				"begin": {
+					"time_from_start": begin.time.meanValue(),
+					"frequency": begin.frequency(count),
+					"duplicates": begin.mean_duplicates(count),
+					"min_appearances": begin.min_appearances(count),
+					"tests": count,
+					"attributes": summarize_attributes(begin.attributes),
+				},
+				"all": {
+					"frequency": all.frequency(count),
+					"duplicates": all.mean_duplicates(count),
+					"tests": count,
+					"attributes": summarize_attributes(all.attributes),
+				},
+				"end": {
+					"time_from_end": end.time.meanValue(),
+					"frequency": end.frequency(count),
+					"duplicates": end.mean_duplicates(count),
+					"min_appearances": end.min_appearances(count),
+					"attributes": summarize_attributes(end.attributes),
+				},
+			})
+
+		intervals = self.intervals
+		return {
+			"transition": self.name,
+			"count": self.count,
+			"average": intervals.meanValue(),
+			"stdev": intervals.stdevValue(),
+			"min_ish": intervals.quartileResult()[0],
+			"min": intervals.digest.min,
+			"RSSI": self.RSSI,
+			"power_ratio": self.power_ratio,
+			"events": events,
+		}
+
+def summarize(l, name, distinct_events):
+	'''Aggregates over the Transitions l, all of kind name, as a plain dict
+	(see TransitionSummary.result)'''
+	summary = TransitionSummary(name)
+	summary.extend(l)
+	return summary.result(distinct_events)
+
+def intervals(l):
+	'''How long each of the Transitions l took, where it ended'''
+	return [item.end_time - item.begin_time for item in l if item.end_time != 0]
+
+class TextBuffer:
+	'''Collects text the way a run of print statements would write it,
+	spaces between items and all'''
+	def __init__(self):
+		self.parts = []
+		self.softspace = False
+
+	def items(self, *items):
+		'''Like print items, (with the trailing comma)'''
+		for x in items:
+			if self.softspace:
+				self.parts.append(" ")
+			s = str(x)
+			self.parts.append(s)
+			# print leaves out the next space after a tab or newline
+			self.softspace = not isinstance(x, str) or len(s) == 0 or \
+					not s[-1].isspace() or s[-1] == " "
+
+	def line(self, *items):
+		self.items(*items)
+		self.parts.append("\n")
+		self.softspace = False
+
+	def getvalue(self):
+		return "".join(self.parts)
+
+def render_attributes(out, attributes):
+	if len(attributes) > 0:
+		out.line("\t\t   ATTRIBUTES:")
+	for attribute in attributes:
+		out.items("\t\t\t", attribute["name"], "|")
+		if "average" in attribute:
+			out.line("average:", attribute["average"], "stdev:", attribute["stdev"])
+			continue
+		for value, count in attribute["most_common"]:
+			out.items(value, ":", count, "|")
+		out.line()
+
+def render_text(out, summary):
+	out.line(summary["transition"])
+	out.line("average:", summary["average"], "stdev:", summary["stdev"])
+	out.line("min-ish:", summary["min_ish"])
+	out.line("min:", summary["min"])
+	for event in summary["events"]:
+		begin, all, end = event["begin"], event["all"], event["end"]
+		out.line("\t", event["event"])
+		out.items("\t\tBEGIN: ")
+		out.items("time from start:", begin["time_from_start"])
+		out.items("frequency appears: ", begin["frequency"])
+		out.items("duplicates:", begin["duplicates"])
+		out.items("min appearances:", begin["min_appearances"])
+		out.line("number of tests:", begin["tests"])
+		render_attributes(out, begin["attributes"])
+		out.items("\t\tALL: ")
+		out.items("frequency appears:", all["frequency"])
+		out.items("duplicates:", all["duplicates"])
+		out.line("number of tests:", all["tests"])
+		render_attributes(out, all["attributes"])
+		out.items("\t\tEND: ")
+		out.items("time from end:", end["time_from_end"])
+		out.items("frequency appears:", end["frequency"])
+		out.items("duplicates:", end["duplicates"])
+		out.line("min appearances:", end["min_appearances"])
+		out.line("RSSI and power ratio:", summary["RSSI"], summary["power_ratio"])
+		render_attributes(out, end["attributes"])
+
+def csv_rows(summary):
+	for event in summary["events"]:
+		begin, all, end = event["begin"], event["all"], event["end"]
+		yield (summary["transition"], summary["count"], summary["average"], summary["stdev"], \
+				summary["min_ish"], summary["min"], event["event"], \
+				begin["time_from_start"], begin["frequency"], begin["duplicates"], begin["min_appearances"], \
+				begin["tests"], all["frequency"], all["duplicates"], \
+				end["time_from_end"], end["frequency"], end["duplicates"], end["min_appearances"], \
+				summary["RSSI"], summary["power_ratio"])
+
+class ReportWriter:
+	'''Renders summaries into one buffer and writes it to out on close.
+	CSV has a row per event of each transition and leaves out the
+	attributes; JSON is a list of the summaries.'''
+	def __init__(self, out, format="text"):
+		if format not in FORMATS:
+			raise ValueError("unknown report format " + format)
+		self.out = out
+		self.format = format
+		self.text = TextBuffer()
+		self.summaries = []
+		self.buffer = cStringIO.StringIO()
+		self.csv = csv.writer(self.buffer)
+		if format == "csv":
+			self.csv.writerow(CSV_COLUMNS)
+
+	def add(self, summary):
+		if self.format == "text":
+			render_text(self.text, summary)
+		elif self.format == "csv":
+			self.csv.writerows(csv_rows(summary))
+		else:
+			self.summaries.append(summary)
+
+	def close(self):
+		if self.format == "text":
+			self.out.write(self.text.getvalue())
+		elif self.format == "csv":
+			self.out.write(self.buffer.getvalue())
+		else:
+			json.dump(self.summaries, self.out, indent=1)
+			self.out.write("\n")
+		self.out.flush()
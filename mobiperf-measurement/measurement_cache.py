@@ -0,0 +1,169 @@
+#/usr/bin/python
+
+import os, hashlib, cPickle, numpy
+
+"""
+On-disk cache of parsed Mobiperf data folders, so that a rerun after a new
+dump only has to parse the folders that are new or changed.
+
+Each data folder gets one entry: a pickled header (cache key, names and the
+layout of the columns) followed by the raw bytes of every column of its
+MeasurementTable, which are memory-mapped back rather than read.  Entries
+are keyed by the folder's real path and the size and mtime of its
+Measurement file.  Past max_bytes the least recently used entries are
+removed, and so are entries of folders that are gone or that were saved
+under another path of the same folder.
+"""
+
+# bump when the parser or the entry layout changes what a cached folder means
+FORMAT = 1
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rrc-analysis", "measurements")
+
+def cache_key(folder):
+    """Return what an entry for folder must have been saved with to be used."""
+    st = os.stat(folder + "/Measurement")
+    return (os.path.realpath(folder), st.st_size, st.st_mtime)
+
+def entry_folder(entry):
+    """Return the folder an entry was saved for, or None if it is unreadable."""
+    try:
+        f = open(entry, "rb")
+        try:
+            return cPickle.load(f)["key"][0]
+        finally:
+            f.close()
+    except (IOError, EOFError, KeyError, TypeError, ValueError, cPickle.UnpicklingError):
+        return None
+
+class MeasurementCache:
+    """A directory of cached MeasurementTables, one for each data folder."""
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # a run that only loads entries still drops the stale ones
+        self.evict()
+
+    def entry(self, folder):
+        name = hashlib.sha1(os.path.realpath(folder)).hexdigest()
+        return os.path.join(self.directory, name + ".measurements")
+
+    def load(self, folder, table):
+        """Fill table from the entry for folder, if it has a current one.
+
+        The columns are memory-mapped from the entry, so only what is used
+        of them is read.
+
+        Args:
+            folder: the data folder.
+            table: an empty MeasurementTable.
+
+        Returns:
+            Whether there was a current entry.
+        """
+        entry = self.entry(folder)
+        if not os.path.isfile(entry):
+            return False
+        f = open(entry, "rb")
+        try:
+            header = cPickle.load(f)
+            if header["format"] != FORMAT or header["key"] != cache_key(folder):
+                raise KeyError("out of date")
+            offset = f.tell()
+            size = os.fstat(f.fileno()).st_size
+            columns = {}
+            for name, dtype, shape in header["columns"]:
+                dtype = numpy.dtype(dtype)
+                nbytes = dtype.itemsize * int(numpy.prod(shape))
+                if offset + nbytes > size:
+                    raise EOFError("entry cut short")
+                if nbytes == 0:
+                    # an empty file region cannot be mapped
+                    columns[name] = numpy.zeros(shape, dtype)
+                else:
+                    columns[name] = numpy.memmap(entry, dtype, "r", offset, shape)
+                offset += nbytes
+        except (EOFError, KeyError, ValueError, cPickle.UnpicklingError):
+            # out of date, cut short or from an incompatible version
+            f.close()
+            os.remove(entry)
+            return False
+        f.close()
+        # mark as recently used, unless another process evicted it meanwhile
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        table.restore(header["rows"], header["names"], columns)
+        return True
+
+    def save(self, folder, table):
+        """Save table as the entry for folder."""
+        table.flush()
+        columns = [(name, numpy.ascontiguousarray(column)) \
+                for name, column in sorted(table.columns.iteritems())]
+        header = {
+            "format": FORMAT,
+            "key": cache_key(folder),
+            "rows": len(table),
+            "names": table.names,
+            "columns": [(name, column.dtype.str, column.shape) for name, column in columns],
+        }
+        entry = self.entry(folder)
+        tmp = entry + ".tmp%d" % os.getpid()
+        f = open(tmp, "wb")
+        cPickle.dump(header, f, 2)
+        for name, column in columns:
+            column.tofile(f)
+        f.close()
+        # readers never see a half-written entry
+        os.rename(tmp, entry)
+        self.evict(entry)
+
+    def evict(self, keep=None):
+        """Remove stale entries, then least recently used ones other than
+        keep until the cache fits max_bytes.
+
+        An entry is stale when its folder has no Measurement file any more
+        or when it is not the entry its folder is saved as now, so that a
+        folder moved or reached through another path does not leave its
+        old entry behind.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".measurements"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if path != keep:
+                    folder = entry_folder(path)
+                    if folder == None or not os.path.isfile(folder + "/Measurement") \
+                            or self.entry(folder) != path:
+                        os.remove(path)
+                        continue
+                st = os.stat(path)
+            except OSError:
+                # removed meanwhile by another process sharing the cache
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".measurements"):
+                os.remove(os.path.join(self.directory, name))
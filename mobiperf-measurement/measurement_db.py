@@ -0,0 +1,330 @@
+#/usr/bin/python
+
+import sys, os, re, glob, math, time, sqlite3, argparse, numpy
+import parse_mobiperf_measurements
+
+"""
+Keeps the rrc measurements of the Mobiperf data in a SQLite database, so
+that a slice of them (some carriers and models, a range of Android
+releases and dates, an area) can be looked at without parsing the data
+set again.
+
+To use:
+    python measurement_db.py ingest measurements.db
+    python measurement_db.py query measurements.db --carrier "AT&T" \\
+        --model "Nexus 4" --min-os 4.2 --days 30 --near 42.28,-83.74,10 --graphs
+
+ingest adds the data folders in data/S-* (or those given), skipping the
+ones already in the database and unchanged since.  query prints how many
+measurements match, and with --graphs makes the graphs of them the way
+parse_mobiperf_measurements.py does.  From Python, MeasurementDB.query
+returns the matching measurements as a MeasurementTable.
+"""
+
+# bump when the layout of the database changes; a database in another
+# layout is emptied and has to be ingested again
+FORMAT = 2
+
+# size of the squares of latitude and longitude the measurements are
+# indexed by, in degrees (0.1 is about 11 km)
+CELL_DEGREES = 0.1
+
+KM_PER_DEGREE = 111.2
+
+# how the results of each measurement are stored; as wide as the int64
+# parse_results gives, so no value is cut short on the way in
+RESULT_DTYPE = numpy.dtype("<i8")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    folder_id INTEGER,
+    timestamp INTEGER,
+    carrier TEXT,
+    manufacturer TEXT,
+    model TEXT,
+    os_version TEXT,
+    os_release INTEGER,
+    latitude REAL,
+    longitude REAL,
+    cell_lat INTEGER,
+    cell_lon INTEGER,
+    tcp BLOB,
+    dns BLOB,
+    http BLOB
+);
+CREATE INDEX IF NOT EXISTS measurements_folder ON measurements (folder_id);
+CREATE INDEX IF NOT EXISTS measurements_carrier ON measurements (carrier);
+CREATE INDEX IF NOT EXISTS measurements_model ON measurements (model);
+CREATE INDEX IF NOT EXISTS measurements_os_version ON measurements (os_version);
+CREATE INDEX IF NOT EXISTS measurements_os_release ON measurements (os_release);
+CREATE INDEX IF NOT EXISTS measurements_timestamp ON measurements (timestamp);
+CREATE INDEX IF NOT EXISTS measurements_cell ON measurements (cell_lat, cell_lon);
+"""
+
+RELEASE = re.compile(r"RELEASE:(\d+(?:\.\d+)*)")
+VERSION = re.compile(r"\d+(?:\.\d+)+")
+
+def release_number(release):
+    """Convert an Android release such as '4.2' or '4.1.2' to a number that
+    sorts like it: 40200, 40102.
+    """
+    parts = [int(x) for x in release.split(".")[:3]]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 10000 + parts[1] * 100 + parts[2]
+
+def os_release(os_version):
+    """Return the release_number of the Android release in an os_version
+    string, or None if there is none.
+
+    Args:
+        os_version: the os_version of the device_properties, such as
+            'INCREMENTAL:eng.xx,RELEASE:4.2.2,SDK:17' or 'INCREMENTAL:4.1.2'.
+    """
+    match = RELEASE.search(os_version)
+    if match != None:
+        return release_number(match.group(1))
+    match = VERSION.search(os_version)
+    if match != None:
+        return release_number(match.group(0))
+    return None
+
+def cell(degrees):
+    """Return the index of the CELL_DEGREES square a latitude or longitude
+    is in."""
+    return int(math.floor(degrees / CELL_DEGREES))
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great circle distance between two points, in km."""
+    lat1, lon1, lat2, lon2 = [math.radians(x) for x in (lat1, lon1, lat2, lon2)]
+    a = math.sin((lat2 - lat1) / 2) ** 2 \
+            + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * math.degrees(math.asin(min(1.0, math.sqrt(a)))) * KM_PER_DEGREE
+
+class MeasurementDB:
+    """A SQLite database of rrc measurements."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != FORMAT:
+            self.db.execute("DROP TABLE IF EXISTS folders")
+            self.db.execute("DROP TABLE IF EXISTS measurements")
+            self.db.execute("PRAGMA user_version = %d" % FORMAT)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, folder):
+        """Add the measurements of a data folder, unless they are there
+        already.  Those of an earlier copy of the folder are replaced.
+
+        Returns:
+            The number of measurements added, or None if the folder was
+            there already.
+        """
+        st = os.stat(folder + "/Measurement")
+        name = os.path.abspath(folder)
+        row = self.db.execute("SELECT id, size, mtime FROM folders WHERE folder = ?", (name,)).fetchone()
+        if row != None and row[1:] == (st.st_size, st.st_mtime):
+            return None
+        with self.db:
+            if row == None:
+                folder_id = self.db.execute("INSERT INTO folders (folder) VALUES (?)", (name,)).lastrowid
+            else:
+                folder_id = row[0]
+                self.db.execute("DELETE FROM measurements WHERE folder_id = ?", (folder_id,))
+            count = 0
+            f = open(folder + "/Measurement")
+            try:
+                items = []
+                for item in parse_mobiperf_measurements.read_measurements(f):
+                    items.append(item)
+                    if len(items) == parse_mobiperf_measurements.CHUNK_ROWS:
+                        count += self.__insert(folder_id, items)
+                        items = []
+                count += self.__insert(folder_id, items)
+            finally:
+                f.close()
+            # only now, so that a folder cut short is ingested again
+            self.db.execute("UPDATE folders SET size = ?, mtime = ? WHERE id = ?", \
+                    (st.st_size, st.st_mtime, folder_id))
+        return count
+
+    def __insert(self, folder_id, items):
+        if not items:
+            return 0
+        results = {}
+        for datatype in parse_mobiperf_measurements.DATATYPES:
+            results[datatype] = parse_mobiperf_measurements.parse_results( \
+                    [item["values"][datatype] for item in items]).astype(RESULT_DTYPE)
+        rows = []
+        for i, item in enumerate(items):
+            properties = item["device_properties"]
+            device_info = properties["device_info"]
+            location = properties.get("location") or {}
+            latitude = location.get("latitude")
+            longitude = location.get("longitude")
+            (cell_lat, cell_lon) = (None, None)
+            if latitude != None and longitude != None:
+                (cell_lat, cell_lon) = (cell(latitude), cell(longitude))
+            rows.append((folder_id, item["timestamp"], properties["carrier"], \
+                    device_info["manufacturer"], device_info["model"], \
+                    properties["os_version"], os_release(properties["os_version"]), \
+                    latitude, longitude, cell_lat, cell_lon, \
+                    buffer(results["tcp"][i].tostring()), buffer(results["dns"][i].tostring()), \
+                    buffer(results["http"][i].tostring())))
+        self.db.executemany("INSERT INTO measurements (folder_id, timestamp, carrier, " \
+                + "manufacturer, model, os_version, os_release, latitude, longitude, " \
+                + "cell_lat, cell_lon, tcp, dns, http) " \
+                + "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def analyze(self):
+        """Update the statistics SQLite picks an index with; run after
+        ingesting."""
+        self.db.execute("ANALYZE")
+
+    def query(self, carriers=None, models=None, min_os=None, since=None, until=None, near=None):
+        """Return the measurements that match all of the filters given.
+
+        Only the rows the indexes point to are read, not the whole database.
+
+        Args:
+            carriers: a list of carriers, or None for any.
+            models: a list of models, or None for any.
+            min_os: the lowest Android release, such as '4.2', or None.
+            since: seconds since the epoch; only measurements from then on.
+            until: seconds since the epoch; only measurements before then.
+            near: (latitude, longitude, km): only measurements within km of
+                the point.
+
+        Returns:
+            A MeasurementTable of the measurements, in the order they were
+            ingested.  Its columns["tcp"], ["dns"] and ["http"] hold the
+            results.
+        """
+        where = []
+        args = []
+        for column, names in (("carrier", carriers), ("model", models)):
+            if names != None:
+                where.append(column + " IN (" + ", ".join(["?"] * len(names)) + ")")
+                args += list(names)
+        if min_os != None:
+            where.append("os_release >= ?")
+            args.append(release_number(min_os))
+        # timestamps are in microseconds
+        if since != None:
+            where.append("timestamp >= ?")
+            args.append(int(since * 1000000))
+        if until != None:
+            where.append("timestamp < ?")
+            args.append(int(until * 1000000))
+        if near != None:
+            (latitude, longitude, km) = near
+            # the cells of the square around the circle; the corners are
+            # left out below
+            lat_degrees = km / KM_PER_DEGREE
+            lon_degrees = lat_degrees / max(math.cos(math.radians(latitude)), 0.01)
+            where.append("cell_lat BETWEEN ? AND ? AND cell_lon BETWEEN ? AND ?")
+            args += [cell(latitude - lat_degrees), cell(latitude + lat_degrees), \
+                    cell(longitude - lon_degrees), cell(longitude + lon_degrees)]
+        sql = "SELECT carrier, manufacturer, model, os_version, latitude, longitude, " \
+                + "tcp, dns, http FROM measurements"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+
+        names = dict((column, []) for column in parse_mobiperf_measurements.CODED_COLUMNS)
+        codes = dict((column, {}) for column in parse_mobiperf_measurements.CODED_COLUMNS)
+        coded = dict((column, []) for column in parse_mobiperf_measurements.CODED_COLUMNS)
+        blobs = dict((datatype, []) for datatype in parse_mobiperf_measurements.DATATYPES)
+        for row in self.db.execute(sql, args):
+            if near != None and (row[4] == None or distance_km(row[4], row[5], latitude, longitude) > km):
+                continue
+            for column, name in zip(parse_mobiperf_measurements.CODED_COLUMNS, row[:4]):
+                if name not in codes[column]:
+                    codes[column][name] = len(names[column])
+                    names[column].append(name)
+                coded[column].append(codes[column][name])
+            for datatype, blob in zip(parse_mobiperf_measurements.DATATYPES, row[6:]):
+                blobs[datatype].append(str(blob))
+
+        columns = {}
+        for column in parse_mobiperf_measurements.CODED_COLUMNS:
+            columns[column] = numpy.array(coded[column], numpy.int32)
+        for datatype in parse_mobiperf_measurements.DATATYPES:
+            columns[datatype] = numpy.frombuffer("".join(blobs[datatype]), RESULT_DTYPE) \
+                    .reshape(-1, parse_mobiperf_measurements.NUM_MEASUREMENTS).astype(numpy.int64)
+        table = parse_mobiperf_measurements.MeasurementTable()
+        table.restore(len(columns["carrier"]), names, columns)
+        return table
+
+def parse_date(date):
+    """Seconds since the epoch of a YYYY-MM-DD date, in local time."""
+    return time.mktime(time.strptime(date, "%Y-%m-%d"))
+
+def parse_near(near):
+    """(latitude, longitude, km) from 'LAT,LON,KM'."""
+    values = [float(x) for x in near.split(",")]
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError("expected LAT,LON,KM")
+    return tuple(values)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="A SQLite database of the rrc tests in the Mobiperf data.")
+    commands = parser.add_subparsers(dest="command")
+    ingest = commands.add_parser("ingest", help="add data folders to the database")
+    ingest.add_argument("db")
+    ingest.add_argument("folders", nargs="*", help="data folders (default data/S-*)")
+    query = commands.add_parser("query", help="count or graph the measurements that match")
+    query.add_argument("db")
+    query.add_argument("--carrier", action="append", help="may be given more than once")
+    query.add_argument("--model", action="append", help="may be given more than once")
+    query.add_argument("--min-os", metavar="RELEASE", help="lowest Android release, such as 4.2")
+    query.add_argument("--since", type=parse_date, metavar="YYYY-MM-DD")
+    query.add_argument("--until", type=parse_date, metavar="YYYY-MM-DD")
+    query.add_argument("--days", type=float, help="only the last DAYS days")
+    query.add_argument("--near", type=parse_near, metavar="LAT,LON,KM", \
+            help="only measurements within KM km of the point")
+    query.add_argument("--graphs", action="store_true", help="make graphs of them in graphs/")
+    args = parser.parse_args(argv[1:])
+
+    db = MeasurementDB(args.db)
+    try:
+        if args.command == "ingest":
+            for folder in args.folders or glob.glob("data/S-*"):
+                count = db.ingest(folder)
+                if count == None:
+                    print >>sys.stderr, "unchanged", folder
+                else:
+                    print >>sys.stderr, "ingested", folder, count
+            db.analyze()
+            return 0
+
+        since = args.since
+        if args.days != None:
+            days_ago = time.time() - args.days * 24 * 3600
+            if since == None or days_ago > since:
+                since = days_ago
+        table = db.query(args.carrier, args.model, args.min_os, since, args.until, args.near)
+    finally:
+        db.close()
+    print len(table), "measurements"
+    if len(table) == 0:
+        return 1
+    summary = table.summary()
+    summary.print_stats()
+    if args.graphs:
+        parse_mobiperf_measurements.make_graphs(summary)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,6 +1,7 @@
 #/usr/bin/python
 
-import json, glob, re, numpy
+import sys, json, glob, re, argparse, itertools, functools, multiprocessing, numpy
+import measurement_cache
 
 """
 Processes the data in gs://openmobiledata_public, in the Measurement database.
@@ -12,7 +13,10 @@ To use:
     2. Create a folder "data".
     3. Get the data from gs://openmobiledata_public, unzip it and put it in 
     the data folder.  Delete all zip files.
-    4. Run.
+    4. Run.  The data folders are parsed in parallel, on every core unless
+    told otherwise with -j.  With --cache, what was parsed is kept (see
+    measurement_cache.py), and later runs only parse the folders of new
+    dumps; --cache-size caps it, 1024 MB by default.
     5. Go to the folder "graphs" and run gnuplot on all .p files.
     6. Your plots are all in that folder now.
 
@@ -29,6 +33,11 @@ TODO:
 TIMES = [0, 2, 4, 8, 12, 16, 22]
 NUM_MEASUREMENTS = len(TIMES)
 GAP = 2
+DATATYPES = ("tcp", "dns", "http")
+# the columns of a MeasurementTable that hold names, as integer codes
+CODED_COLUMNS = ("carrier", "manufacturer", "model", "os_version")
+# how many measurements a MeasurementTable parses the results of at a time
+CHUNK_ROWS = 1 << 16
 
 def fix_filename(filename):
     """Given a string, replace all special characters by '_' and return it.
@@ -106,6 +115,116 @@ def list_to_boxplot(l):
     return str(minval) + " " + str(quartile1) + " " + str(median) + " " \
             + str(quartile3) + " " + str(maxval)
 
+def count_values(keys, values, counts=None):
+    """Count how often each (key, value) pair turns up.
+
+    Args:
+        keys: an integer array, such as a group number for each value.
+        values: an integer array of the same length.
+        counts: how many times each pair is there, or None for once each.
+
+    Returns:
+        A tuple of arrays (keys, values, counts) with each distinct pair
+        once, sorted by key and then value.
+    """
+    if len(keys) == 0:
+        if counts is None:
+            counts = numpy.zeros(0, numpy.int64)
+        return (keys, values, counts)
+    low = values.min()
+    span = int(values.max()) - int(low) + 1
+    if keys.min() >= 0 and (int(keys.max()) + 1) * span < 1 << 62:
+        # one number per pair, which sorts several times faster than the
+        # pairs do
+        pairs = keys.astype(numpy.int64) * span + (values - low)
+        if counts is None:
+            (pairs, counts) = numpy.unique(pairs, return_counts=True)
+        else:
+            order = numpy.argsort(pairs)
+            pairs = pairs[order]
+            new = numpy.ones(len(pairs), bool)
+            new[1:] = pairs[1:] != pairs[:-1]
+            starts = numpy.flatnonzero(new)
+            (pairs, counts) = (pairs[starts], numpy.add.reduceat(counts[order], starts))
+        return (pairs / span, pairs % span + low, counts)
+
+    if counts is None:
+        counts = numpy.ones(len(keys), numpy.int64)
+    order = numpy.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+    counts = counts[order]
+    new = numpy.ones(len(keys), bool)
+    new[1:] = (keys[1:] != keys[:-1]) | (values[1:] != values[:-1])
+    starts = numpy.flatnonzero(new)
+    return (keys[starts], values[starts], numpy.add.reduceat(counts, starts))
+
+def grouped_boxplots(keys, values, counts):
+    """Like list_to_boxplot, for every key of a count_values result at once.
+
+    Gives exactly what list_to_boxplot gives for the list of a key's values,
+    each repeated as often as it turned up, without making the lists: the
+    order statistics of all the keys are looked up together in the sorted
+    values.
+
+    Args:
+        keys, values, counts: arrays as returned by count_values.
+
+    Returns:
+        A dict of key: boxplot string, with the values min, 1st quartile,
+        median, 3rd quartile, max separated by spaces.
+    """
+    if len(keys) == 0:
+        return {}
+    new = numpy.ones(len(keys), bool)
+    new[1:] = keys[1:] != keys[:-1]
+    starts = numpy.flatnonzero(new)
+    stops = numpy.append(starts[1:], len(keys))
+    # ends[i] is the index just past the last copy of values[i], counting
+    # the values of all the keys
+    ends = numpy.cumsum(counts)
+    offsets = ends[starts] - counts[starts]
+    n = ends[stops - 1] - offsets
+
+    def nth(i):
+        # the i-th smallest value of each key; out of range for the cases
+        # of quartiles a key does not use, so kept within the key
+        i = numpy.minimum(numpy.maximum(i, 0), n - 1)
+        return values[numpy.searchsorted(ends, offsets + i, "right")].astype(numpy.float64)
+
+    def median(start, stop):
+        # what numpy.median gives for the sorted values from start to stop:
+        # the mean of the middle one, or of the middle two
+        return (nth((start + stop - 1) / 2) + nth((start + stop) / 2)) / 2
+
+    # the same cases as quartiles
+    half = n / 2
+    quarter = n / 4
+    cases = [n%2 == 0, n%4 == 1]
+    quartile1 = numpy.select(cases, [median(0, half), \
+            nth(quarter-1)*0.25 + nth(quarter) * 0.75], \
+            nth(quarter)*0.75 + nth(quarter+1) * 0.25)
+    quartile3 = numpy.select(cases, [median(half, n), \
+            nth(quarter*3)*0.75 + nth(quarter*3 + 1) * 0.25], \
+            nth(quarter*3+1)*0.25 + nth(quarter*3 + 2) * 0.75)
+    medians = median(0, n)
+
+    boxplots = {}
+    for j in range(len(starts)):
+        minval = values[starts[j]]
+        maxval = values[stops[j] - 1]
+        # quartiles gives a value of the list, a numpy.median or a float,
+        # and each prints differently
+        if n[j] == 1:
+            (q1, q3) = (minval, minval)
+        elif n[j]%2 == 0:
+            (q1, q3) = (quartile1[j], quartile3[j])
+        else:
+            (q1, q3) = (float(quartile1[j]), float(quartile3[j]))
+        boxplots[int(keys[starts[j]])] = str(minval) + " " + str(q1) + " " \
+                + str(medians[j]) + " " + str(q3) + " " + str(maxval)
+    return boxplots
+
 ##############################################################################
 #                   Storing/parsing measurement data                         #
 ##############################################################################
@@ -120,14 +239,9 @@ class MeasurementData:
         Flattens nested items so that hte complete list of items is:
         os_version, rssi, carrier, model, manufacturer, latitude, longitude
 
-        Also keeps track of the set of distinct carriers, manufacturerers and 
-        models. In addition to being useful for its own sake, these values are
-        used to assist in generating plots later.
+        The distinct carriers, manufacturers and models are kept by the
+        MeasurementTable the measurement is added to.
         """
-        distinct_carriers = set()
-        distinct_manufacturers = set()
-        distinct_models = set()
-        distinct_models_by_carrier = {}
 
         def __init__(self, properties):
 
@@ -142,30 +256,6 @@ class MeasurementData:
             self.latitude = location["latitude"]
             self.longitude = location["longitude"]
 
-            self.distinct_carriers.add(self.carrier)
-            self.distinct_manufacturers.add(self.manufacturer)
-            self.distinct_models.add(self.model)
-
-            if self.carrier not in self.distinct_models_by_carrier:
-                self.distinct_models_by_carrier[self.carrier] = set()
-            self.distinct_models_by_carrier[self.carrier].add(self.model)
-
-        def print_stats(self):
-            """Print statistics on all measurements: distinct carriers, models
-            and manufacturers.
-            
-            Must process all measurements first."""
-
-            print "Distinct carriers (count:", len(self.distinct_carriers), ")"
-            for i in self.distinct_carriers:
-                print "\t", i
-            print "Distinct manufacturers (count:", len(self.distinct_manufacturers), ")"
-            for i in self.distinct_manufacturers:
-                print "\t", i
-            print "Distinct models (count:", len(self.distinct_models), ")"
-            for i in self.distinct_models:
-                print "\t", i
-
     class Values:
         """ Stores the results of the rrc measurement tests.
         
@@ -198,8 +288,408 @@ class MeasurementData:
         self.timestamp = data["timestamp"]
         self.device_properties = self.DeviceProperties(data["device_properties"])
         self.values = self.Values(data["values"])
-        print self.device_properties.carrier
 
+def parse_results(results):
+    """Convert string representations of lists of results to an array, all
+    at once.
+
+    Args:
+        results: a list of strings formatted as '[1,2,3]', each with at
+            least NUM_MEASUREMENTS numbers.
+
+    Returns:
+        An array with a row of NUM_MEASUREMENTS results for each string.
+    """
+    commas = NUM_MEASUREMENTS - 1
+    if all([line.count(",") == commas for line in results]):
+        array = numpy.fromstring(",".join([line[1:-1] for line in results]), \
+                dtype=numpy.int64, sep=",")
+        if array.size == len(results) * NUM_MEASUREMENTS:
+            return array.reshape(len(results), NUM_MEASUREMENTS)
+
+    # fromstring stops at anything it cannot read, and a list may be
+    # longer than needed, so go through them one by one
+    rows = []
+    for line in results:
+        row = [int(x) for x in line[1:-1].split(",")]
+        if len(row) < NUM_MEASUREMENTS:
+            raise ValueError("expected " + str(NUM_MEASUREMENTS) + " results in " + line)
+        rows.append(row[:NUM_MEASUREMENTS])
+    return numpy.array(rows, numpy.int64).reshape(len(results), NUM_MEASUREMENTS)
+
+class MeasurementTable:
+    """Successful rrc measurements, stored by column.
+
+    self.columns["carrier"], ["manufacturer"], ["model"] and ["os_version"]
+    are arrays of codes, each an index into the list of names in
+    self.names under the same key.  Names are numbered in the order first
+    seen.  self.columns["tcp"], ["dns"] and ["http"] are arrays with a row
+    of NUM_MEASUREMENTS results (in milliseconds) for each measurement.
+
+    Measurements are added one at a time, but their results are parsed
+    CHUNK_ROWS measurements at a time; call flush() before using
+    self.columns.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.names = dict((column, []) for column in CODED_COLUMNS)
+        self.__codes = dict((column, {}) for column in CODED_COLUMNS)
+        self.columns = {}
+        for column in CODED_COLUMNS:
+            self.columns[column] = numpy.zeros(0, numpy.int32)
+        for datatype in DATATYPES:
+            self.columns[datatype] = numpy.zeros((0, NUM_MEASUREMENTS), numpy.int64)
+        self.__chunks = []
+        self.__clear_pending()
+
+    def __clear_pending(self):
+        # codes and unparsed results of the rows not in a chunk yet
+        self.__pending = dict((column, []) for column in self.columns)
+
+    def __add_row(self, names, results):
+        for column, name in zip(CODED_COLUMNS, names):
+            codes = self.__codes[column]
+            if name not in codes:
+                codes[name] = len(codes)
+                self.names[column].append(name)
+            self.__pending[column].append(codes[name])
+        for datatype in DATATYPES:
+            self.__pending[datatype].append(results[datatype])
+        self.rows += 1
+        if len(self.__pending["carrier"]) == CHUNK_ROWS:
+            self.__parse_pending()
+
+    def __parse_pending(self):
+        if not self.__pending["carrier"]:
+            return
+        chunk = {}
+        for column in CODED_COLUMNS:
+            chunk[column] = numpy.array(self.__pending[column], numpy.int32)
+        for datatype in DATATYPES:
+            chunk[datatype] = parse_results(self.__pending[datatype])
+        self.__chunks.append(chunk)
+        self.__clear_pending()
+
+    def add(self, item):
+        """Add a measurement as decoded from the JSON (see read_measurements)."""
+        properties = item["device_properties"]
+        device_info = properties["device_info"]
+        self.__add_row((properties["carrier"], device_info["manufacturer"], \
+                device_info["model"], properties["os_version"]), item["values"])
+
+    def add_measurement(self, measurement):
+        """Add a MeasurementData item."""
+        properties = measurement.device_properties
+        values = measurement.values
+        # as they were in the Measurement file, to be parsed with the rest
+        results = {}
+        for datatype, data in (("tcp", values.tcp_data), ("dns", values.dns_data), \
+                ("http", values.http_data)):
+            results[datatype] = "[" + ",".join([str(x) for x in data]) + "]"
+        self.__add_row((properties.carrier, properties.manufacturer, \
+                properties.model, properties.os_version), results)
+
+    def flush(self):
+        """Parse the results still pending and put every row in self.columns."""
+        self.__parse_pending()
+        if self.__chunks:
+            for column in self.columns:
+                self.columns[column] = numpy.concatenate([self.columns[column]] \
+                        + [chunk[column] for chunk in self.__chunks])
+            self.__chunks = []
+
+    def restore(self, rows, names, columns):
+        """Make the table hold what another one held, given its rows,
+        names and flushed columns (see MeasurementCache)."""
+        self.rows = rows
+        self.names = names
+        self.__codes = dict((column, dict((name, code) for code, name in enumerate(names[column]))) \
+                for column in CODED_COLUMNS)
+        self.columns = columns
+        self.__chunks = []
+        self.__clear_pending()
+
+    def __len__(self):
+        return self.rows
+
+    def summary(self):
+        """Return the MeasurementSummary of the measurements in the table.
+
+        Results of 0 are left out, as are the http results where the tcp
+        result is 0."""
+        self.flush()
+        summary = MeasurementSummary()
+        summary.count = self.rows
+        summary.carriers = list(self.names["carrier"])
+        summary.manufacturers = list(self.names["manufacturer"])
+        summary.models = list(self.names["model"])
+
+        # number the (carrier, model) pairs in the order first seen
+        models = max(len(summary.models), 1)
+        pair = self.columns["carrier"].astype(numpy.int64) * models + self.columns["model"]
+        (unique, first, inverse) = numpy.unique(pair, return_index=True, return_inverse=True)
+        order = numpy.argsort(first)
+        renumber = numpy.empty(len(order), numpy.int64)
+        renumber[order] = numpy.arange(len(order))
+        summary.pairs = [(summary.carriers[code / models], summary.models[code % models]) \
+                for code in unique[order]]
+
+        keys = renumber[inverse][:, numpy.newaxis] * NUM_MEASUREMENTS + numpy.arange(NUM_MEASUREMENTS)
+        tcp_run = self.columns["tcp"] != 0
+        masks = {"tcp": tcp_run, "http": tcp_run, "dns": self.columns["dns"] != 0}
+        for datatype in DATATYPES:
+            mask = masks[datatype]
+            summary.counts[datatype] = count_values(keys[mask], self.columns[datatype][mask])
+        summary.build_sets()
+        return summary
+
+class MeasurementSummary:
+    """What make_graphs needs to know about a set of measurements, without
+    the measurements themselves.
+
+    For each datatype, (carrier, model) and inter-packet time it keeps how
+    often each result turned up, and it keeps the distinct carriers,
+    manufacturers and models.  Summaries merge, so the data folders can be
+    summarized separately (in parallel) and then put together, and the
+    result is the same as if it was all summarized at once.
+    """
+
+    def __init__(self):
+        self.count = 0
+        # in the order first seen, which the distinct sets are built in, so
+        # that they list them in the same order however the summary was put
+        # together
+        self.carriers = []
+        self.manufacturers = []
+        self.models = []
+        # (carrier, model), numbered in this order in self.counts
+        self.pairs = []
+        # datatype: the arrays (keys, values, counts) from count_values,
+        # where a key is the number of a pair times NUM_MEASUREMENTS plus
+        # the index of the time in TIMES
+        self.counts = {}
+        for datatype in DATATYPES:
+            self.counts[datatype] = (numpy.zeros(0, numpy.int64), \
+                    numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int64))
+        self.build_sets()
+
+    def build_sets(self):
+        """Build the distinct sets from the lists of names."""
+        self.distinct_carriers = set(self.carriers)
+        self.distinct_manufacturers = set(self.manufacturers)
+        self.distinct_models = set(self.models)
+        self.distinct_models_by_carrier = {}
+        for (carrier, model) in self.pairs:
+            if carrier not in self.distinct_models_by_carrier:
+                self.distinct_models_by_carrier[carrier] = set()
+            self.distinct_models_by_carrier[carrier].add(model)
+
+    def merge(self, other):
+        """Add everything in another MeasurementSummary to this one.
+
+        Merging the summaries of the data folders in order gives the same
+        summary as summarizing them all at once."""
+        for name in ("carriers", "manufacturers", "models"):
+            mine = getattr(self, name)
+            for x in getattr(other, name):
+                if x not in mine:
+                    mine.append(x)
+        codes = dict((pair, code) for code, pair in enumerate(self.pairs))
+        for pair in other.pairs:
+            if pair not in codes:
+                codes[pair] = len(self.pairs)
+                self.pairs.append(pair)
+        renumber = numpy.array([codes[pair] for pair in other.pairs], numpy.int64)
+        for datatype in DATATYPES:
+            (keys, values, counts) = other.counts[datatype]
+            keys = renumber[keys / NUM_MEASUREMENTS] * NUM_MEASUREMENTS + keys % NUM_MEASUREMENTS
+            (my_keys, my_values, my_counts) = self.counts[datatype]
+            self.counts[datatype] = count_values(numpy.concatenate((my_keys, keys)), \
+                    numpy.concatenate((my_values, values)), numpy.concatenate((my_counts, counts)))
+        self.count += other.count
+        self.build_sets()
+
+    def boxplots(self, datatype, by_model=False):
+        """Return the boxplots of the results, for each entry of TIMES.
+
+        Args:
+            datatype: "tcp", "dns" or "http".
+            by_model: whether to group the results by (carrier, model)
+                rather than just by carrier.
+
+        Returns:
+            A dict of carrier (or (carrier, model)): a list with the
+            list_to_boxplot string for each entry of TIMES, or None where
+            there are no results.
+        """
+        (keys, values, counts) = self.counts[datatype]
+        if by_model:
+            names = self.pairs
+        else:
+            names = self.carriers
+            carrier_codes = dict((carrier, code) for code, carrier in enumerate(self.carriers))
+            carrier_of = numpy.array([carrier_codes[carrier] for (carrier, model) in self.pairs], numpy.int64)
+            (keys, values, counts) = count_values(carrier_of[keys / NUM_MEASUREMENTS] \
+                    * NUM_MEASUREMENTS + keys % NUM_MEASUREMENTS, values, counts)
+        boxplots = dict((name, [None] * NUM_MEASUREMENTS) for name in names)
+        for key, boxplot in grouped_boxplots(keys, values, counts).iteritems():
+            boxplots[names[key / NUM_MEASUREMENTS]][key % NUM_MEASUREMENTS] = boxplot
+        return boxplots
+
+    def print_stats(self):
+        """Print statistics on all measurements: distinct carriers, models
+        and manufacturers.
+
+        Must process all measurements first."""
+
+        print "Distinct carriers (count:", len(self.distinct_carriers), ")"
+        for i in self.distinct_carriers:
+            print "\t", i
+        print "Distinct manufacturers (count:", len(self.distinct_manufacturers), ")"
+        for i in self.distinct_manufacturers:
+            print "\t", i
+        print "Distinct models (count:", len(self.distinct_models), ")"
+        for i in self.distinct_models:
+            print "\t", i
+
+    def __getstate__(self):
+        # sets come back from a pickle in another order, so they are built
+        # again from the lists
+        state = self.__dict__.copy()
+        for name in ("distinct_carriers", "distinct_manufacturers", \
+                "distinct_models", "distinct_models_by_carrier"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.build_sets()
+
+class MeasurementSet:
+    """A collection of MeasurementData items, such as all those of a data
+    set, along with a MeasurementTable of them.
+
+    Nothing is shared between sets, so one process can parse any number of
+    data sets, one after another or at the same time, without their
+    carriers and models mixing.  Use it like a list of the measurements.
+    """
+
+    def __init__(self):
+        self.measurements = []
+        self.table = MeasurementTable()
+
+    def append(self, measurement):
+        """Add a MeasurementData item to the set and its table."""
+        self.table.add_measurement(measurement)
+        self.measurements.append(measurement)
+
+    def summary(self):
+        """Return the MeasurementSummary of the set, for make_graphs."""
+        return self.table.summary()
+
+    def __len__(self):
+        return len(self.measurements)
+
+    def __iter__(self):
+        return iter(self.measurements)
+
+    def __getitem__(self, i):
+        return self.measurements[i]
+
+
+# how much of a Measurement file to read at a time
+READ_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def iter_json_array(f, read_size=READ_SIZE):
+    """Generate the elements of the JSON array in an open file, one at a time.
+
+    Each element is decoded as soon as all of it has been read and then
+    handed on, so only it and a read buffer are in memory at once, however
+    long the array is.  This is what keeps a Measurement dump of several GB
+    from having to fit in memory, as it does with json.load.
+
+    Args:
+        f: a file holding a JSON array, such as a Measurement file.
+        read_size: how many bytes to read at a time.  An element longer than
+            that is read in several reads.
+
+    Raises:
+        ValueError: if the file is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    # what comes next: "[" to start, then the first element or "]", then ","
+    # or "]", and after a "," another element
+    expect = "["
+    while True:
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError("JSON array ends early")
+            more = f.read(read_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        c = buf[pos]
+        if expect == "[":
+            if c != "[":
+                raise ValueError("not a JSON array")
+            pos += 1
+            expect = "first"
+        elif c == "]":
+            if expect == "item":
+                raise ValueError("expected an element after , in the JSON array")
+            return
+        elif expect == ",":
+            if c != ",":
+                raise ValueError("expected , or ] in the JSON array")
+            pos += 1
+            expect = "item"
+        else:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # a number cut off by the end of the buffer still decodes,
+                # so the element must be followed by what can come after it
+                complete = eof or (end < len(buf) and buf[end] in ",] \t\n\r")
+            except ValueError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # read more, twice as much each time for a very long element
+                more = f.read(max(read_size, len(buf) - pos))
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield item
+            pos = end
+            expect = ","
+
+def read_measurements(f):
+    """Generate the successful rrc measurements of an open Measurement file.
+
+    The file is read one measurement at a time (see iter_json_array) and
+    every other kind of measurement is dropped as soon as it is read.
+
+    Args:
+        f: an open Measurement file.
+
+    Returns:
+        The measurements as decoded from the JSON.
+    """
+    for item in iter_json_array(f):
+        if item["type"] != "rrc":
+            continue 
+        if item["success"] != True:
+            continue 
+        yield item
 
 ##############################################################################
 #                   Generating graphs                                        #
@@ -215,9 +705,9 @@ def generate_gnuplot_datafile(data_to_graph, label, datatype):
     Produces a file in 'graphs/[label]_[datatype]_measurement.dat'
 
     Args:
-        data_to_graph: A list of lists.  The outer list indices correspond to
-            a timing index. The inner list can be of any length >0 and has
-            a list of values to convert to a boxplot.
+        data_to_graph: A list of boxplots, as from
+            MeasurementSummary.boxplots.  The list indices correspond to a
+            timing index.
 
         label: A string to make up the first part of the file name. Will be
             escaped automatically. Generally of the form 'Carriername' or
@@ -228,10 +718,14 @@ def generate_gnuplot_datafile(data_to_graph, label, datatype):
 
 
     """
+    for i in range(NUM_MEASUREMENTS):
+        if data_to_graph[i] == None:
+            raise ValueError("no " + datatype + " results for " + label + " at " \
+                    + str(TIMES[i]) + " ms")
     label = fix_filename(label)
     f = open("graphs/" + label + "_" + datatype + "_measurement.dat", "w")
     for i in range(NUM_MEASUREMENTS):
-        print >>f, TIMES[i], list_to_boxplot(data_to_graph[i])
+        print >>f, TIMES[i], data_to_graph[i]
     f.close()
 
 def generate_gnuplot_script(data_to_graph, label, datatype, carrier = None):
@@ -304,36 +798,17 @@ def generate_gnuplot_script(data_to_graph, label, datatype, carrier = None):
 
     f.close()
 
-def make_graphs(datalist):
+def make_graphs(summary):
     """Produce the graphs of performance for different carriers and devices.
     
     Does not do RRC inference data.
 
     Args:
-        datalist: list of MeasurementData objects to process.
+        summary: MeasurementSummary of the measurements to process.
     """
 
-    carriers = datalist[0].device_properties.distinct_carriers
-    d_carriers_tcp = {}
-    d_carriers_dns= {}
-    d_carriers_http = {}
-    for i in carriers:
-        d_carriers_tcp[i] = [[] for j in range(NUM_MEASUREMENTS)]
-        d_carriers_dns[i] = [[] for j in range(NUM_MEASUREMENTS)]
-        d_carriers_http[i] = [[] for j in range(NUM_MEASUREMENTS)]
-
-    models = datalist[0].device_properties.distinct_models_by_carrier
-    d_models_tcp = {}
-    d_models_dns= {}
-    d_models_http = {}
-    for carrier in models.keys():
-        d_models_tcp[carrier] = {}
-        d_models_dns[carrier] = {}
-        d_models_http[carrier] = {}
-        for model in models[carrier]:
-            d_models_tcp[carrier][model] = [[] for k in range(NUM_MEASUREMENTS)]
-            d_models_dns[carrier][model] = [[] for k in range(NUM_MEASUREMENTS)]
-            d_models_http[carrier][model] = [[] for k in range(NUM_MEASUREMENTS)]
+    carriers = summary.distinct_carriers
+    models = summary.distinct_models_by_carrier
 
     # create gnuplot scripts
     # First, scripts for carriers
@@ -346,35 +821,18 @@ def make_graphs(datalist):
         generate_gnuplot_script(models[carrier], "model_" + carrier, "dns", carrier)
         generate_gnuplot_script(models[carrier], "model_" + carrier, "http", carrier)
 
-    # copy entries from the data list into dicts to print
-    for entry in datalist:
-        carrier = entry.device_properties.carrier
-        model = entry.device_properties.model
-        for i in range(NUM_MEASUREMENTS):
-            if entry.values.tcp_data[i] != 0:
-                d_carriers_tcp[carrier][i].append(entry.values.tcp_data[i])
-                d_models_tcp[carrier][model][i].append(entry.values.tcp_data[i])
-            if entry.values.dns_data[i] != 0:
-                d_carriers_dns[carrier][i].append(entry.values.dns_data[i])
-                d_models_dns[carrier][model][i].append(entry.values.dns_data[i])
-            if entry.values.tcp_data[i] != 0:
-                d_carriers_http[carrier][i].append(entry.values.http_data[i])
-                d_models_http[carrier][model][i].append(entry.values.http_data[i])
-
-    for k, v in d_carriers_tcp.iteritems():
-        generate_gnuplot_datafile(v, k, "tcp")
-    for k, v in d_carriers_dns.iteritems():
-        generate_gnuplot_datafile(v, k, "dns")
-    for k, v in d_carriers_http.iteritems():
-        generate_gnuplot_datafile(v, k, "http")
-
-    for carrier in datalist[0].device_properties.distinct_carriers:
-        for k, v in d_models_tcp[carrier].iteritems():
-            generate_gnuplot_datafile(v, carrier + "_" + k, "tcp")
-        for k, v in d_models_dns[carrier].iteritems():
-            generate_gnuplot_datafile(v, carrier + "_" + k, "dns")
-        for k, v in d_models_http[carrier].iteritems():
-            generate_gnuplot_datafile(v, carrier + "_" + k, "http")
+    for datatype in DATATYPES:
+        boxplots = summary.boxplots(datatype)
+        for carrier in carriers:
+            generate_gnuplot_datafile(boxplots[carrier], carrier, datatype)
+
+    boxplots = dict((datatype, summary.boxplots(datatype, by_model=True)) \
+            for datatype in DATATYPES)
+    for carrier in carriers:
+        for model in models[carrier]:
+            for datatype in DATATYPES:
+                generate_gnuplot_datafile(boxplots[datatype][(carrier, model)], \
+                        carrier + "_" + model, datatype)
 
 
 ##############################################################################
@@ -384,33 +842,100 @@ def make_graphs(datalist):
 def parse_measurement(folder, datalist):
     """Given a folder of data, parse the measurement file in the folder.
     
-    The Measurement class does the bulk of the work here.
+    The Measurement class does the bulk of the work here.  The file is read
+    a measurement at a time, so it can be much larger than memory.
     
     Args:
         folder: The name of the data folder to open.  Should be those 
         downloaded and unzipped with gsutil.
 
-        datalist: List to store the results, as MeasurementData items.
+        datalist: MeasurementSet to store the results in, as MeasurementData
+        items.
     """
 
     f = open(folder + "/Measurement")
-    data = json.load(f)
+    try:
+        for item in read_measurements(f):
+            datalist.append(MeasurementData(item))
+    finally:
+        f.close()
 
-    for item in data:
-        if item["type"] != "rrc":
-            continue 
-        if item["success"] != True:
-            continue 
+def load_table(folder, table):
+    """Like parse_measurement, but into a MeasurementTable, without making
+    MeasurementData items.
+
+    Args:
+        folder: The name of the data folder to open.
 
-        datalist.append(MeasurementData(item))
+        table: MeasurementTable to add the measurements to.
+    """
 
+    f = open(folder + "/Measurement")
+    try:
+        for item in read_measurements(f):
+            table.add(item)
+    finally:
+        f.close()
 
+def summarize_folder(folder, cache=None):
+    """Parse the measurement file of a data folder into a MeasurementSummary.
 
-datalist = []
-directories = glob.glob("data/S-*")
-for d in directories:
-    parse_measurement(d, datalist)
+    This is what main's worker processes do; only the summary goes back to
+    the main process, not the measurements.
 
-datalist[0].device_properties.print_stats()
+    Args:
+        folder: The name of the data folder.
 
-make_graphs(datalist)
+        cache: a MeasurementCache to take the folder's measurements from
+        if it has them, and to keep them in if not, or None.
+    """
+    table = MeasurementTable()
+    if cache == None or not cache.load(folder, table):
+        load_table(folder, table)
+        if cache != None:
+            cache.save(folder, table)
+    return table.summary()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Graphs of the rrc tests in the Mobiperf data in data/S-*.")
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(), \
+            help="data folders to parse at once")
+    parser.add_argument("--cache", nargs="?", const=measurement_cache.DEFAULT_DIR, metavar="DIR", \
+            help="keep the parsed measurements of each data folder in DIR, so that later runs " \
+            + "only parse new or changed folders")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="MB", help="size cap of the cache")
+    args = parser.parse_args(argv[1:])
+
+    directories = glob.glob("data/S-*")
+    summary = MeasurementSummary()
+    summarize = summarize_folder
+    if args.cache:
+        cache = measurement_cache.MeasurementCache(args.cache, args.cache_size << 20)
+        summarize = functools.partial(summarize_folder, cache=cache)
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        summaries = pool.imap(summarize, directories)
+    else:
+        summaries = itertools.imap(summarize, directories)
+    try:
+        # imap keeps the folder order, so carriers and models are listed
+        # in the order a parse of one folder after another finds them
+        for d, folder_summary in itertools.izip(directories, summaries):
+            summary.merge(folder_summary)
+            print >>sys.stderr, "parsed", d
+    finally:
+        if pool != None:
+            pool.close()
+            pool.join()
+    if summary.count == 0:
+        print >>sys.stderr, "no rrc measurements found"
+        return 1
+
+    summary.print_stats()
+
+    make_graphs(summary)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
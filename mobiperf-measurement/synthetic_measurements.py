@@ -0,0 +1,143 @@
+#/usr/bin/python
+
+import json, os, random, sys
+
+"""
+Writes made-up Mobiperf data in the layout of gs://openmobiledata_public,
+for trying out and timing parse_mobiperf_measurements.py without the real
+data set.
+
+To use:
+    python synthetic_measurements.py data 100000
+
+which writes data/S-0000/Measurement, data/S-0001/Measurement and so on.
+Most of the measurements are successful rrc tests; the rest are other
+measurement types or failed tests, which the parser skips.  The same seed
+gives the same data.
+"""
+
+# must match TIMES in parse_mobiperf_measurements.py
+TIMES = [0, 2, 4, 8, 12, 16, 22]
+
+CARRIERS = {
+    "AT&T": [("samsung", "SGH-I747"), ("LGE", "Nexus 4")],
+    "Verizon Wireless": [("samsung", "SCH-I535"), ("motorola", "DROID RAZR")],
+    "T-Mobile": [("LGE", "Nexus 4"), ("HTC", "HTC One")],
+    "Sprint": [("samsung", "SPH-L710")],
+}
+
+OTHER_TYPES = ["ping", "dns_lookup", "http", "traceroute"]
+
+def format_list(l):
+    """Format a list of numbers the way the Mobiperf server does.
+
+    Args:
+        l: a list of integers.
+
+    Returns:
+        A string such as '[1,2,3]'.
+    """
+    return "[" + ",".join(str(x) for x in l) + "]"
+
+def rrc_values():
+    """Return the values entry of an rrc test.
+
+    Each of the tests is 0 (not run) now and then, as in the real data.
+    """
+    values = {"times": format_list(TIMES)}
+    for name, base in (("dns", 60), ("tcp", 120), ("http", 400)):
+        results = []
+        for i in range(len(TIMES)):
+            if random.random() < 0.05:
+                results.append(0)
+            else:
+                results.append(int(base * random.uniform(0.5, 3.0)))
+        values[name] = format_list(results)
+    return values
+
+def measurement(i):
+    """Return the i-th made-up measurement, as decoded from the JSON.
+
+    Args:
+        i: index of the measurement, used for its timestamp.
+    """
+    carrier = random.choice(sorted(CARRIERS.keys()))
+    manufacturer, model = random.choice(CARRIERS[carrier])
+    measurement_type = "rrc"
+    if random.random() < 0.2:
+        measurement_type = random.choice(OTHER_TYPES)
+    item = {
+        "type": measurement_type,
+        "success": random.random() < 0.95,
+        "task": {"type": measurement_type, "parameters": {}},
+        "timestamp": 1371063060000000 + i * 1000000,
+        "device_properties": {
+            "device_info": {"model": model, "manufacturer": manufacturer},
+            "location": {"latitude": random.uniform(42.2, 42.3),
+                         "longitude": random.uniform(-83.8, -83.7)},
+            "os_version": random.choice(["INCREMENTAL:4.1.2", "INCREMENTAL:4.2.2"]),
+            "rssi": random.randint(0, 31),
+            "carrier": carrier,
+        },
+        "values": {},
+    }
+    if measurement_type == "rrc":
+        item["values"] = rrc_values()
+    return item
+
+def measurements(n, seed=1):
+    """Generate n made-up measurements.
+
+    Args:
+        n: how many to generate.
+        seed: seed for the random number generator.
+    """
+    random.seed(seed)
+    for i in xrange(n):
+        yield measurement(i)
+
+def write_dataset(directory, n, per_folder=10000, seed=1):
+    """Write n made-up measurements into data folders under directory.
+
+    Args:
+        directory: where to put the S-xxxx folders.  Created if need be.
+        n: how many measurements to write.
+        per_folder: how many measurements go into each Measurement file.
+        seed: seed for the random number generator.
+
+    Returns:
+        The list of folders written.
+    """
+    folders = []
+    items = []
+    for item in measurements(n, seed):
+        items.append(item)
+        if len(items) == per_folder:
+            folders.append(write_folder(directory, len(folders), items))
+            items = []
+    if items:
+        folders.append(write_folder(directory, len(folders), items))
+    return folders
+
+def write_folder(directory, index, items):
+    """Write items as the Measurement file of the index-th data folder.
+
+    Returns:
+        The name of the folder.
+    """
+    folder = os.path.join(directory, "S-%04d" % index)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    f = open(folder + "/Measurement", "w")
+    json.dump(items, f)
+    f.close()
+    return folder
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print "usage:", sys.argv[0], "directory n [seed]"
+        sys.exit(1)
+    seed = 1
+    if len(sys.argv) > 3:
+        seed = int(sys.argv[3])
+    write_dataset(sys.argv[1], int(sys.argv[2]), seed=seed)